@@ -4,10 +4,67 @@ where players must safely scan areas while avoiding hidden dangers.
 """
 
 import sys
+from typing import TYPE_CHECKING, Optional
 
-from src.initialize_game import initialize_game
-from src.io_game import clear_screen, get_player_input, render_board
-from src.scan_position import scan_position
+# Modules are imported where they are used: the single-key front end draws its
+# first frame before the scanning engine and the journal are even imported
+# pylint: disable=import-outside-toplevel
+
+if TYPE_CHECKING:
+    from src.GameState import GameState
+
+
+def play_lines(state: "GameState") -> "GameState":
+    """Play a game with coordinates typed line by line; the final state"""
+    from src.Domain import COMMAND_QUIT, COMMAND_REDO, COMMAND_UNDO, Position
+    from src.io_game import (
+        BOARD_TOP,
+        CLEAR_BELOW,
+        Viewport,
+        clear_screen,
+        get_player_input,
+        move_cursor,
+        render_board,
+        render_board_update,
+        terminal_viewport,
+    )
+    from src.journal import Journal
+
+    journal = Journal(state)
+    quit_game = False
+    previous: Optional["GameState"] = None
+    previous_viewport: Optional[Viewport] = None
+    last_position = Position((state.width // 2, state.height // 2))
+    while not state.game_over and not state.win and not quit_game:
+        # Follow the last scanned position on boards larger than the terminal
+        viewport = terminal_viewport(state, last_position)
+        if previous is None or viewport != previous_viewport:
+            # Draw the full frame once
+            clear_screen()
+            print("=== ABANDONED SPACE STATION ===")
+            print("Find all safe areas without triggering traps.")
+            print(f"Board size: {state.width}x{state.height}, Traps: {state.trap_count}")
+            sys.stdout.write(render_board(state, viewport))
+        else:
+            # Only redraw the cells changed by the last move
+            sys.stdout.write(render_board_update(previous, state, BOARD_TOP, viewport))
+
+        # Clear the previous prompt and any messages below the board
+        sys.stdout.write(move_cursor(BOARD_TOP + viewport.height + 3) + CLEAR_BELOW)
+        sys.stdout.flush()
+
+        position, command = get_player_input()
+        quit_game = command == COMMAND_QUIT
+        previous, previous_viewport = state, viewport
+        if position is not None:
+            state = journal.record(position)
+            last_position = position
+        elif command == COMMAND_UNDO:
+            state = journal.undo()
+        elif command == COMMAND_REDO:
+            state = journal.redo()
+
+    return state
 
 
 def main() -> None:
@@ -16,33 +73,49 @@ def main() -> None:
     width = 8
     height = 8
 
-    if len(sys.argv) > 2:
+    # --profile prints timers and counters of the engine at exit, and --line
+    # reads typed coordinates instead of single keys
+    flags = {arg for arg in sys.argv[1:] if arg in ("--profile", "--line")}
+    args = [arg for arg in sys.argv[1:] if arg not in flags]
+    if "--profile" in flags:
+        from src.profiling import set_profiling
+
+        set_profiling(True)
+
+    if len(args) > 1:
         try:
-            width = max(5, int(sys.argv[1]))
-            height = max(5, int(sys.argv[2]))
+            width = max(5, int(args[0]))
+            height = max(5, int(args[1]))
         except ValueError:
             print("Invalid arguments. Using default size.")
 
-    # Initialize game
-    state = initialize_game(width, height)
+    # Initialize game, computing the hidden rows as the scans first read them
+    from src.initialize_game import initialize_game
 
-    # Game loop
-    quit_game = False
-    while not state.game_over and not state.win and not quit_game:
-        clear_screen()
-        print("=== ABANDONED SPACE STATION ===")
-        print("Find all safe areas without triggering traps.")
-        print(f"Board size: {state.width}x{state.height}, Traps: {state.trap_count}")
-        print(render_board(state))
+    state = initialize_game(width, height, lazy=True)
 
-        position, quit_game = get_player_input()
-        if position is not None:
-            state = scan_position(state, position)
+    if "--line" not in flags and sys.stdin.isatty() and sys.stdout.isatty():
+        try:
+            from src.terminal import run
+        except ModuleNotFoundError as error:
+            # Terminal modes need termios, which Windows does not have
+            if error.name not in ("termios", "tty"):
+                raise
+            state = play_lines(state)
+        else:
+            state = run(state)
+    else:
+        state = play_lines(state)
 
     # Final board state
+    from src.Domain import Position
+    from src.io_game import clear_screen, render_board, terminal_viewport
+    from src.profiling import PROFILE
+
     clear_screen()
     print("=== ABANDONED SPACE STATION ===")
-    print(render_board(state))
+    center = Position((state.width // 2, state.height // 2))
+    print(render_board(state, terminal_viewport(state, center)))
 
     # Reveal all traps if game is over
     if state.game_over:
@@ -53,6 +126,10 @@ def main() -> None:
 
     print("Thanks for playing!")
 
+    if PROFILE.enabled:
+        print("\nProfile (inclusive wall time):")
+        print(PROFILE.summary(), end="")
+
 
 if __name__ == "__main__":
     main()
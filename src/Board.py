@@ -0,0 +1,351 @@
+import sys
+from typing import (
+    AbstractSet,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Union,
+    overload,
+)
+
+from .Domain import CELL_CODES, CODE_CELLS, CellContent, Position
+from .profiling import PROFILE, count
+
+# Translation table from cell codes to the characters shown on screen
+CELL_TABLE = bytes(
+    ord(CODE_CELLS[code]) if code < len(CODE_CELLS) else ord("?")
+    for code in range(256)
+)
+
+
+class BoardRow(Sequence[CellContent]):
+    """Read-only list view of a single board row"""
+
+    __slots__ = ("board", "y")
+
+    def __init__(self, board: "Board", y: int) -> None:
+        self.board = board
+        self.y = y
+
+    @overload
+    def __getitem__(self, index: int) -> CellContent: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[CellContent]: ...
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[CellContent, List[CellContent]]:
+        if isinstance(index, slice):
+            codes = self.board.row_codes(self.y)
+            return [CODE_CELLS[code] for code in codes[index]]
+        if not -self.board.width <= index < self.board.width:
+            raise IndexError("board column index out of range")
+        return self.board.cell(index % self.board.width, self.y)
+
+    def __len__(self) -> int:
+        return self.board.width
+
+    def __iter__(self) -> Iterator[CellContent]:
+        return (CODE_CELLS[code] for code in self.board.row_codes(self.y))
+
+    def count(self, value: object) -> int:
+        if not isinstance(value, str) or value not in CELL_CODES:
+            return 0
+        return self.board.row_codes(self.y).count(CELL_CODES[CellContent(value)])
+
+
+class Board:
+    """Compact board storing one cell code byte per cell, one bytearray per row
+
+    Copies share their rows and copy a row only before its first write, so
+    deriving a new board costs O(height) plus O(width) per touched row.
+    """
+
+    __slots__ = ("width", "height", "rows", "_owned")
+
+    # Whether rows and cells hold the whole board, which chunked maps cannot
+    flat = True
+
+    def __init__(self, width: int, height: int, rows: List[bytearray]) -> None:
+        self.width = width
+        self.height = height
+        self.rows = rows
+        # Flags marking the rows this board may write without copying them
+        self._owned = bytearray(b"\x01") * height
+
+    @classmethod
+    def filled(cls, width: int, height: int, cell: CellContent) -> "Board":
+        """Create a board filled with the given cell content
+
+        All rows share a single row until they are written, so the board costs
+        O(width + height) until it is played.
+        """
+        row = bytearray([CELL_CODES[cell]]) * width
+        board = cls(width, height, [row] * height)
+        board._owned = bytearray(height)
+        return board
+
+    @classmethod
+    def from_cells(cls, width: int, height: int, cells: bytes) -> "Board":
+        """Create a board from cell codes in row-major order"""
+        return cls(
+            width,
+            height,
+            [bytearray(cells[y * width : (y + 1) * width]) for y in range(height)],
+        )
+
+    @classmethod
+    def from_lists(cls, board: Sequence[Sequence[CellContent]]) -> "Board":
+        """Pack a list-of-lists board into a compact board"""
+        height = len(board)
+        width = len(board[0]) if height else 0
+        return cls(
+            width,
+            height,
+            [bytearray(CELL_CODES[cell] for cell in row) for row in board],
+        )
+
+    def copy(self) -> "Board":
+        """Create a copy that shares all rows until they are written"""
+        if PROFILE.enabled:
+            count("boards_copied")
+        new_board = Board(self.width, self.height, self.rows[:])
+        # Both boards now share every row, so neither may write in place
+        self._owned = bytearray(self.height)
+        new_board._owned = bytearray(self.height)
+        return new_board
+
+    def get(self, x: int, y: int) -> int:
+        """Get the cell code at the given position"""
+        return self.rows[y][x]
+
+    def set(self, x: int, y: int, code: int) -> None:
+        """Set the cell code at the given position (only on fresh copies)"""
+        self.writable_row(y)[x] = code
+
+    def writable_row(self, y: int) -> bytearray:
+        """Get a row for writing in place, copying it first if it is shared"""
+        if not self._owned[y]:
+            if PROFILE.enabled:
+                count("cells_copied", self.width)
+            self.rows[y] = bytearray(self.rows[y])
+            self._owned[y] = 1
+        return self.rows[y]
+
+    def cell(self, x: int, y: int) -> CellContent:
+        """Get the cell content at the given position"""
+        return CODE_CELLS[self.get(x, y)]
+
+    def row_codes(self, y: int, start: int = 0, stop: Optional[int] = None) -> bytes:
+        """Get the cell codes of a row, or of a slice of it"""
+        return bytes(self.rows[y][start:stop])
+
+    def shares_row(
+        self, other: "Board", y: int, start: int = 0, stop: Optional[int] = None
+    ) -> bool:
+        """Whether a row (or a slice of it) is shared storage with another board"""
+        return self.rows[y] is other.rows[y]
+
+    def row_text(self, y: int, start: int = 0, stop: Optional[int] = None) -> str:
+        """Get the displayed characters of a row, or of a slice of it"""
+        return bytes(self.rows[y][start:stop]).translate(CELL_TABLE).decode("ascii")
+
+    def count(self, code: int) -> int:
+        """Count the cells holding the given code"""
+        return sum(row.count(code) for row in self.rows)
+
+    def to_lists(self) -> List[List[CellContent]]:
+        """Unpack the board into the list-of-lists representation"""
+        return [list(self[y]) for y in range(self.height)]
+
+    @property
+    def cells(self) -> bytes:
+        """All cell codes in row-major order"""
+        return b"".join(self.rows)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the cell storage in bytes"""
+        return sys.getsizeof(self.rows) + sum(sys.getsizeof(row) for row in self.rows)
+
+    def __len__(self) -> int:
+        return self.height
+
+    def __getitem__(self, y: int) -> BoardRow:
+        if not -self.height <= y < self.height:
+            raise IndexError("board row index out of range")
+        return BoardRow(self, y % self.height)
+
+    def __iter__(self) -> Iterator[BoardRow]:
+        return (BoardRow(self, y) for y in range(self.height))
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Board):
+            return (
+                self.width == other.width
+                and self.height == other.height
+                and self.rows == other.rows
+            )
+        if isinstance(other, list):
+            return self.to_lists() == other
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+class LazyBoard(Board):
+    """Board whose rows are only built when they are first needed"""
+
+    __slots__ = ("_loader", "_rows")
+
+    def __init__(
+        self, width: int, height: int, loader: Callable[[], List[bytearray]]
+    ) -> None:
+        # pylint: disable=super-init-not-called
+        self.width = width
+        self.height = height
+        self._owned = bytearray(b"\x01") * height
+        self._loader: Optional[Callable[[], List[bytearray]]] = loader
+        self._rows: Optional[List[bytearray]] = None
+
+    @property  # type: ignore[override]
+    def rows(self) -> List[bytearray]:
+        """Rows of the board, built by the loader on first access"""
+        if self._rows is None:
+            assert self._loader is not None
+            self._rows = self._loader()
+            self._loader = None
+        return self._rows
+
+    @rows.setter
+    def rows(self, rows: List[bytearray]) -> None:
+        self._rows = rows
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the rows have been built already"""
+        return self._rows is not None
+
+
+# Per bit position, tables mapping non-zero bytes to that bit set
+PACK_TABLES = [
+    bytes((1 << bit) if value else 0 for value in range(256)) for bit in range(8)
+]
+# Per bit position, tables mapping bytes to the value of that bit
+UNPACK_TABLES = [
+    bytes((value >> bit) & 1 for value in range(256)) for bit in range(8)
+]
+
+
+def pack_bits(mask: bytes) -> bytes:
+    """Pack one 0/1 byte per cell into one bit per cell, least significant first"""
+    padded = bytes(mask) + bytes(-len(mask) % 8)
+    # Every pass places the cells at one bit position of all output bytes
+    bits = 0
+    for bit, table in enumerate(PACK_TABLES):
+        bits |= int.from_bytes(padded[bit::8].translate(table), "little")
+    return bits.to_bytes(len(padded) // 8, "little")
+
+
+def unpack_bits(bits: Union[bytes, memoryview], count: int) -> bytes:
+    """Unpack one bit per cell into one 0/1 byte per cell"""
+    packed = bytes(bits)
+    mask = bytearray(len(packed) * 8)
+    for bit, table in enumerate(UNPACK_TABLES):
+        mask[bit::8] = packed.translate(table)
+    return bytes(mask[:count])
+
+
+class TrapBitset(AbstractSet[Position]):
+    """Set of trap positions stored as one bit per cell in row-major order"""
+
+    __slots__ = ("width", "height", "bits", "_count")
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        bits: Union[bytearray, memoryview],
+        count: Optional[int] = None,
+    ) -> None:
+        self.width = width
+        self.height = height
+        self.bits = bits
+        self._count = count
+
+    @classmethod
+    def from_indices(
+        cls, width: int, height: int, indices: Sequence[int]
+    ) -> "TrapBitset":
+        """Pack distinct flat trap indices into a bitset"""
+        bits = bytearray((width * height + 7) // 8)
+        for index in indices:
+            bits[index >> 3] |= 1 << (index & 7)
+        return cls(width, height, bits, len(indices))
+
+    @classmethod
+    def from_positions(
+        cls, width: int, height: int, positions: Iterable[Position]
+    ) -> "TrapBitset":
+        """Pack distinct trap positions into a bitset"""
+        return cls.from_indices(width, height, [y * width + x for x, y in positions])
+
+    def row_mask(self, y: int) -> bytes:
+        """One 0/1 byte per cell of a row, 1 marking traps"""
+        width = self.width
+        start = y * width
+        value = int.from_bytes(
+            self.bits[start >> 3 : (start + width + 7) >> 3], "little"
+        )
+        row_bits = (value >> (start & 7)) & ((1 << width) - 1)
+        return unpack_bits(row_bits.to_bytes((width + 7) // 8, "little"), width)
+
+    def __contains__(self, pos: object) -> bool:
+        if not isinstance(pos, tuple) or len(pos) != 2:
+            return False
+        x, y = pos
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        index = y * self.width + x
+        return bool(self.bits[index >> 3] >> (index & 7) & 1)
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = int.from_bytes(self.bits, "little").bit_count()
+        return self._count
+
+    def __iter__(self) -> Iterator[Position]:
+        width = self.width
+        for byte_index, value in enumerate(self.bits):
+            while value:
+                low_bit = value & -value
+                index = byte_index * 8 + low_bit.bit_length() - 1
+                yield Position((index % width, index // width))
+                value ^= low_bit
+
+
+def chunked_map_error(feature: str) -> ValueError:
+    """Error for a feature that needs whole rows or cells of a chunked map"""
+    return ValueError(f"{feature} needs a bounded board, not a chunked map")
+
+
+def require_flat(board: Board, feature: str) -> None:
+    """Reject chunked maps in features that read whole rows or cells"""
+    if not board.flat:
+        raise chunked_map_error(feature)
+
+
+def as_board(board: Union[Board, Sequence[Sequence[CellContent]]]) -> Board:
+    """Return the compact form of a board given in either representation"""
+    if isinstance(board, Board):
+        return board
+    return Board.from_lists(board)
+
+
+def list_board_nbytes(board: Sequence[Sequence[CellContent]]) -> int:
+    """Memory used by the list-of-lists representation in bytes"""
+    return sys.getsizeof(board) + sum(sys.getsizeof(row) for row in board)
@@ -1,8 +1,11 @@
-from typing import List, NewType, Tuple
+from typing import Dict, List, NewType, Tuple
 
 # Domain types for strong typing
 Position = NewType("Position", Tuple[int, int])
 CellContent = NewType("CellContent", str)
+ScanOutcome = NewType("ScanOutcome", str)
+Command = NewType("Command", str)
+Key = NewType("Key", str)
 GameBoard = NewType("GameBoard", List[List[CellContent]])
 HiddenBoard = NewType("HiddenBoard", List[List[CellContent]])
 
@@ -10,3 +13,39 @@ HiddenBoard = NewType("HiddenBoard", List[List[CellContent]])
 TRAP = CellContent("X")  # Represents a trap/danger
 HIDDEN = CellContent("#")  # Represents a hidden cell
 EMPTY = CellContent(" ")  # Represents an empty revealed cell
+
+# Outcomes of a single scan
+OUTCOME_INVALID = ScanOutcome("invalid")  # Position outside the board
+OUTCOME_REVEALED = ScanOutcome("revealed")  # Position was already revealed
+OUTCOME_SAFE = ScanOutcome("safe")  # Safe cell revealed
+OUTCOME_TRAP = ScanOutcome("trap")  # Trap triggered
+
+# Commands besides scanning a position
+COMMAND_QUIT = Command("q")  # Quit the game
+COMMAND_UNDO = Command("u")  # Undo the last move
+COMMAND_REDO = Command("r")  # Redo the last undone move
+
+# Keys of the raw-mode front end
+KEY_UP = Key("up")
+KEY_DOWN = Key("down")
+KEY_LEFT = Key("left")
+KEY_RIGHT = Key("right")
+KEY_SCAN = Key("scan")  # Scan the selected position
+KEY_QUIT = Key("quit")
+KEY_UNDO = Key("undo")
+KEY_REDO = Key("redo")
+
+# Compact cell codes used by array-backed boards (0-8 are adjacency counts)
+EMPTY_CODE = 0
+TRAP_CODE = 9
+HIDDEN_CODE = 10
+
+CODE_CELLS: Tuple[CellContent, ...] = (
+    EMPTY,
+    *(CellContent(str(count)) for count in range(1, 9)),
+    TRAP,
+    HIDDEN,
+)
+CELL_CODES: Dict[CellContent, int] = {
+    cell: code for code, cell in enumerate(CODE_CELLS)
+}
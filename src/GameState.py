@@ -1,42 +1,174 @@
-from typing import Set
+from typing import (
+    AbstractSet,
+    Dict,
+    List,
+    NamedTuple,
+    NoReturn,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
-from .Domain import GameBoard, HiddenBoard, Position
+from .Board import Board, as_board
+from .Domain import HIDDEN_CODE, TRAP_CODE, GameBoard, HiddenBoard, Position
+from .profiling import PROFILE, count
 
 
-class GameState:
-    """Immutable representation of the game state"""
+def count_revealed(board: Board) -> int:
+    """Count the non-hidden cells of a visible board with a full scan"""
+    if PROFILE.enabled:
+        count("full_recounts")
+    return board.width * board.height - board.count(HIDDEN_CODE)
 
-    def __init__(
-        self,
+
+class _GameStateFields(NamedTuple):
+    """Fields of a game state, in constructor order"""
+
+    width: int
+    height: int
+    trap_count: int
+    hidden_board: Board
+    visible_board: Board
+    danger_positions: AbstractSet[Position]
+    # Number of non-hidden cells on the visible board
+    revealed_count: int
+    # Seed the traps were generated from, if known
+    seed: Optional[int]
+    # False until the first scan of a safe-first-click game places the traps
+    traps_placed: bool
+    game_over: bool
+    win: bool
+
+
+# Position of every field in the underlying tuple
+FIELD_INDEX: Dict[str, int] = {
+    name: index for index, name in enumerate(_GameStateFields._fields)
+}
+
+_new_tuple = tuple.__new__
+_tuple_iter = tuple.__iter__
+
+
+class GameState(_GameStateFields):
+    """Immutable representation of the game state
+
+    A slotted named tuple: states have no per-instance dict and cannot be
+    modified, and deriving the next state copies 11 references. The tuple is an
+    implementation detail: fields are read by name, and states compare and hash
+    by identity like the plain objects they replaced, never by their boards.
+    """
+
+    __slots__ = ()
+
+    def __new__(
+        cls,
         width: int,
         height: int,
         trap_count: int,
-        hidden_board: HiddenBoard,
-        visible_board: GameBoard,
-        danger_positions: Set[Position],
-    ) -> None:
-        self.width = width
-        self.height = height
-        self.trap_count = trap_count
-        self.hidden_board = hidden_board
-        self.visible_board = visible_board
-        self.danger_positions = danger_positions
-        self.game_over = False
-        self.win = False
+        hidden_board: Union[Board, HiddenBoard],
+        visible_board: Union[Board, GameBoard],
+        danger_positions: AbstractSet[Position],
+        revealed_count: Optional[int] = None,
+        seed: Optional[int] = None,
+        traps_placed: bool = True,
+        game_over: bool = False,
+        win: bool = False,
+    ) -> "GameState":
+        if PROFILE.enabled:
+            count("states_allocated")
+        visible_board = as_board(visible_board)
+        return _new_tuple(
+            cls,
+            (
+                width,
+                height,
+                trap_count,
+                as_board(hidden_board),
+                visible_board,
+                danger_positions,
+                # Counted once with a full scan if unknown
+                (
+                    count_revealed(visible_board)
+                    if revealed_count is None
+                    else revealed_count
+                ),
+                seed,
+                traps_placed,
+                game_over,
+                win,
+            ),
+        )
 
     def with_updates(self, **kwargs: object) -> "GameState":
-        """Creates a new game state with updated values"""
-        new_state = GameState(
-            width=self.width,
-            height=self.height,
-            trap_count=self.trap_count,
-            hidden_board=self.hidden_board,
-            visible_board=self.visible_board,
-            danger_positions=self.danger_positions,
-        )
+        """Creates a new game state with updated values
 
-        # Apply all updates
+        Works like dataclasses.replace: unknown field names raise TypeError and
+        every field that is not given keeps its value.
+        """
+        if PROFILE.enabled:
+            count("states_allocated")
+        values: List[object] = list(_tuple_iter(self))
         for key, value in kwargs.items():
-            setattr(new_state, key, value)
+            index = FIELD_INDEX.get(key)
+            if index is None:
+                raise TypeError(f"GameState has no field {key!r}")
+            values[index] = value
+
+        if "hidden_board" in kwargs or "visible_board" in kwargs:
+            # Pack boards given as lists of lists
+            for key in ("hidden_board", "visible_board"):
+                if key not in kwargs:
+                    continue
+                board = kwargs[key]
+                if not isinstance(board, (Board, Sequence)):
+                    raise TypeError(f"GameState field {key!r} must be a board")
+                values[FIELD_INDEX[key]] = as_board(board)
+
+            # A new visible board without a new counter needs a recount
+            if "visible_board" in kwargs and kwargs.get("revealed_count") is None:
+                visible_board = values[FIELD_INDEX["visible_board"]]
+                assert isinstance(visible_board, Board)
+                values[FIELD_INDEX["revealed_count"]] = count_revealed(visible_board)
+
+        return _new_tuple(type(self), values)
+
+    def __eq__(self, other: object) -> bool:
+        return self is other
+
+    def __ne__(self, other: object) -> bool:
+        return self is not other
+
+    def __hash__(self) -> int:
+        return object.__hash__(self)
+
+    def __bool__(self) -> bool:
+        return True
+
+    def _no_tuple_access(self, *args: object) -> NoReturn:
+        raise TypeError("GameState fields are read by name, not as a tuple")
+
+    __len__ = __getitem__ = __iter__ = __contains__ = _no_tuple_access
+    __lt__ = __le__ = __gt__ = __ge__ = _no_tuple_access
+
+    def __getnewargs__(self) -> Tuple[object, ...]:
+        # Copies and pickles rebuild the state from its fields
+        return tuple(_tuple_iter(self))
+
+    def _asdict(self) -> Dict[str, object]:
+        """Fields by name"""
+        return dict(zip(self._fields, _tuple_iter(self)))
+
+    # pylint: disable-next=arguments-differ
+    def _replace(self, **kwargs: object) -> "GameState":
+        """Same as with_updates, which packs boards and recounts reveals"""
+        return self.with_updates(**kwargs)
 
-        return new_state
+    @property
+    def remaining_safe(self) -> int:
+        """Number of safe cells that are still hidden"""
+        revealed_safe = self.revealed_count
+        if self.game_over:
+            # The counter includes the trap that ended the game
+            revealed_safe -= self.visible_board.count(TRAP_CODE)
+        return self.width * self.height - self.trap_count - revealed_safe
@@ -0,0 +1,206 @@
+"""
+Headless benchmarks for the game engine.
+
+Run with ``python -m src.bench``. Every operation is timed for each board size
+and trap percentage of the sweep, with a fixed seed, and the results are printed
+as JSON so runs can be diffed.
+"""
+
+import argparse
+import json
+import platform
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from .Domain import EMPTY_CODE, Position
+from .GameState import GameState
+from .initialize_game import count_adjacent_dangers, initialize_game, load_numpy
+from .io_game import render_board
+from .scan_position import auto_expand, is_win_condition, scan_position
+
+BenchResult = Dict[str, Union[str, int, float, None]]
+
+DEFAULT_SIZES: Tuple[Tuple[int, int], ...] = ((8, 8), (100, 100), (1000, 1000))
+DEFAULT_TRAP_PERCENTAGES: Tuple[float, ...] = (0.01, 0.15)
+# Measurements reported as null for operations that were skipped
+SKIPPED_FIELDS = ("calls", "seconds_per_op", "ops_per_sec", "peak_memory_bytes")
+
+
+def measure(operation: Callable[[], object], min_seconds: float = 0.2) -> BenchResult:
+    """Measure ops/sec of an operation and the peak memory of a single call"""
+    # Time without tracemalloc, which slows down allocations considerably
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while calls == 0 or elapsed < min_seconds:
+        operation()
+        calls += 1
+        elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "calls": calls,
+        "seconds_per_op": elapsed / calls,
+        "ops_per_sec": calls / elapsed,
+        "peak_memory_bytes": peak,
+    }
+
+
+def _sample_positions(
+    state: GameState, rng: random.Random, count: int = 64
+) -> List[Position]:
+    """Sample safe positions of a board"""
+    positions: List[Position] = []
+    while len(positions) < count:
+        pos = Position((rng.randrange(state.width), rng.randrange(state.height)))
+        if pos not in state.danger_positions:
+            positions.append(pos)
+    return positions
+
+
+def _cycle(
+    positions: Sequence[Position], action: Callable[[Position], object]
+) -> Callable[[], object]:
+    """Operation applying an action to the next position of a list each call"""
+    index = [0]
+
+    def operation() -> object:
+        pos = positions[index[0] % len(positions)]
+        index[0] += 1
+        return action(pos)
+
+    return operation
+
+
+def bench_configuration(
+    width: int,
+    height: int,
+    trap_percentage: float,
+    seed: int = 0,
+    min_seconds: float = 0.2,
+) -> List[BenchResult]:
+    """Benchmark every engine operation on one board configuration"""
+
+    def generate() -> GameState:
+        return initialize_game(width, height, trap_percentage, seed=seed)
+
+    state = generate()
+    rng = random.Random(seed)
+    positions = _sample_positions(state, rng)
+    hidden_board = state.hidden_board
+
+    # Expanding from the first empty cell floods the region around it
+    first_empty = hidden_board.cells.find(EMPTY_CODE)
+    empty_x, empty_y = first_empty % width, first_empty // width
+
+    # Operations that cannot run on this board map to the reason why
+    operations: Dict[str, Union[Callable[[], object], str]] = {
+        "initialize_game": generate,
+        "initialize_game_lazy": lambda: initialize_game(
+            width, height, trap_percentage, seed=seed, lazy=True
+        ),
+        "count_adjacent_dangers": _cycle(
+            positions,
+            lambda pos: count_adjacent_dangers(hidden_board, width, height, *pos),
+        ),
+        "scan_position": _cycle(positions, lambda pos: scan_position(state, pos)),
+        "is_win_condition": lambda: is_win_condition(state),
+        "render_board": lambda: render_board(state),
+    }
+    if first_empty != -1:
+        operations["auto_expand"] = lambda: auto_expand(state, empty_x, empty_y)
+    else:
+        operations["auto_expand"] = "no empty cell to expand from"
+
+    results: List[BenchResult] = []
+    for name, operation in operations.items():
+        result: BenchResult = {
+            "operation": name,
+            "width": width,
+            "height": height,
+            "trap_percentage": trap_percentage,
+        }
+        if isinstance(operation, str):
+            # Keep the entry so every configuration lists the same operations
+            result.update(dict.fromkeys(SKIPPED_FIELDS), skipped=operation)
+        else:
+            result.update(measure(operation, min_seconds))
+        results.append(result)
+
+    return results
+
+
+def run_benchmarks(
+    sizes: Sequence[Tuple[int, int]] = DEFAULT_SIZES,
+    trap_percentages: Sequence[float] = DEFAULT_TRAP_PERCENTAGES,
+    seed: int = 0,
+    min_seconds: float = 0.2,
+) -> Dict[str, object]:
+    """Run the benchmark sweep and collect the results in a JSON-ready dict"""
+    # Measure the fastest path on every size, not only on large boards
+    load_numpy()
+    results: List[BenchResult] = []
+    for width, height in sizes:
+        for trap_percentage in trap_percentages:
+            results.extend(
+                bench_configuration(width, height, trap_percentage, seed, min_seconds)
+            )
+
+    return {
+        "python": platform.python_version(),
+        "seed": seed,
+        "min_seconds": min_seconds,
+        "results": results,
+    }
+
+
+def parse_size(text: str) -> Tuple[int, int]:
+    """Parse a board size given as WIDTHxHEIGHT"""
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height or width)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run the benchmarks and print the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda text: [parse_size(size) for size in text.split(",")],
+        default=list(DEFAULT_SIZES),
+        help="comma-separated board sizes, e.g. 8x8,100x100",
+    )
+    parser.add_argument(
+        "--traps",
+        type=lambda text: [float(value) for value in text.split(",")],
+        default=list(DEFAULT_TRAP_PERCENTAGES),
+        help="comma-separated trap percentages, e.g. 0.01,0.15",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.2,
+        help="minimum time spent timing each operation",
+    )
+    parser.add_argument("--output", help="write the JSON to a file instead")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.traps, args.seed, args.min_seconds)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
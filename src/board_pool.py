@@ -0,0 +1,216 @@
+"""
+Pool of pre-generated games, filled by a background thread.
+
+Creating a large board takes hundreds of milliseconds, which bots playing many
+games in a row pay between every two games. A BoardPool keeps a bounded queue
+of ready games for every configuration that was requested recently and refills
+it in the background, so ``get`` usually just pops a finished game.
+
+Games are immutable, so a seeded configuration (whose board is always the same)
+is generated once and handed out every time. Configurations that were not
+requested for ``idle_seconds``, or that fall out of the ``max_configs`` most
+recently used ones, are evicted together with their queued games.
+
+The worker is a thread: it fills the queues while the players wait on I/O or
+sleep, and a miss generates the game in the caller like initialize_game would.
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, NamedTuple, Optional
+
+from .GameState import GameState
+from .initialize_game import initialize_game
+
+
+class PoolConfig(NamedTuple):
+    """Configuration of the games of one queue"""
+
+    width: int
+    height: int
+    trap_percentage: float = 0.15
+    seed: Optional[int] = None
+
+
+class PoolStats(NamedTuple):
+    """Counters of a pool since it was created"""
+
+    # Games handed out from a queue
+    hits: int
+    # Games generated by the caller because their queue was empty
+    misses: int
+    # Games generated by the background thread
+    generated: int
+    # Configurations dropped because they were not in use anymore
+    evicted: int
+
+
+class _Queue:
+    """Ready games of one configuration and when they were last requested"""
+
+    __slots__ = ("games", "last_used")
+
+    def __init__(self) -> None:
+        self.games: Deque[GameState] = deque()
+        self.last_used = time.monotonic()
+
+
+def generate(config: PoolConfig, rng: Optional[random.Random] = None) -> GameState:
+    """Create a game of a configuration, drawing its seed from rng if unseeded"""
+    seed = config.seed
+    if seed is None and rng is not None:
+        seed = rng.getrandbits(64)
+    return initialize_game(config.width, config.height, config.trap_percentage, seed)
+
+
+class BoardPool:
+    """Bounded queues of ready games, refilled by a background thread"""
+
+    def __init__(
+        self,
+        queue_size: int = 4,
+        max_configs: int = 8,
+        idle_seconds: float = 300.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.queue_size = queue_size
+        self.max_configs = max_configs
+        self.idle_seconds = idle_seconds
+        self.queues: "OrderedDict[PoolConfig, _Queue]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.evicted = 0
+        self._rng = random.Random(seed)
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(
+            target=self._fill, name="board-pool", daemon=True
+        )
+        self._worker.start()
+
+    @property
+    def stats(self) -> PoolStats:
+        """Hit, miss, generation and eviction counters"""
+        with self._condition:
+            return PoolStats(self.hits, self.misses, self.generated, self.evicted)
+
+    def _wanted(self, config: PoolConfig) -> int:
+        """Number of games to keep ready for a configuration"""
+        return 1 if config.seed is not None else self.queue_size
+
+    def _use(self, config: PoolConfig) -> _Queue:
+        """Queue of a configuration, registering it first if needed"""
+        queue = self.queues.get(config)
+        if queue is None:
+            queue = self.queues[config] = _Queue()
+            while len(self.queues) > self.max_configs:
+                self.queues.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.queues.move_to_end(config)
+            queue.last_used = time.monotonic()
+        self._condition.notify_all()
+        return queue
+
+    def _evict_idle(self) -> None:
+        """Drop the configurations that were not requested for idle_seconds"""
+        deadline = time.monotonic() - self.idle_seconds
+        for config in [c for c, q in self.queues.items() if q.last_used < deadline]:
+            del self.queues[config]
+            self.evicted += 1
+
+    def prefetch(
+        self,
+        width: int,
+        height: int,
+        trap_percentage: float = 0.15,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Start filling the queue of a configuration without taking a game"""
+        with self._condition:
+            self._use(PoolConfig(width, height, trap_percentage, seed))
+
+    def get(
+        self,
+        width: int,
+        height: int,
+        trap_percentage: float = 0.15,
+        seed: Optional[int] = None,
+    ) -> GameState:
+        """Take a ready game, or generate one right away if none is ready"""
+        config = PoolConfig(width, height, trap_percentage, seed)
+        with self._condition:
+            queue = self._use(config)
+            if queue.games:
+                self.hits += 1
+                # Seeded games stay queued, they are the same every time
+                return queue.games[0] if seed is not None else queue.games.popleft()
+            self.misses += 1
+
+        state = generate(config)
+        if seed is not None:
+            with self._condition:
+                seeded = self.queues.get(config)
+                if seeded is not None:
+                    # Hand out one instance even if the worker finished first
+                    if seeded.games:
+                        return seeded.games[0]
+                    seeded.games.append(state)
+        return state
+
+    def wait_filled(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queue is full; False if the timeout passed first"""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: all(
+                    len(queue.games) >= self._wanted(config)
+                    for config, queue in self.queues.items()
+                ),
+                timeout,
+            )
+
+    def _next_config(self) -> Optional[PoolConfig]:
+        """Most recently used configuration whose queue is not full"""
+        for config in reversed(self.queues):
+            if len(self.queues[config].games) < self._wanted(config):
+                return config
+        return None
+
+    def _fill(self) -> None:
+        """Background loop generating games for the queues that are not full"""
+        while True:
+            with self._condition:
+                self._evict_idle()
+                config = self._next_config()
+                while config is None and not self._closed:
+                    self._condition.wait(timeout=max(self.idle_seconds, 0.01))
+                    self._evict_idle()
+                    config = self._next_config()
+                if self._closed or config is None:
+                    return
+
+            state = generate(config, self._rng)
+
+            with self._condition:
+                queue = self.queues.get(config)
+                if queue is not None and len(queue.games) < self._wanted(config):
+                    queue.games.append(state)
+                    self.generated += 1
+                    self._condition.notify_all()
+
+    def close(self) -> None:
+        """Stop the background thread and drop all queued games"""
+        with self._condition:
+            self._closed = True
+            self.queues.clear()
+            self._condition.notify_all()
+        self._worker.join()
+
+    def __enter__(self) -> "BoardPool":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
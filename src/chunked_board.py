@@ -0,0 +1,495 @@
+"""
+Sparse chunked boards for effectively unbounded maps.
+
+The map is split into CHUNK_SIZE x CHUNK_SIZE chunks. Hidden chunks are generated
+on demand from the seed and the chunk coordinates, so any chunk can be rebuilt at
+any time and only a bounded cache of them is kept. Visible chunks only exist once
+a cell in them has been revealed; chunks that were not written for a while can be
+evicted to files in a directory and are read back when they are needed again.
+"""
+
+import os
+import random
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import AbstractSet, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from .Board import CELL_TABLE, Board, chunked_map_error
+from .Domain import HIDDEN, HIDDEN_CODE, TRAP_CODE, Position
+from .GameState import GameState
+from .initialize_game import adjacent_row, sample_trap_indices
+
+CHUNK_SHIFT = 6
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+CHUNK_CELLS = CHUNK_SIZE * CHUNK_SIZE
+
+# Side length of chunked maps, large enough to never reach an edge in play
+CHUNKED_BOARD_SIZE = 1 << 32
+
+# Below about 10% traps the empty cells form one infinite region, which a
+# single scan would try to reveal
+MIN_TRAP_PERCENTAGE = 0.12
+
+ChunkKey = Tuple[int, int]
+
+# Local positions of the cells on the border of a chunk, each with the offsets
+# of its neighbors in other chunks
+EDGE_CELLS: Tuple[Tuple[int, int, Tuple[Tuple[int, int], ...]], ...] = tuple(
+    (
+        x,
+        y,
+        tuple(
+            (dx, dy)
+            for dy in (-1, 0, 1)
+            for dx in (-1, 0, 1)
+            if not (0 <= x + dx < CHUNK_SIZE and 0 <= y + dy < CHUNK_SIZE)
+        ),
+    )
+    for y in range(CHUNK_SIZE)
+    for x in range(CHUNK_SIZE)
+    if x in (0, CHUNK_MASK) or y in (0, CHUNK_MASK)
+)
+
+
+class ChunkStore:
+    """Eviction bookkeeping shared by a chunked board and all its copies"""
+
+    def __init__(
+        self, directory: Optional[str] = None, max_resident_chunks: int = 1024
+    ) -> None:
+        self.directory = directory
+        self.max_resident_chunks = max_resident_chunks
+        # Chunk keys from least to most recently written
+        self.recent: "OrderedDict[ChunkKey, None]" = OrderedDict()
+        self._next_token = 0
+        # Boards referring to each file, which is deleted once none is left
+        self._references: "Counter[int]" = Counter()
+        # Shared read-only chunk standing in for chunks nobody revealed yet
+        self.hidden_chunk = Board.filled(CHUNK_SIZE, CHUNK_SIZE, HIDDEN)
+
+    def touch(self, key: ChunkKey) -> None:
+        """Mark a chunk as the most recently written one"""
+        self.recent[key] = None
+        self.recent.move_to_end(key)
+
+    def _path(self, token: int) -> str:
+        assert self.directory is not None
+        return os.path.join(self.directory, f"{token}.chunk")
+
+    def save(self, chunk: Board) -> int:
+        """Write a chunk to disk and return the token to read it back
+
+        The caller holds the only reference to the new file.
+        """
+        token = self._next_token
+        self._next_token += 1
+        with open(self._path(token), "wb") as file:
+            file.write(chunk.cells)
+        self._references[token] = 1
+        return token
+
+    def retain(self, token: int) -> None:
+        """Add a reference to a chunk file"""
+        self._references[token] += 1
+
+    def release(self, token: int) -> None:
+        """Drop a reference to a chunk file, deleting it with the last one"""
+        self._references[token] -= 1
+        if self._references[token] <= 0:
+            del self._references[token]
+            try:
+                os.remove(self._path(token))
+            except OSError:
+                pass
+
+    def load(self, token: int) -> Board:
+        """Read a chunk written by save"""
+        with open(self._path(token), "rb") as file:
+            return Board.from_cells(CHUNK_SIZE, CHUNK_SIZE, file.read())
+
+
+class _ChunkedBoardBase(Board, ABC):
+    """Board whose cells live in square chunks returned by chunk()"""
+
+    __slots__ = ()
+
+    flat = False
+
+    def __init__(self, width: int, height: int) -> None:
+        # pylint: disable=super-init-not-called
+        self.width = width
+        self.height = height
+
+    @abstractmethod
+    def chunk(self, cx: int, cy: int) -> Board:
+        """Get the chunk at the given chunk coordinates"""
+
+    def get(self, x: int, y: int) -> int:
+        """Get the cell code at the given position"""
+        chunk = self.chunk(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        return chunk.rows[y & CHUNK_MASK][x & CHUNK_MASK]
+
+    def row_codes(self, y: int, start: int = 0, stop: Optional[int] = None) -> bytes:
+        """Get the cell codes of a slice of a row, assembled from its chunks"""
+        if stop is None:
+            stop = self.width
+        cy, local_y = y >> CHUNK_SHIFT, y & CHUNK_MASK
+        parts = []
+        for cx in range(start >> CHUNK_SHIFT, ((stop - 1) >> CHUNK_SHIFT) + 1):
+            left = max(start - (cx << CHUNK_SHIFT), 0)
+            right = min(stop - (cx << CHUNK_SHIFT), CHUNK_SIZE)
+            parts.append(self.chunk(cx, cy).rows[local_y][left:right])
+        return b"".join(parts)
+
+    def row_text(self, y: int, start: int = 0, stop: Optional[int] = None) -> str:
+        """Get the displayed characters of a slice of a row"""
+        return self.row_codes(y, start, stop).translate(CELL_TABLE).decode("ascii")
+
+    def shares_row(
+        self, other: Board, y: int, start: int = 0, stop: Optional[int] = None
+    ) -> bool:
+        """Chunked boards do not track shared rows"""
+        return False
+
+    def writable_row(self, y: int) -> bytearray:
+        """Chunked boards write cells through their chunks, see set()"""
+        raise chunked_map_error("Writing whole rows")
+
+    @property
+    def rows(self) -> List[bytearray]:  # type: ignore[override]
+        """Chunked boards only hold rows per chunk, see chunk()"""
+        raise chunked_map_error("Listing the rows")
+
+    @property
+    def cells(self) -> bytes:
+        """Chunked boards are too large to flatten"""
+        raise chunked_map_error("Flattening the cells")
+
+
+class ChunkedHiddenBoard(_ChunkedBoardBase):
+    """Hidden board of an unbounded map, generated chunk by chunk from a seed
+
+    Every chunk holds the same number of traps, placed by a generator seeded
+    with the map seed and the chunk coordinates. Generated chunks are kept in a
+    bounded cache and rebuilt when they are needed again.
+    """
+
+    __slots__ = (
+        "seed",
+        "traps_per_chunk",
+        "cache_size",
+        "generated",
+        "_masks",
+        "_chunks",
+    )
+
+    def __init__(
+        self,
+        seed: int,
+        trap_percentage: float,
+        size: int = CHUNKED_BOARD_SIZE,
+        cache_size: int = 256,
+    ) -> None:
+        super().__init__(size, size)
+        self.seed = seed
+        self.traps_per_chunk = max(
+            1, min(int(CHUNK_CELLS * trap_percentage), CHUNK_CELLS - 1)
+        )
+        self.cache_size = cache_size
+        # Keys of all chunks generated so far, to list their traps
+        self.generated: Set[ChunkKey] = set()
+        self._masks: "OrderedDict[ChunkKey, bytes]" = OrderedDict()
+        self._chunks: "OrderedDict[ChunkKey, Board]" = OrderedDict()
+
+    def trap_mask(self, cx: int, cy: int) -> bytes:
+        """One 0/1 byte per cell of a chunk, 1 marking traps"""
+        key = (cx, cy)
+        mask = self._masks.get(key)
+        if mask is None:
+            rng = random.Random(f"{self.seed}/{cx}/{cy}")
+            cells = bytearray(CHUNK_CELLS)
+            for index in sample_trap_indices(CHUNK_CELLS, self.traps_per_chunk, rng):
+                cells[index] = 1
+            mask = self._masks[key] = bytes(cells)
+            # Every hidden chunk reads the masks of its 8 neighbors
+            if len(self._masks) > 9 * self.cache_size:
+                self._masks.popitem(last=False)
+        return mask
+
+    def chunk(self, cx: int, cy: int) -> Board:
+        """Get the hidden chunk at the given chunk coordinates, generating it"""
+        key = (cx, cy)
+        chunk = self._chunks.get(key)
+        if chunk is not None:
+            self._chunks.move_to_end(key)
+            return chunk
+
+        # Trap masks of the chunk with a one-cell border from its neighbors
+        padded = []
+        for dy in (-1, 0, 1):
+            if not 0 <= cy + dy < self.height >> CHUNK_SHIFT:
+                padded.append([bytes(CHUNK_SIZE + 2)] * CHUNK_SIZE)
+                continue
+            rows = [
+                (
+                    self.trap_mask(cx + dx, cy + dy)
+                    if 0 <= cx + dx < self.width >> CHUNK_SHIFT
+                    else bytes(CHUNK_CELLS)
+                )
+                for dx in (-1, 0, 1)
+            ]
+            padded.append(
+                [
+                    rows[0][y * CHUNK_SIZE + CHUNK_MASK : (y + 1) * CHUNK_SIZE]
+                    + rows[1][y * CHUNK_SIZE : (y + 1) * CHUNK_SIZE]
+                    + rows[2][y * CHUNK_SIZE : y * CHUNK_SIZE + 1]
+                    for y in range(CHUNK_SIZE)
+                ]
+            )
+        masks = [padded[0][-1], *padded[1], padded[2][0]]
+
+        chunk = Board(
+            CHUNK_SIZE,
+            CHUNK_SIZE,
+            [
+                adjacent_row(masks[y], masks[y + 1], masks[y + 2])[1:-1]
+                for y in range(CHUNK_SIZE)
+            ],
+        )
+        self.generated.add(key)
+        self._chunks[key] = chunk
+        if len(self._chunks) > self.cache_size:
+            self._chunks.popitem(last=False)
+        return chunk
+
+
+class ChunkedTraps(AbstractSet[Position]):
+    """Trap positions of a chunked hidden board
+
+    Membership works for the whole map; iterating and len() cover the chunks
+    generated so far.
+    """
+
+    __slots__ = ("hidden_board",)
+
+    def __init__(self, hidden_board: ChunkedHiddenBoard) -> None:
+        self.hidden_board = hidden_board
+
+    def __contains__(self, pos: object) -> bool:
+        if not isinstance(pos, tuple) or len(pos) != 2:
+            return False
+        x, y = pos
+        board = self.hidden_board
+        return (
+            0 <= x < board.width
+            and 0 <= y < board.height
+            and board.get(x, y) == TRAP_CODE
+        )
+
+    def __len__(self) -> int:
+        return len(self.hidden_board.generated) * self.hidden_board.traps_per_chunk
+
+    def __iter__(self) -> Iterator[Position]:
+        for cx, cy in sorted(self.hidden_board.generated):
+            mask = self.hidden_board.trap_mask(cx, cy)
+            index = mask.find(1)
+            while index != -1:
+                yield Position(
+                    (
+                        (cx << CHUNK_SHIFT) + (index & CHUNK_MASK),
+                        (cy << CHUNK_SHIFT) + (index >> CHUNK_SHIFT),
+                    )
+                )
+                index = mask.find(1, index + 1)
+
+
+class ChunkedBoard(_ChunkedBoardBase):
+    """Visible board of an unbounded map storing only the revealed chunks
+
+    Copies share their chunks and copy a chunk (itself copy-on-write by row)
+    before its first write. Chunks missing from the dict are fully hidden, and
+    evicted chunks are stored as the token of their file. Files stay on disk
+    while a board refers to them and are deleted when the last one is dropped.
+    """
+
+    __slots__ = ("store", "chunks", "_owned_chunks", "_resident", "_tokens")
+
+    def __init__(
+        self,
+        store: ChunkStore,
+        size: int = CHUNKED_BOARD_SIZE,
+        chunks: Optional[Dict[ChunkKey, Union[Board, int]]] = None,
+        tokens: Optional[Dict[ChunkKey, int]] = None,
+    ) -> None:
+        super().__init__(size, size)
+        self.store = store
+        self.chunks: Dict[ChunkKey, Union[Board, int]] = chunks or {}
+        # Chunks this board may write without copying them
+        self._owned_chunks: Set[ChunkKey] = set()
+        # Files holding the current content of chunks, evicted or read back
+        self._tokens: Dict[ChunkKey, int] = tokens or {}
+        for token in self._tokens.values():
+            store.retain(token)
+        self._resident = sum(
+            isinstance(chunk, Board) for chunk in self.chunks.values()
+        )
+
+    def chunk(self, cx: int, cy: int) -> Board:
+        """Get the visible chunk at the given chunk coordinates"""
+        stored = self.chunks.get((cx, cy))
+        if stored is None:
+            return self.store.hidden_chunk
+        if isinstance(stored, int):
+            chunk = self.store.load(stored)
+            self._make_resident((cx, cy), chunk)
+            return chunk
+        return stored
+
+    def writable_chunk(self, cx: int, cy: int) -> Board:
+        """Get a chunk for writing in place, copying it first if it is shared"""
+        key = (cx, cy)
+        if key not in self._owned_chunks:
+            self._make_resident(key, self.chunk(cx, cy).copy())
+            self._owned_chunks.add(key)
+            # The file no longer matches the chunk about to be written
+            token = self._tokens.pop(key, None)
+            if token is not None:
+                self.store.release(token)
+        self.store.touch(key)
+        chunk = self.chunks[key]
+        assert isinstance(chunk, Board)
+        return chunk
+
+    def _make_resident(self, key: ChunkKey, chunk: Board) -> None:
+        """Keep a chunk in memory, evicting cold chunks if there are too many"""
+        if not isinstance(self.chunks.get(key), Board):
+            self._resident += 1
+        self.chunks[key] = chunk
+        if (
+            self.store.directory is not None
+            and self._resident > self.store.max_resident_chunks
+        ):
+            self.evict(self.store.max_resident_chunks // 2, keep=key)
+
+    def evict(self, max_resident: int, keep: Optional[ChunkKey] = None) -> int:
+        """Write the least recently written chunks to disk until at most
+        max_resident chunks stay in memory, and return how many were evicted
+        """
+        evicted = 0
+        for key in list(self.store.recent):
+            if self._resident <= max_resident:
+                break
+            chunk = self.chunks.get(key)
+            if key == keep or not isinstance(chunk, Board):
+                continue
+            # Chunks read back and not written since still match their file
+            token = self._tokens.get(key)
+            if token is None:
+                token = self._tokens[key] = self.store.save(chunk)
+            self.chunks[key] = token
+            self._owned_chunks.discard(key)
+            self._resident -= 1
+            evicted += 1
+        return evicted
+
+    @property
+    def resident_chunks(self) -> int:
+        """Number of chunks held in memory"""
+        return self._resident
+
+    def set(self, x: int, y: int, code: int) -> None:
+        """Set the cell code at the given position (only on fresh copies)"""
+        chunk = self.writable_chunk(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk.set(x & CHUNK_MASK, y & CHUNK_MASK, code)
+
+    def copy(self) -> "ChunkedBoard":
+        """Create a copy that shares all chunks until they are written"""
+        new_board = ChunkedBoard(
+            self.store, self.width, dict(self.chunks), dict(self._tokens)
+        )
+        # Both boards now share every chunk, so neither may write in place
+        self._owned_chunks = set()
+        return new_board
+
+    def count(self, code: int) -> int:
+        """Count the cells holding the given code"""
+        count = sum(
+            self.chunk(cx, cy).count(code) for cx, cy in list(self.chunks)
+        )
+        if code == HIDDEN_CODE:
+            # Chunks that were never revealed are fully hidden
+            count += (self.width * self.height) - len(self.chunks) * CHUNK_CELLS
+        return count
+
+    def shares_row(
+        self, other: Board, y: int, start: int = 0, stop: Optional[int] = None
+    ) -> bool:
+        """Whether the chunks under a row slice are shared with another board"""
+        if not isinstance(other, ChunkedBoard):
+            return False
+        if stop is None:
+            stop = self.width
+        cy = y >> CHUNK_SHIFT
+        return all(
+            self.chunks.get((cx, cy)) is other.chunks.get((cx, cy))
+            for cx in range(start >> CHUNK_SHIFT, ((stop - 1) >> CHUNK_SHIFT) + 1)
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the resident chunks in bytes"""
+        return sum(
+            chunk.nbytes for chunk in self.chunks.values() if isinstance(chunk, Board)
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ChunkedBoard):
+            return NotImplemented
+        keys = self.chunks.keys() | other.chunks.keys()
+        return self.width == other.width and all(
+            self.chunk(*key) == other.chunk(*key) for key in keys
+        )
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __del__(self) -> None:
+        for token in self._tokens.values():
+            self.store.release(token)
+
+
+def initialize_chunked_game(
+    trap_percentage: float = 0.15,
+    seed: Optional[int] = None,
+    directory: Optional[str] = None,
+    max_resident_chunks: int = 1024,
+) -> GameState:
+    """Start a game on an unbounded chunked map
+
+    The map is CHUNKED_BOARD_SIZE cells wide and high; start near the middle
+    and render it through a viewport. With a directory, cold visible chunks are
+    evicted there once more than max_resident_chunks are in memory.
+    """
+    if trap_percentage < MIN_TRAP_PERCENTAGE:
+        raise ValueError(
+            f"Unbounded maps need at least {MIN_TRAP_PERCENTAGE:.0%} traps, "
+            "otherwise a scan can reveal an infinite empty region"
+        )
+    if seed is None:
+        seed = random.getrandbits(64)
+    hidden_board = ChunkedHiddenBoard(seed, trap_percentage)
+    visible_board = ChunkedBoard(ChunkStore(directory, max_resident_chunks))
+    chunk_count = (hidden_board.width >> CHUNK_SHIFT) * (
+        hidden_board.height >> CHUNK_SHIFT
+    )
+
+    return GameState(
+        width=hidden_board.width,
+        height=hidden_board.height,
+        trap_count=chunk_count * hidden_board.traps_per_chunk,
+        hidden_board=hidden_board,
+        visible_board=visible_board,
+        danger_positions=ChunkedTraps(hidden_board),
+        revealed_count=0,
+        seed=seed,
+    )
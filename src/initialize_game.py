@@ -1,8 +1,34 @@
 import random
-from typing import List, cast
+from array import array
+from typing import (
+    AbstractSet,
+    Any,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+    cast,
+    overload,
+)
 
-from .Domain import EMPTY, HIDDEN, TRAP, CellContent, GameBoard, HiddenBoard, Position
+from .Board import Board, TrapBitset
+from .Domain import EMPTY, HIDDEN, TRAP, TRAP_CODE, CellContent, HiddenBoard, Position
 from .GameState import GameState
+from .neighbors import neighbor_table
+from .no_guess import check_position, no_guess_trap_indices
+from .profiling import timed
+
+# NumPy is optional and imported on first use: importing it takes longer than
+# generating a board below this size in pure Python
+NUMPY_MIN_CELLS = 65536
+np: Any = None
+_numpy_checked = False
+
+# Maps trap codes to 1 and every other cell code to 0
+TRAP_MASK = bytes(1 if code == TRAP_CODE else 0 for code in range(256))
 
 
 def create_empty_board(
@@ -13,63 +39,342 @@ def create_empty_board(
 
 
 def count_adjacent_dangers(
-    board: HiddenBoard, width: int, height: int, x: int, y: int
+    board: Union[HiddenBoard, Board],
+    width: int,
+    height: int,
+    x: int,
+    y: int,
+    wrap: bool = False,
 ) -> int:
-    """Count adjacent dangers around a given position"""
+    """Count adjacent dangers around a given position
+
+    With wrap the board is a torus and the edges are adjacent to each other.
+    """
     count = 0
-    # Check all 8 adjacent cells
-    for dx in [-1, 0, 1]:
-        for dy in [-1, 0, 1]:
-            if dx == 0 and dy == 0:
-                continue  # Skip the center cell
-
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < width and 0 <= ny < height and board[ny][nx] == TRAP:
+    if isinstance(board, Board):
+        get = board.get
+        for dx, dy in neighbor_table(width, height, wrap).deltas(x, y):
+            if get(x + dx, y + dy) == TRAP_CODE:
+                count += 1
+    else:
+        for dx, dy in neighbor_table(width, height, wrap).deltas(x, y):
+            if board[y + dy][x + dx] == TRAP:
                 count += 1
 
     return count
 
 
+def adjacent_row(above: bytes, middle: bytes, below: bytes) -> bytearray:
+    """Compute the cell codes of a row from the trap masks of 3 rows"""
+    # Column sums of the 3 rows, padded so the window never leaves the board
+    column = [0, *(a + b + c for a, b, c in zip(above, middle, below)), 0]
+    # For safe cells the 3x3 window sum equals the adjacent trap count
+    return bytearray(
+        TRAP_CODE if trap else left + center + right
+        for trap, left, center, right in zip(middle, column, column[1:], column[2:])
+    )
+
+
+def _adjacent_counts_python(traps: Board) -> Board:
+    """Compute all cell codes by summing shifted rows of the trap mask"""
+    width, height = traps.width, traps.height
+    masks = [traps.row_codes(y).translate(TRAP_MASK) for y in range(height)]
+    zero_row = bytes(width)
+    rows: List[bytearray] = []
+
+    for y in range(height):
+        above = masks[y - 1] if y > 0 else zero_row
+        below = masks[y + 1] if y + 1 < height else zero_row
+        rows.append(adjacent_row(above, masks[y], below))
+
+    return Board(width, height, rows)
+
+
+def _adjacent_counts_numpy(traps: Board) -> Board:
+    """Compute all cell codes by summing the 8 shifted slices of the trap mask"""
+    width, height = traps.width, traps.height
+    mask = np.frombuffer(traps.cells, dtype=np.uint8).reshape(height, width)
+    mask = mask == TRAP_CODE
+
+    padded = np.zeros((height + 2, width + 2), dtype=np.uint8)
+    padded[1:-1, 1:-1] = mask
+    counts = np.zeros((height, width), dtype=np.uint8)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if dx != 1 or dy != 1:
+                counts += padded[dy : dy + height, dx : dx + width]
+
+    cells = np.where(mask, np.uint8(TRAP_CODE), counts).tobytes()
+    return Board.from_cells(width, height, cells)
+
+
+def load_numpy() -> bool:
+    """Import NumPy if it was not tried yet; whether it is available"""
+    global np, _numpy_checked  # pylint: disable=global-statement
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy  # pylint: disable=import-outside-toplevel
+
+            np = numpy
+        except ImportError:  # NumPy is optional, fall back to pure Python
+            pass
+    return np is not None
+
+
+def compute_adjacent_counts(traps: Board, use_numpy: Optional[bool] = None) -> Board:
+    """Compute the hidden board for a board holding only traps in one batch
+
+    By default NumPy is used once it is imported, and imported for boards of
+    at least NUMPY_MIN_CELLS cells.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None or (
+            traps.width * traps.height >= NUMPY_MIN_CELLS and load_numpy()
+        )
+    if use_numpy:
+        load_numpy()
+        return _adjacent_counts_numpy(traps)
+    return _adjacent_counts_python(traps)
+
+
+class LazyRows(Sequence[bytearray]):
+    """Rows of a hidden board, each computed from the traps on first access"""
+
+    __slots__ = ("traps", "computed", "_zero_row")
+
+    def __init__(self, traps: TrapBitset) -> None:
+        self.traps = traps
+        self.computed: List[Optional[bytearray]] = [None] * traps.height
+        self._zero_row = bytes(traps.width)
+
+    def _mask(self, y: int) -> bytes:
+        if 0 <= y < self.traps.height:
+            return self.traps.row_mask(y)
+        return self._zero_row
+
+    @overload
+    def __getitem__(self, index: int) -> bytearray: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[bytearray]: ...
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[bytearray, List[bytearray]]:
+        if isinstance(index, slice):
+            return [self[y] for y in range(self.traps.height)[index]]
+        row = self.computed[index]
+        if row is None:
+            y = index % self.traps.height
+            row = self.computed[y] = adjacent_row(
+                self._mask(y - 1), self._mask(y), self._mask(y + 1)
+            )
+        return row
+
+    def __len__(self) -> int:
+        return self.traps.height
+
+    def __iter__(self) -> Iterator[bytearray]:
+        return (self[y] for y in range(self.traps.height))
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, LazyRows)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+class LazyHiddenBoard(Board):
+    """Hidden board keeping only the trap bitset until rows are read
+
+    Rows are computed and memoized the first time a scan or an expansion reads
+    them, so creating the board costs O(trap count) instead of O(cells).
+    """
+
+    __slots__ = ("traps",)
+
+    def __init__(self, traps: TrapBitset) -> None:
+        rows = cast(List[bytearray], LazyRows(traps))
+        super().__init__(traps.width, traps.height, rows)
+        self.traps = traps
+
+    @property
+    def computed_rows(self) -> int:
+        """Number of rows computed so far"""
+        rows = self.rows
+        assert isinstance(rows, LazyRows)
+        return sum(row is not None for row in rows.computed)
+
+
+def sample_trap_indices(
+    cell_count: int,
+    trap_count: int,
+    rng: random.Random,
+    exclude: Optional[int] = None,
+) -> List[int]:
+    """Sample distinct flat trap indices without materializing all positions"""
+    # Sample from the cells left after removing the excluded one
+    available = cell_count - 1 if exclude is not None else cell_count
+
+    if trap_count * 2 <= available:
+        # Sparse boards: rejection sampling needs O(trap_count) memory
+        chosen: Set[int] = set()
+        while len(chosen) < trap_count:
+            chosen.add(rng.randrange(available))
+        indices = list(chosen)
+    else:
+        # Dense boards: partial Fisher-Yates shuffle over a compact index array
+        pool = array("I", range(available))
+        for i in range(trap_count):
+            j = rng.randrange(i, available)
+            pool[i], pool[j] = pool[j], pool[i]
+        indices = list(pool[:trap_count])
+
+    if exclude is not None:
+        indices = [index + 1 if index >= exclude else index for index in indices]
+    return indices
+
+
+def generate_hidden_board(
+    width: int,
+    height: int,
+    trap_count: int,
+    rng: random.Random,
+    safe_position: Optional[Position] = None,
+    lazy: bool = False,
+    no_guess: bool = False,
+) -> Tuple[AbstractSet[Position], Board]:
+    """Place traps at random and compute the hidden board around them
+
+    With lazy the traps are kept as a bitset and the hidden board computes its
+    rows on first access. With no_guess the board can be cleared from
+    safe_position by deduction alone.
+    """
+    if no_guess:
+        if safe_position is None:
+            raise ValueError("No-guess boards need a safe position")
+        indices = no_guess_trap_indices(width, height, trap_count, rng, safe_position)
+    else:
+        exclude = None
+        if safe_position is not None:
+            safe_x, safe_y = safe_position
+            exclude = safe_y * width + safe_x
+        indices = sample_trap_indices(width * height, trap_count, rng, exclude)
+
+    if lazy:
+        traps_bitset = TrapBitset.from_indices(width, height, indices)
+        return traps_bitset, LazyHiddenBoard(traps_bitset)
+
+    # Place dangers on an empty board
+    traps = Board.filled(width, height, EMPTY)
+    danger_positions: Set[Position] = set()
+    for index in indices:
+        y, x = divmod(index, width)
+        traps.set(x, y, TRAP_CODE)
+        danger_positions.add(Position((x, y)))
+
+    # Calculate adjacent danger counts for the whole hidden board at once
+    return danger_positions, compute_adjacent_counts(traps)
+
+
+@timed
+def place_traps(state: GameState, safe_position: Position) -> GameState:
+    """Place the traps of a game started with a safe first click"""
+    danger_positions, hidden_board = generate_hidden_board(
+        state.width,
+        state.height,
+        state.trap_count,
+        random.Random(state.seed),
+        safe_position,
+        lazy=isinstance(state.hidden_board, LazyHiddenBoard),
+    )
+    return state.with_updates(
+        hidden_board=hidden_board,
+        danger_positions=danger_positions,
+        traps_placed=True,
+    )
+
+
+@timed
 def initialize_game(
-    width: int = 8, height: int = 8, trap_percentage: float = 0.15
+    width: int = 8,
+    height: int = 8,
+    trap_percentage: float = 0.15,
+    seed: Optional[int] = None,
+    rng: Optional[random.Random] = None,
+    safe_first_click: bool = False,
+    lazy: bool = False,
+    no_guess: bool = False,
+    first_click: Optional[Position] = None,
 ) -> GameState:
-    """Initialize a new game with the given parameters"""
+    """Initialize a new game with the given parameters
+
+    Games with the same seed have the same traps; pass either a seed or an rng
+    to draw them from, not both. With safe_first_click the traps are only
+    placed by the first scan, which never hits one. With lazy
+    the adjacency counts of a row are only computed when the row is first read,
+    which makes creating giant boards proportional to the trap count.
+
+    A given first_click is never a trap. With no_guess the board can be
+    cleared without guessing after scanning first_click (the center by
+    default), which opens an empty area.
+    """
+    if seed is not None and rng is not None:
+        raise ValueError("Pass either a seed or an rng, not both")
+
     if width < 5 or height < 5:
         # Ensure minimum board size requirement is met
         width = max(width, 5)
         height = max(height, 5)
 
+    if first_click is not None:
+        check_position(width, height, first_click)
+
     # Calculate number of traps based on percentage
     trap_count = int(width * height * trap_percentage)
     trap_count = max(
         1, min(trap_count, width * height - 1)
     )  # Ensure at least 1 trap, but not all
 
-    # Create empty boards
-    hidden_board = cast(HiddenBoard, create_empty_board(width, height, EMPTY))
-    visible_board = cast(GameBoard, create_empty_board(width, height, HIDDEN))
+    if rng is None:
+        if seed is None:
+            # Draw from the global generator so random.seed() reproduces games
+            seed = random.getrandbits(64)
+        rng = random.Random(seed)
 
-    # Generate danger positions
-    all_positions = [(x, y) for x in range(width) for y in range(height)]
-    danger_positions = set(
-        cast(List[Position], random.sample(all_positions, trap_count))
-    )
+    visible_board = Board.filled(width, height, HIDDEN)
 
-    # Place dangers on hidden board
-    for pos in danger_positions:
-        x, y = pos
-        hidden_board[y][x] = TRAP
+    if no_guess and safe_first_click:
+        raise ValueError("No-guess boards are generated for a known first click")
 
-    # Calculate adjacent danger counts and update the hidden board
-    for y in range(height):
-        for x in range(width):
-            pos = Position((x, y))
-            if pos not in danger_positions:
-                adjacent_count = count_adjacent_dangers(
-                    hidden_board, width, height, x, y
-                )
-                if adjacent_count > 0:
-                    hidden_board[y][x] = CellContent(str(adjacent_count))
+    if safe_first_click:
+        # Traps are placed from the seed once the first position is known
+        if seed is None:
+            seed = rng.getrandbits(64)
+        hidden_board: Board = (
+            LazyHiddenBoard(TrapBitset.from_indices(width, height, []))
+            if lazy
+            else Board.filled(width, height, EMPTY)
+        )
+        return GameState(
+            width=width,
+            height=height,
+            trap_count=trap_count,
+            hidden_board=hidden_board,
+            visible_board=visible_board,
+            danger_positions=set(),
+            revealed_count=0,
+            seed=seed,
+            traps_placed=False,
+        )
+
+    if no_guess and first_click is None:
+        first_click = Position((width // 2, height // 2))
+    danger_positions, hidden_board = generate_hidden_board(
+        width, height, trap_count, rng, first_click, lazy, no_guess
+    )
 
     return GameState(
         width=width,
@@ -78,4 +383,6 @@ def initialize_game(
         hidden_board=hidden_board,
         visible_board=visible_board,
         danger_positions=danger_positions,
+        revealed_count=0,
+        seed=seed,
     )
@@ -1,59 +1,358 @@
+import itertools
 import os
-from typing import Optional, Tuple
+import sys
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
-from .Domain import Position
+from .Domain import (
+    COMMAND_QUIT,
+    COMMAND_REDO,
+    COMMAND_UNDO,
+    KEY_DOWN,
+    KEY_LEFT,
+    KEY_QUIT,
+    KEY_REDO,
+    KEY_RIGHT,
+    KEY_SCAN,
+    KEY_UNDO,
+    KEY_UP,
+    Command,
+    Key,
+    Position,
+)
 from .GameState import GameState
+from .profiling import timed
 
+# ANSI control sequences
+CSI = "\033["
+CLEAR_SCREEN = CSI + "2J" + CSI + "H"
+CLEAR_BELOW = CSI + "J"
+ESCAPE = "\033"
+
+# Screen line where the board starts, below the three title lines
+BOARD_TOP = 4
+
+# Escape sequences of the arrow keys, in normal and application cursor mode
+ESCAPE_KEYS: Dict[str, Key] = {
+    ESCAPE: KEY_QUIT,
+    CSI + "A": KEY_UP,
+    CSI + "B": KEY_DOWN,
+    CSI + "C": KEY_RIGHT,
+    CSI + "D": KEY_LEFT,
+    ESCAPE + "OA": KEY_UP,
+    ESCAPE + "OB": KEY_DOWN,
+    ESCAPE + "OC": KEY_RIGHT,
+    ESCAPE + "OD": KEY_LEFT,
+}
+# Keys typed as a single character (vi and WASD keys move as well)
+CHARACTER_KEYS: Dict[str, Key] = {
+    " ": KEY_SCAN,
+    "\r": KEY_SCAN,
+    "\n": KEY_SCAN,
+    "k": KEY_UP,
+    "j": KEY_DOWN,
+    "h": KEY_LEFT,
+    "l": KEY_RIGHT,
+    "w": KEY_UP,
+    "s": KEY_DOWN,
+    "a": KEY_LEFT,
+    "d": KEY_RIGHT,
+    COMMAND_QUIT: KEY_QUIT,
+    COMMAND_UNDO: KEY_UNDO,
+    COMMAND_REDO: KEY_REDO,
+    "\x03": KEY_QUIT,  # Ctrl-C
+    "\x04": KEY_QUIT,  # Ctrl-D
+}
+# Cells the selection moves by for each arrow key
+KEY_STEPS: Dict[Key, Tuple[int, int]] = {
+    KEY_UP: (0, -1),
+    KEY_DOWN: (0, 1),
+    KEY_LEFT: (-1, 0),
+    KEY_RIGHT: (1, 0),
+}
+
+if os.name == "nt":
+    os.system("")  # Enables ANSI escape sequences in the Windows console
+
+
+class Viewport(NamedTuple):
+    """Window of the board shown on screen, in board coordinates"""
+
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+def full_viewport(state: GameState) -> Viewport:
+    """Viewport showing the whole board"""
+    return Viewport(0, 0, state.width, state.height)
+
+
+def viewport_around(
+    state: GameState, center: Position, width: int, height: int
+) -> Viewport:
+    """Viewport of at most the given size centered on a position of the board"""
+    width = max(1, min(width, state.width))
+    height = max(1, min(height, state.height))
+    center_x, center_y = center
+
+    # Keep the window on the board near the edges
+    x = min(max(center_x - width // 2, 0), state.width - width)
+    y = min(max(center_y - height // 2, 0), state.height - height)
+    return Viewport(x, y, width, height)
+
+
+def terminal_size() -> Tuple[int, int]:
+    """Columns and lines of the terminal, or of a standard 80x24 one"""
+    columns, lines = 80, 24
+    # The original stdout is None in programs started without a console
+    if sys.__stdout__ is not None:
+        try:
+            columns, lines = os.get_terminal_size(sys.__stdout__.fileno())
+        except (AttributeError, OSError, ValueError):
+            pass
+    columns = int(os.environ.get("COLUMNS", columns))
+    lines = int(os.environ.get("LINES", lines))
+    return columns, lines
+
+
+def terminal_viewport(state: GameState, center: Position) -> Viewport:
+    """Largest viewport around a position that fits into the terminal"""
+    columns, lines = terminal_size()
+    # Leave room for row headers, borders, title, status and prompt lines
+    return viewport_around(
+        state, center, (columns - 2 - len(str(state.height))) // 2 - 2, lines - 9
+    )
+
+
+def move_viewport(state: GameState, viewport: Viewport, dx: int, dy: int) -> Viewport:
+    """Scroll a viewport by the given number of cells, stopping at the edges"""
+    x = min(max(viewport.x + dx, 0), state.width - viewport.width)
+    y = min(max(viewport.y + dy, 0), state.height - viewport.height)
+    return viewport._replace(x=x, y=y)
+
+
+def scroll_to(state: GameState, viewport: Viewport, pos: Position) -> Viewport:
+    """Scroll a viewport as little as possible to show a position"""
+    x, y = pos
+    dx = min(x - viewport.x, 0) + max(x - (viewport.x + viewport.width - 1), 0)
+    dy = min(y - viewport.y, 0) + max(y - (viewport.y + viewport.height - 1), 0)
+    if dx or dy:
+        return move_viewport(state, viewport, dx, dy)
+    return viewport
+
+
+def move_selection(state: GameState, pos: Position, key: Key) -> Position:
+    """Move a selected position by an arrow key, stopping at the edges"""
+    dx, dy = KEY_STEPS.get(key, (0, 0))
+    x, y = pos
+    return Position(
+        (min(max(x + dx, 0), state.width - 1), min(max(y + dy, 0), state.height - 1))
+    )
+
+
+def label_width(state: GameState) -> int:
+    """Width of the row labels, the same for every row of a board"""
+    return len(str(state.height - 1))
+
+
+def column_labels(left: int, right: int) -> str:
+    """Column labels aligned with the cells of the columns from left to right
+
+    Cells are 2 characters apart, so columns are labeled every 1, 2, 5, 10,
+    20, ... columns, whichever is the first step that leaves room for the
+    longest label and a space.
+    """
+    digits = len(str(max(right - 1, 0)))
+    step = 1
+    for factor in itertools.cycle((2, 2.5, 2)):
+        if 2 * step > digits:
+            break
+        step = int(step * factor)
+    # Labels may use the space of the closing " |" of the rows
+    end = 2 * (right - left) + 1
+    text = ""
+    for column in range(left + -left % step, right, step):
+        label = str(column)
+        offset = 2 * (column - left)
+        if offset + len(label) <= end:
+            text = text.ljust(offset) + label
+    return text
+
+
+def cell_screen_position(
+    state: GameState, viewport: Viewport, pos: Position, top: int = BOARD_TOP
+) -> Tuple[int, int]:
+    """1-based screen line and column of a cell drawn by render_board"""
+    x, y = pos
+    return top + 2 + y - viewport.y, label_width(state) + 4 + 2 * (x - viewport.x)
+
+
+def _escape_end(text: str, start: int) -> Optional[int]:
+    """End of the escape sequence starting at start, None if it is incomplete"""
+    if start + 1 == len(text):
+        return None
+    if text[start + 1] == "[":
+        # Control sequence: parameters up to a final byte from @ to ~
+        for end in range(start + 2, len(text)):
+            if "@" <= text[end] <= "~":
+                return end + 1
+        return None
+    if text[start + 1] == "O":
+        return start + 3 if start + 2 < len(text) else None
+    # Escape followed by an unrelated character: the escape key on its own
+    return start + 1
+
+
+class KeyParser:
+    """Incremental parser turning raw terminal input into keys
+
+    Input arrives in arbitrary chunks, so an escape sequence split across reads
+    is kept pending until its end arrives, or until flush() decides that it was
+    the escape key on its own. Unknown characters and sequences are skipped.
+    """
+
+    __slots__ = ("pending",)
+
+    def __init__(self) -> None:
+        self.pending = ""
+
+    def feed(self, data: str) -> List[Key]:
+        """Keys completed by the next chunk of input"""
+        text = self.pending + data
+        keys: List[Key] = []
+        start = 0
+        while start < len(text):
+            if text[start] != ESCAPE:
+                key = CHARACTER_KEYS.get(text[start].lower())
+                if key is not None:
+                    keys.append(key)
+                start += 1
+                continue
+            end = _escape_end(text, start)
+            if end is None:
+                break
+            key = ESCAPE_KEYS.get(text[start:end])
+            if key is not None:
+                keys.append(key)
+            start = end
+        self.pending = text[start:]
+        return keys
+
+    def flush(self) -> List[Key]:
+        """Keys of the pending input once no more input follows it"""
+        pending, self.pending = self.pending, ""
+        return [KEY_QUIT] if pending == ESCAPE else []
+
+
+@timed
+def render_board(state: GameState, viewport: Optional[Viewport] = None) -> str:
+    """Render the game board, or the part inside a viewport, as a string"""
+    if viewport is None:
+        viewport = full_viewport(state)
+    left, right = viewport.x, viewport.x + viewport.width
+    # Row labels are padded to the widest one so the cells line up
+    width = label_width(state)
+    border = " " * (width + 2) + "-" * (viewport.width * 2 - 1)
 
-def render_board(state: GameState) -> str:
-    """Render the game board as a string"""
     # Column headers
-    result = "    " + " ".join(str(i) for i in range(state.width)) + "\n"
-    result += "   " + "-" * (state.width * 2 - 1) + "\n"
+    lines = [" " * (width + 3) + column_labels(left, right), border]
 
     # Rows with row headers
-    for y in range(state.height):
-        result += f"{y} | "
-        for x in range(state.width):
-            cell = state.visible_board[y][x]
-            result += cell + " "
-        result += "|\n"
+    for y in range(viewport.y, viewport.y + viewport.height):
+        row = state.visible_board.row_text(y, left, right)
+        lines.append(f"{y:>{width}} | " + " ".join(row) + " |")
 
-    result += "   " + "-" * (state.width * 2 - 1) + "\n"
+    lines.append(border)
 
     # Game status
     if state.game_over:
-        result += "\nGAME OVER! You triggered a trap!\n"
+        lines.append("\nGAME OVER! You triggered a trap!")
     elif state.win:
-        result += "\nCONGRATULATIONS! You've successfully scanned all safe areas!\n"
+        lines.append("\nCONGRATULATIONS! You've successfully scanned all safe areas!")
+
+    lines.append("")
+    return "\n".join(lines)
+
+
+def move_cursor(line: int, column: int = 1) -> str:
+    """ANSI sequence moving the cursor to a 1-based screen position"""
+    return f"{CSI}{line};{column}H"
+
+
+@timed
+def render_board_update(
+    previous: GameState,
+    state: GameState,
+    top: int = 1,
+    viewport: Optional[Viewport] = None,
+) -> str:
+    """Render ANSI updates for the cells that changed since the previous state
+
+    top is the 1-based screen line where render_board(previous, viewport)
+    starts. Runs of changed cells are written with a single cursor move each.
+    """
+    if viewport is None:
+        viewport = full_viewport(state)
+    left, right = viewport.x, viewport.x + viewport.width
+    parts: List[str] = []
+    old_board, new_board = previous.visible_board, state.visible_board
+
+    for y in range(viewport.y, viewport.y + viewport.height):
+        # Rows that were not written share storage with the previous board
+        if new_board.shares_row(old_board, y, left, right):
+            continue
+        old_row = old_board.row_codes(y, left, right)
+        new_row = new_board.row_codes(y, left, right)
+        if old_row == new_row:
+            continue
+
+        text = state.visible_board.row_text(y, left, right)
+        line = top + 2 + y - viewport.y
+        column = label_width(state) + 4
+        x = 0
+        while x < viewport.width:
+            if old_row[x] == new_row[x]:
+                x += 1
+                continue
+            run_start = x
+            while x < viewport.width and old_row[x] != new_row[x]:
+                x += 1
+            parts.append(move_cursor(line, column + 2 * run_start))
+            parts.append(" ".join(text[run_start:x]))
 
-    return result
+    return "".join(parts)
 
 
 def clear_screen() -> None:
     """Clear the console screen"""
-    os.system("cls" if os.name == "nt" else "clear")
+    sys.stdout.write(CLEAR_SCREEN)
+    sys.stdout.flush()
 
 
-def get_player_input() -> Tuple[Optional[Position], bool]:
-    """Get player input for the next move"""
+def get_player_input() -> Tuple[Optional[Position], Optional[Command]]:
+    """Get player input for the next move or command"""
     try:
-        user_input = input("Enter coordinates to scan (x y) or 'q' to quit: ")
+        user_input = input(
+            "Enter coordinates to scan (x y), 'u' to undo, 'r' to redo "
+            "or 'q' to quit: "
+        )
 
-        if user_input.lower() == "q":
-            return None, True
+        command = user_input.strip().lower()
+        if command in (COMMAND_QUIT, COMMAND_UNDO, COMMAND_REDO):
+            return None, Command(command)
 
         parts = user_input.split()
         if len(parts) != 2:
             print("Invalid input. Please enter coordinates as 'x y'.")
-            return None, False
+            return None, None
 
         try:
             x, y = int(parts[0]), int(parts[1])
-            return Position((x, y)), False
+            return Position((x, y)), None
         except ValueError:
             print("Invalid coordinates. Please enter numbers only.")
-            return None, False
+            return None, None
 
     except KeyboardInterrupt:
-        return None, True
+        return None, COMMAND_QUIT
@@ -0,0 +1,223 @@
+"""
+Move journal with undo, redo and replay.
+
+The journal keeps the current state, the moves played so far and one diff per
+move instead of one state per move. A revealed cell always shows its hidden
+code, so a diff only needs the flat indices of the cells the move revealed:
+undoing hides them again and redoing copies them from the hidden board. Full
+states are kept as checkpoints every few moves to jump far back quickly.
+"""
+
+from array import array
+from typing import (
+    AbstractSet,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .Board import Board, require_flat
+from .Domain import HIDDEN_CODE, Position
+from .GameState import GameState
+from .initialize_game import initialize_game
+from .scan_position import scan_position
+
+
+class MoveDiff(NamedTuple):
+    """Changes of a single move, enough to undo and redo it"""
+
+    position: Position
+    # Flat indices of the cells the move revealed
+    cells: "array[int]"
+    game_over: bool
+    win: bool
+    # Hidden boards and traps before and after, if the move placed the traps
+    placed: Optional[
+        Tuple[Board, AbstractSet[Position], Board, AbstractSet[Position]]
+    ] = None
+
+
+def diff_states(before: GameState, after: GameState, pos: Position) -> MoveDiff:
+    """Diff two consecutive states by comparing the rows the move copied"""
+    width = before.width
+    cells = array("I")
+    for y, (old_row, new_row) in enumerate(
+        zip(before.visible_board.rows, after.visible_board.rows)
+    ):
+        # Rows untouched by the move are shared with the previous board
+        if old_row is new_row or old_row == new_row:
+            continue
+        cells.extend(
+            y * width + x
+            for x, (old, new) in enumerate(zip(old_row, new_row))
+            if old != new
+        )
+
+    placed = None
+    if after.hidden_board is not before.hidden_board:
+        placed = (
+            before.hidden_board,
+            before.danger_positions,
+            after.hidden_board,
+            after.danger_positions,
+        )
+    return MoveDiff(pos, cells, after.game_over, after.win, placed)
+
+
+class Journal:
+    """History of a game supporting undo, redo and seeking to any move"""
+
+    def __init__(
+        self,
+        state: GameState,
+        checkpoint_interval: int = 64,
+        max_checkpoints: int = 16,
+    ) -> None:
+        # Diffs compare whole rows, which chunked maps do not have
+        require_flat(state.visible_board, "The journal")
+        self.state = state
+        self.diffs: List[MoveDiff] = []
+        # Number of diffs applied to reach the current state
+        self.cursor = 0
+        self.checkpoint_interval = checkpoint_interval
+        self.max_checkpoints = max_checkpoints
+        self.checkpoints: Dict[int, GameState] = {0: state}
+
+    @property
+    def moves(self) -> List[Position]:
+        """Moves leading to the current state"""
+        return [diff.position for diff in self.diffs[: self.cursor]]
+
+    def can_undo(self) -> bool:
+        """Whether there is a move to undo"""
+        return self.cursor > 0
+
+    def can_redo(self) -> bool:
+        """Whether there is an undone move to redo"""
+        return self.cursor < len(self.diffs)
+
+    def record(self, pos: Position) -> GameState:
+        """Scan a position and record the move, discarding undone moves"""
+        new_state = scan_position(self.state, pos)
+        if new_state is self.state:
+            return self.state  # Nothing changed, nothing to record
+
+        del self.diffs[self.cursor :]
+        for index in [index for index in self.checkpoints if index > self.cursor]:
+            del self.checkpoints[index]
+
+        self.diffs.append(diff_states(self.state, new_state, pos))
+        self.cursor += 1
+        self.state = new_state
+        self._checkpoint()
+        return new_state
+
+    def _checkpoint(self) -> None:
+        """Keep the current state every checkpoint_interval moves"""
+        if self.cursor % self.checkpoint_interval or self.cursor in self.checkpoints:
+            return
+        self.checkpoints[self.cursor] = self.state
+        # Drop the oldest checkpoints but always keep the initial state
+        while len(self.checkpoints) > self.max_checkpoints:
+            del self.checkpoints[min(index for index in self.checkpoints if index)]
+
+    def undo(self) -> GameState:
+        """Step back one move, hiding the cells it revealed"""
+        if not self.can_undo():
+            return self.state
+        self.cursor -= 1
+        diff = self.diffs[self.cursor]
+        state = self.state
+
+        new_visible = state.visible_board.copy()
+        for index in diff.cells:
+            y, x = divmod(index, state.width)
+            new_visible.set(x, y, HIDDEN_CODE)
+
+        updates: Dict[str, object] = {}
+        if diff.placed is not None:
+            updates["hidden_board"], updates["danger_positions"] = diff.placed[:2]
+            updates["traps_placed"] = False
+        previous = self.diffs[self.cursor - 1] if self.cursor else None
+        self.state = state.with_updates(
+            visible_board=new_visible,
+            revealed_count=state.revealed_count - len(diff.cells),
+            game_over=previous.game_over if previous else False,
+            win=previous.win if previous else False,
+            **updates,
+        )
+        return self.state
+
+    def redo(self) -> GameState:
+        """Step forward one undone move, revealing its cells again"""
+        if not self.can_redo():
+            return self.state
+        diff = self.diffs[self.cursor]
+        self.cursor += 1
+        state = self.state
+
+        updates: Dict[str, object] = {}
+        hidden_board = state.hidden_board
+        if diff.placed is not None:
+            hidden_board = diff.placed[2]
+            updates["hidden_board"] = hidden_board
+            updates["danger_positions"] = diff.placed[3]
+            updates["traps_placed"] = True
+
+        # Revealed cells always show their hidden code
+        new_visible = state.visible_board.copy()
+        for index in diff.cells:
+            y, x = divmod(index, state.width)
+            new_visible.set(x, y, hidden_board.get(x, y))
+
+        self.state = state.with_updates(
+            visible_board=new_visible,
+            revealed_count=state.revealed_count + len(diff.cells),
+            game_over=diff.game_over,
+            win=diff.win,
+            **updates,
+        )
+        return self.state
+
+    def seek(self, cursor: int) -> GameState:
+        """Jump to the state after the given number of moves
+
+        Starts from the current state or the nearest checkpoint, whichever
+        needs fewer steps.
+        """
+        cursor = max(0, min(cursor, len(self.diffs)))
+        start = max(index for index in self.checkpoints if index <= cursor)
+        if cursor - start < abs(cursor - self.cursor):
+            self.state = self.checkpoints[start]
+            self.cursor = start
+        while self.cursor < cursor:
+            self.redo()
+        while self.cursor > cursor:
+            self.undo()
+        return self.state
+
+
+def replay(
+    seed: int,
+    moves: Sequence[Position],
+    width: int = 8,
+    height: int = 8,
+    trap_percentage: float = 0.15,
+    safe_first_click: bool = False,
+) -> Journal:
+    """Replay the moves of a seeded game into a new journal"""
+    journal = Journal(
+        initialize_game(
+            width,
+            height,
+            trap_percentage,
+            seed=seed,
+            safe_first_click=safe_first_click,
+        )
+    )
+    for pos in moves:
+        journal.record(pos)
+    return journal
@@ -0,0 +1,117 @@
+"""
+Precomputed neighbor offsets for every board shape.
+
+A cell's neighbors only depend on how close it is to the board edges, so a
+table per (width, height, topology) stores the neighbor offsets of the interior
+once, plus one pattern per combination of edge rows and edge columns. Lookups
+for interior cells are a chained comparison and a tuple read, and tables only
+take O(radius) memory, so even unbounded maps get one.
+
+Bounded boards drop the neighbors outside the board; wrap-around (torus) boards
+map them to the opposite edge, so their edge patterns hold offsets across the
+board instead. Both go through the same lookup.
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+Delta = Tuple[int, int]
+
+
+def _axis_patterns(
+    length: int, radius: int, wrap: bool
+) -> Tuple[Dict[int, int], List[Tuple[int, ...]]]:
+    """Pattern ids of the edge coordinates of one axis and the pattern steps
+
+    Pattern 0 holds the steps of interior coordinates.
+    """
+    ids: Dict[int, int] = {}
+    patterns: List[Tuple[int, ...]] = [tuple(range(-radius, radius + 1))]
+    # Only the coordinates within radius of an edge
+    edges = sorted(
+        {*range(min(radius, length)), *range(max(length - radius, 0), length)}
+    )
+    for coord in edges:
+        steps: List[int] = []
+        for step in range(-radius, radius + 1):
+            if wrap:
+                step = (coord + step) % length - coord
+            elif not 0 <= coord + step < length:
+                continue
+            if step not in steps:
+                steps.append(step)
+        ids[coord] = len(patterns)
+        patterns.append(tuple(steps))
+    return ids, patterns
+
+
+class NeighborTable:
+    """Neighbor offsets of every cell of a board shape
+
+    deltas() gives (dx, dy) steps for row-based boards and offsets() gives
+    steps of flat row-major indices. Neither includes the cell itself.
+    """
+
+    __slots__ = (
+        "width",
+        "height",
+        "wrap",
+        "radius",
+        "_row_ids",
+        "_column_ids",
+        "_deltas",
+        "_offsets",
+        "_interior_deltas",
+        "_interior_offsets",
+    )
+
+    def __init__(
+        self, width: int, height: int, wrap: bool = False, radius: int = 1
+    ) -> None:
+        self.width = width
+        self.height = height
+        self.wrap = wrap
+        self.radius = radius
+        self._row_ids, row_patterns = _axis_patterns(height, radius, wrap)
+        self._column_ids, column_patterns = _axis_patterns(width, radius, wrap)
+
+        self._deltas = tuple(
+            tuple(
+                tuple((dx, dy) for dy in dys for dx in dxs if dx or dy)
+                for dxs in column_patterns
+            )
+            for dys in row_patterns
+        )
+        self._offsets = tuple(
+            tuple(tuple(dy * width + dx for dx, dy in deltas) for deltas in row)
+            for row in self._deltas
+        )
+        self._interior_deltas = self._deltas[0][0]
+        self._interior_offsets = self._offsets[0][0]
+
+    def deltas(self, x: int, y: int) -> Tuple[Delta, ...]:
+        """(dx, dy) steps from a cell to each of its neighbors"""
+        radius = self.radius
+        if radius <= x < self.width - radius and radius <= y < self.height - radius:
+            return self._interior_deltas
+        return self._deltas[self._row_ids.get(y, 0)][self._column_ids.get(x, 0)]
+
+    def offsets(self, x: int, y: int) -> Tuple[int, ...]:
+        """Flat index steps from a cell to each of its neighbors"""
+        radius = self.radius
+        if radius <= x < self.width - radius and radius <= y < self.height - radius:
+            return self._interior_offsets
+        return self._offsets[self._row_ids.get(y, 0)][self._column_ids.get(x, 0)]
+
+    def neighbors(self, index: int) -> List[int]:
+        """Flat indices of the neighbors of a cell given by its flat index"""
+        y, x = divmod(index, self.width)
+        return [index + offset for offset in self.offsets(x, y)]
+
+
+@lru_cache(maxsize=64)
+def neighbor_table(
+    width: int, height: int, wrap: bool = False, radius: int = 1
+) -> NeighborTable:
+    """Shared neighbor table of a board shape, built once per shape"""
+    return NeighborTable(width, height, wrap, radius)
@@ -0,0 +1,453 @@
+"""
+Generator of boards that can be cleared from their first click without guessing.
+
+The generator places traps at random away from the first click and plays the
+board with a Deducer that reads the hidden board directly. It works on flat
+arrays and keeps the unknown neighbors and the remaining traps of every cell up
+to date as cells are revealed or flagged, so a deduction step costs a few
+counter updates instead of a game state.
+
+When the deducer gets stuck, a trap moves between a cell of the stuck frontier
+and a cell that no revealed number touches, or, late in a game, from a flagged
+cell into the frontier. A move changes the numbers of the revealed cells
+around both ends, so deductions drawn from the old numbers may not hold on the
+repaired board. The deducer continues where it stopped, which quickly finds
+the next stuck point, and once it clears a repaired board the final layout is
+played again from the first click; if that gets stuck, repairs go on from
+there. A board that is still stuck after max_repairs moves, or that has nothing
+left to move, is rejected early and a new one is generated.
+"""
+
+import random
+from typing import Iterable, List, Optional, Set
+
+from .Domain import TRAP_CODE, Position
+from .neighbors import neighbor_table
+from .profiling import PROFILE, count
+
+# Status of a cell during deduction
+UNKNOWN = 0
+REVEALED = 1
+FLAGGED = 2
+
+
+class Deducer:
+    """Deducer playing a hidden board from its first click, without guessing
+
+    Besides the single-cell rules it compares pairs of constraints: if the
+    cells only B touches must hold every trap B has beyond A, they are traps
+    and the cells only A touches are safe. Once the frontier gives nothing,
+    the unknown cells are safe if every trap is flagged already.
+    """
+
+    __slots__ = (
+        "width",
+        "height",
+        "trap_count",
+        "codes",
+        "status",
+        "unknown",
+        "remaining",
+        "safe_left",
+        "flagged",
+        "frontier",
+        "queue",
+        "dirty",
+        "_neighbors",
+        "_window",
+        "_candidates",
+    )
+
+    def __init__(self, width: int, height: int, traps: Iterable[int]) -> None:
+        self.width = width
+        self.height = height
+        self._neighbors = neighbor_table(width, height).neighbors
+        self._window = neighbor_table(width, height, radius=2).neighbors
+
+        # Hidden cell codes, counted around each trap
+        codes = self.codes = bytearray(width * height)
+        trap_list = list(traps)
+        for trap in trap_list:
+            codes[trap] = TRAP_CODE
+        for trap in trap_list:
+            for neighbor in self._neighbors(trap):
+                if codes[neighbor] != TRAP_CODE:
+                    codes[neighbor] += 1
+        self.trap_count = len(trap_list)
+
+        self.status = bytearray(width * height)
+        # Unknown neighbors of every cell, fewer along the edges
+        columns = [min(x + 1, width - 1) - max(x - 1, 0) + 1 for x in range(width)]
+        self.unknown: List[int] = []
+        for y in range(height):
+            rows = min(y + 1, height - 1) - max(y - 1, 0) + 1
+            self.unknown.extend(rows * column - 1 for column in columns)
+        # Traps among the unknown neighbors of every safe cell
+        self.remaining = list(codes)
+        self.safe_left = width * height - self.trap_count
+        self.flagged = 0
+        # Revealed numbers that may still have unknown neighbors
+        self.frontier: Set[int] = set()
+        # Constraints to check with the single-cell and the pair rules
+        self.queue: List[int] = []
+        self.dirty: Set[int] = set()
+        # Cells that may still be unknown, created by the first repair
+        self._candidates: Optional[List[int]] = None
+
+    @property
+    def solved(self) -> bool:
+        """Whether every safe cell is revealed"""
+        return self.safe_left == 0
+
+    def _changed(self, index: int) -> None:
+        """Queue a revealed number whose constraint changed"""
+        self.queue.append(index)
+        self.dirty.add(index)
+
+    def reveal(self, index: int) -> None:
+        """Reveal a safe cell, expanding empty cells like a scan does"""
+        codes, status, unknown = self.codes, self.status, self.unknown
+        queue, dirty = self.queue, self.dirty
+        stack = [index]
+        while stack:
+            cell = stack.pop()
+            if status[cell] != UNKNOWN:
+                continue
+            assert codes[cell] != TRAP_CODE, "Deduced a trap to be safe"
+            status[cell] = REVEALED
+            self.safe_left -= 1
+            neighbors = self._neighbors(cell)
+            for neighbor in neighbors:
+                unknown[neighbor] -= 1
+                # Inlined _changed: this loop runs for every revealed cell
+                if status[neighbor] == REVEALED and codes[neighbor]:
+                    queue.append(neighbor)
+                    dirty.add(neighbor)
+            if codes[cell]:
+                self.frontier.add(cell)
+                queue.append(cell)
+                dirty.add(cell)
+            else:
+                stack.extend(n for n in neighbors if status[n] == UNKNOWN)
+
+    def flag(self, index: int) -> None:
+        """Mark a cell deduced to be a trap"""
+        if self.status[index] != UNKNOWN:
+            return
+        assert self.codes[index] == TRAP_CODE, "Deduced a safe cell to be a trap"
+        self.status[index] = FLAGGED
+        self.flagged += 1
+        for neighbor in self._neighbors(index):
+            self.unknown[neighbor] -= 1
+            self.remaining[neighbor] -= 1
+            if self.status[neighbor] == REVEALED:
+                self._changed(neighbor)
+
+    def _unknown_neighbors(self, index: int) -> Set[int]:
+        status = self.status
+        return {n for n in self._neighbors(index) if status[n] == UNKNOWN}
+
+    def _apply_single_cell_rules(self) -> None:
+        """Reveal or flag the unknown neighbors of fully determined numbers"""
+        queue, unknown, remaining = self.queue, self.unknown, self.remaining
+        while queue:
+            index = queue.pop()
+            if not unknown[index]:
+                continue
+            if remaining[index] == 0:
+                for cell in self._unknown_neighbors(index):
+                    self.reveal(cell)
+            elif remaining[index] == unknown[index]:
+                for cell in self._unknown_neighbors(index):
+                    self.flag(cell)
+
+    def _apply_pair_rules(self) -> bool:
+        """Deduce cells from one pair of overlapping constraints"""
+        status, unknown, remaining = self.status, self.unknown, self.remaining
+        while self.dirty:
+            index = self.dirty.pop()
+            if not unknown[index]:
+                continue
+            cells = self._unknown_neighbors(index)
+            # Constraints sharing unknown cells are at most two cells apart
+            for other in self._window(index):
+                if status[other] != REVEALED or not unknown[other]:
+                    continue
+                other_cells = self._unknown_neighbors(other)
+                if cells.isdisjoint(other_cells):
+                    continue
+                only_self = cells - other_cells
+                only_other = other_cells - cells
+                traps = remaining[other] - remaining[index]
+                if traps == len(only_other) and (only_self or only_other):
+                    safe, flagged = only_self, only_other
+                elif -traps == len(only_self) and (only_self or only_other):
+                    safe, flagged = only_other, only_self
+                else:
+                    continue
+                for cell in flagged:
+                    self.flag(cell)
+                for cell in safe:
+                    self.reveal(cell)
+                self.dirty.add(index)
+                return True
+        return False
+
+    def _apply_count_rule(self) -> bool:
+        """Reveal all unknown cells once every trap is flagged"""
+        if self.flagged < self.trap_count:
+            return False
+        for index, status in enumerate(self.status):
+            if status == UNKNOWN:
+                self.reveal(index)
+        return True
+
+    def solve(self) -> bool:
+        """Deduce until the board is cleared or stuck; whether it is cleared"""
+        while not self.solved:
+            self._apply_single_cell_rules()
+            if self.solved:
+                break
+            if not self._apply_pair_rules() and not self._apply_count_rule():
+                return False
+        return True
+
+    def boundary(self) -> List[int]:
+        """Unknown cells next to revealed numbers, in ascending order"""
+        cells: Set[int] = set()
+        for index in list(self.frontier):
+            if not self.unknown[index]:
+                self.frontier.discard(index)
+                continue
+            cells |= self._unknown_neighbors(index)
+        return sorted(cells)
+
+    def _frontier_cell(self, rng: random.Random) -> Optional[int]:
+        """Random unknown cell next to a revealed number, None if there is none"""
+        unknown = self.unknown
+        numbers = [index for index in self.frontier if unknown[index]]
+        self.frontier = set(numbers)
+        if not numbers:
+            return None
+        return rng.choice(sorted(self._unknown_neighbors(rng.choice(numbers))))
+
+    def _is_interior(self, index: int, trap: bool) -> bool:
+        """Whether a cell is an unknown trap or safe cell no number touches"""
+        status = self.status
+        return (
+            status[index] == UNKNOWN
+            and (self.codes[index] == TRAP_CODE) == trap
+            and all(status[n] != REVEALED for n in self._neighbors(index))
+        )
+
+    def _interior_cell(self, rng: random.Random, trap: bool) -> Optional[int]:
+        """Random interior trap or safe cell, None if none was found"""
+        if self._candidates is None:
+            self._candidates = list(range(self.width * self.height))
+        candidates, status = self._candidates, self.status
+        misses = 0
+        while candidates and misses < 64:
+            # Drop the cells that are not unknown anymore by swapping them out,
+            # which costs O(1) per cell over all calls
+            position = rng.randrange(len(candidates))
+            index = candidates[position]
+            if status[index] != UNKNOWN:
+                candidates[position] = candidates[-1]
+                candidates.pop()
+            elif self._is_interior(index, trap):
+                return index
+            else:
+                misses += 1
+        return None
+
+    def move_trap(self, source: int, target: int) -> None:
+        """Move a trap between two unknown cells, updating the numbers around"""
+        codes, status, remaining = self.codes, self.status, self.remaining
+        assert codes[source] == TRAP_CODE and codes[target] != TRAP_CODE
+        assert status[source] == UNKNOWN and status[target] == UNKNOWN
+        codes[source] = 0
+        for neighbor in self._neighbors(source):
+            if codes[neighbor] != TRAP_CODE:
+                codes[neighbor] -= 1
+                remaining[neighbor] -= 1
+                if status[neighbor] == REVEALED:
+                    self._changed(neighbor)
+        codes[target] = TRAP_CODE
+        for neighbor in self._neighbors(target):
+            if codes[neighbor] != TRAP_CODE:
+                codes[neighbor] += 1
+                remaining[neighbor] += 1
+                if status[neighbor] == REVEALED:
+                    self._changed(neighbor)
+
+        # The source is a safe cell now: count its traps and flagged neighbors
+        neighbors = self._neighbors(source)
+        codes[source] = sum(codes[n] == TRAP_CODE for n in neighbors)
+        remaining[source] = codes[source] - sum(status[n] == FLAGGED for n in neighbors)
+
+    def unflag(self, index: int) -> None:
+        """Forget that a trap was deduced, before moving it"""
+        self.status[index] = UNKNOWN
+        self.flagged -= 1
+        for neighbor in self._neighbors(index):
+            self.unknown[neighbor] += 1
+            self.remaining[neighbor] += 1
+            if self.status[neighbor] == REVEALED:
+                self._changed(neighbor)
+
+    def _flagged_cell(self, rng: random.Random, near: int) -> Optional[int]:
+        """Random flagged trap more than two cells away from a cell"""
+        cell_count = self.width * self.height
+        excluded = {near, *self._window(near)}
+        for _ in range(64):
+            index = rng.randrange(cell_count)
+            if self.status[index] == FLAGGED and index not in excluded:
+                return index
+        return None
+
+    def repair(self, rng: random.Random) -> bool:
+        """Change a random stuck cell from trap to safe or back
+
+        A trap on the frontier moves to a cell no number touches, and a safe
+        frontier cell takes a trap from there, so the trap count of the stuck
+        area changes instead of only its layout. Late in a game there may be no
+        such cell, and a safe cell takes a flagged trap from elsewhere instead:
+        revealed and flagged cells stay true, so the deducer can continue.
+        With nothing flagged either, the cell swaps with a distant frontier
+        cell. False if no cell can be changed.
+        """
+        codes = self.codes
+        cell = self._frontier_cell(rng)
+        stuck_frontier = cell is not None
+        if cell is None:
+            # Unknown cells walled in by flagged traps, away from any number
+            cell = self._interior_cell(rng, trap=False)
+            if cell is None:
+                return False
+        trap = codes[cell] == TRAP_CODE
+
+        # Walled in cells only change by taking a trap from outside
+        other: Optional[int] = None
+        if stuck_frontier:
+            other = self._interior_cell(rng, not trap)
+        if other is None:
+            # A safe cell takes a flagged trap instead of a trap moving out
+            target = cell
+            if trap:
+                safe = [i for i in self.boundary() if codes[i] != TRAP_CODE]
+                target = rng.choice(safe) if safe else -1
+            if target >= 0:
+                other = self._flagged_cell(rng, target)
+            if other is not None:
+                cell, trap = target, False
+                self.unflag(other)
+        if other is None and stuck_frontier:
+            # Nothing flagged yet: swap two frontier cells far from each other
+            boundary = self.boundary()
+            rng.shuffle(boundary)
+            for cell in boundary:
+                trap = codes[cell] == TRAP_CODE
+                near = set(self._window(cell))
+                far = [
+                    i
+                    for i in boundary
+                    if (codes[i] == TRAP_CODE) != trap and i not in near
+                ]
+                if far:
+                    other = rng.choice(far)
+                    break
+        if other is None:
+            return False
+
+        if trap:
+            self.move_trap(cell, other)
+        else:
+            self.move_trap(other, cell)
+        return True
+
+    def trap_indices(self) -> List[int]:
+        """Flat indices of the traps of the board"""
+        return [i for i, code in enumerate(self.codes) if code == TRAP_CODE]
+
+
+def check_position(width: int, height: int, pos: Position) -> None:
+    """Raise a ValueError for positions outside the board"""
+    x, y = pos
+    if not (0 <= x < width and 0 <= y < height):
+        raise ValueError(f"Position {tuple(pos)} is outside the {width}x{height} board")
+
+
+def protected_cells(width: int, height: int, first_click: Position) -> List[int]:
+    """First click and its neighbors, which stay free of traps"""
+    check_position(width, height, first_click)
+    x, y = first_click
+    index = y * width + x
+    return sorted([index, *neighbor_table(width, height).neighbors(index)])
+
+
+def is_no_guess(
+    width: int, height: int, traps: Iterable[int], first_click: Position
+) -> bool:
+    """Whether a board can be cleared from a first click without guessing"""
+    x, y = first_click
+    deducer = Deducer(width, height, traps)
+    deducer.reveal(y * width + x)
+    return deducer.solve()
+
+
+def no_guess_trap_indices(
+    width: int,
+    height: int,
+    trap_count: int,
+    rng: random.Random,
+    first_click: Position,
+    max_attempts: int = 100,
+    max_repairs: Optional[int] = None,
+) -> List[int]:
+    """Flat trap indices of a board that can be cleared without guessing
+
+    The first click and, if the traps leave room for them, its neighbors are
+    kept free, so the first click opens an area. Each attempt repairs a stuck
+    board up to max_repairs times (the trap count by default) before it is
+    rejected.
+    """
+    cell_count = width * height
+    x, y = first_click
+    protected = protected_cells(width, height, first_click)
+    if trap_count > cell_count - len(protected):
+        protected = [y * width + x]
+    available = cell_count - len(protected)
+    if not 0 <= trap_count <= available:
+        raise ValueError(f"Cannot place {trap_count} traps on {available} cells")
+    if max_repairs is None:
+        max_repairs = trap_count
+
+    for _ in range(max_attempts):
+        if PROFILE.enabled:
+            count("no_guess_attempts")
+        # Sample among the unprotected cells, then skip over the protected ones
+        traps = rng.sample(range(available), trap_count)
+        for index in protected:
+            traps = [trap + 1 if trap >= index else trap for trap in traps]
+
+        deducer = Deducer(width, height, traps)
+        deducer.reveal(y * width + x)
+        repairs = verified = 0
+        while True:
+            while not deducer.solve():
+                if repairs == max_repairs or not deducer.repair(rng):
+                    break
+                repairs += 1
+            if not deducer.solved or repairs == verified:
+                break
+            # Repairs change numbers earlier deductions were drawn from, so
+            # play the repaired layout again from the first click
+            verified = repairs
+            deducer = Deducer(width, height, deducer.trap_indices())
+            deducer.reveal(y * width + x)
+        if PROFILE.enabled:
+            count("no_guess_repairs", repairs)
+        if deducer.solved:
+            return deducer.trap_indices()
+
+    raise ValueError(f"No board without guessing found in {max_attempts} attempts")
@@ -0,0 +1,387 @@
+"""
+Exact trap probabilities of the hidden cells of a visible board.
+
+Revealed numbers constrain their hidden neighbors, the frontier. The frontier
+splits into components that share no constraint, and each component is solved
+on its own by backtracking over its cells with memoization: assignments that
+leave the still-open constraints with the same trap counts are merged, so a
+step keeps one entry per distinct set of open counts, holding the number of
+assignments by trap count.
+
+Components and the unconstrained interior cells are then combined exactly: an
+assignment of a component with k traps is weighted by the number of ways to
+place the remaining traps into the other components and the interior, a sum of
+binomial coefficients. A backward pass over the memoized steps folds these
+weights in, which gives every frontier cell its probability without
+enumerating assignments.
+
+Solved components are cached by their constraints, so a move that leaves a
+component unchanged does not solve it again.
+"""
+
+from collections import OrderedDict, deque
+from math import comb
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .Board import Board, require_flat
+from .Domain import HIDDEN_CODE, TRAP_CODE, Position
+from .GameState import GameState
+from .neighbors import neighbor_table
+
+# Numbers of ways to pick traps, indexed by the number of traps
+Weights = List[int]
+# Weights starting at a lowest trap count, with the zeros below it left out
+Span = Tuple[int, Weights]
+# Trap counts of the open constraints of a component
+OpenCounts = Tuple[int, ...]
+
+# Most trap count weights one component may memoize over all its steps, which
+# bounds the memory and time of a component whose open constraints take many
+# count combinations (every entry keeps one weight per trap count)
+MAX_WEIGHTS = 10_000_000
+
+# Maps the codes of revealed safe cells (0-8) to 1 and every other code to 0
+CLUE_MASK = bytes(1 if code <= 8 else 0 for code in range(256))
+
+
+class Constraint(NamedTuple):
+    """Hidden cells (flat indices) around a number and the traps among them"""
+
+    required: int
+    cells: Tuple[int, ...]
+
+
+class _Step(NamedTuple):
+    """Memoized entries before deciding one cell of a component
+
+    Every entry holds the open counts, the assignments of the earlier cells by
+    trap count, and the open counts after a safe cell and after a trap (None
+    when that choice breaks a constraint).
+    """
+
+    cell: int
+    entries: List[Tuple[OpenCounts, Weights, Optional[OpenCounts], Optional[OpenCounts]]]
+
+
+class Component(NamedTuple):
+    """Solved component: its memoized steps and assignments by trap count"""
+
+    steps: List[_Step]
+    weights: Span
+
+
+class TrapProbabilities(NamedTuple):
+    """Exact trap probabilities of the hidden cells of a visible board"""
+
+    # Hidden cells next to a revealed number
+    frontier: Dict[Position, float]
+    # Every other hidden cell
+    interior: float
+
+    def probability(self, pos: Position) -> float:
+        """Trap probability of a hidden cell"""
+        return self.frontier.get(pos, self.interior)
+
+
+def read_constraints(board: Board) -> Tuple[List[Constraint], int, int]:
+    """Constraints of a visible board, its hidden cell count and its known traps
+
+    Every revealed safe cell constrains its hidden neighbors, and revealed traps
+    count as known traps of the cells around them.
+    """
+    width, height = board.width, board.height
+    table = neighbor_table(width, height)
+    rows = board.rows
+    constraints: Dict[Tuple[int, ...], int] = {}
+
+    for y in range(height):
+        # Only revealed cells next to a hidden row can constrain anything
+        if not any(
+            HIDDEN_CODE in rows[ny] for ny in range(max(y - 1, 0), min(y + 2, height))
+        ):
+            continue
+        mask = rows[y].translate(CLUE_MASK)
+        x = mask.find(1)
+        while x != -1:
+            required = rows[y][x]
+            cells: List[int] = []
+            for dx, dy in table.deltas(x, y):
+                code = rows[y + dy][x + dx]
+                if code == HIDDEN_CODE:
+                    cells.append((y + dy) * width + x + dx)
+                elif code == TRAP_CODE:
+                    required -= 1
+            if cells:
+                key = tuple(sorted(cells))
+                if constraints.setdefault(key, required) != required:
+                    raise ValueError("Visible board contradicts itself")
+            elif required:
+                raise ValueError("Visible board contradicts itself")
+            x = mask.find(1, x + 1)
+
+    return (
+        [Constraint(required, cells) for cells, required in constraints.items()],
+        board.count(HIDDEN_CODE),
+        board.count(TRAP_CODE),
+    )
+
+
+def split_components(constraints: Sequence[Constraint]) -> List[Tuple[Constraint, ...]]:
+    """Group constraints into components sharing no hidden cell"""
+    parent: Dict[int, int] = {}
+
+    def find(cell: int) -> int:
+        root = parent.setdefault(cell, cell)
+        while root != parent[root]:
+            parent[root] = parent[parent[root]]
+            root = parent[root]
+        return root
+
+    for constraint in constraints:
+        first = find(constraint.cells[0])
+        for cell in constraint.cells[1:]:
+            parent[find(cell)] = first
+
+    groups: Dict[int, List[Constraint]] = {}
+    for constraint in constraints:
+        groups.setdefault(find(constraint.cells[0]), []).append(constraint)
+    return [tuple(sorted(group)) for group in groups.values()]
+
+
+def _cell_order(constraints: Sequence[Constraint]) -> List[int]:
+    """Breadth-first order of the cells, so constraints open and close quickly"""
+    around: Dict[int, Set[int]] = {}
+    for constraint in constraints:
+        for cell in constraint.cells:
+            around.setdefault(cell, set()).update(constraint.cells)
+
+    start = min(around)
+    order, seen = [start], {start}
+    queue = deque(order)
+    while queue:
+        for other in sorted(around[queue.popleft()] - seen):
+            seen.add(other)
+            order.append(other)
+            queue.append(other)
+    return order
+
+
+def solve_component(
+    constraints: Sequence[Constraint], max_weights: int = MAX_WEIGHTS
+) -> Component:
+    """Count the assignments of a component, memoized by open constraint counts
+
+    Raises ValueError once the memo would hold more than max_weights weights.
+    """
+    order = _cell_order(constraints)
+    position = {cell: index for index, cell in enumerate(order)}
+    first = [min(position[cell] for cell in c.cells) for c in constraints]
+    last = [max(position[cell] for cell in c.cells) for c in constraints]
+    containing: List[List[int]] = [[] for _ in order]
+    for index, constraint in enumerate(constraints):
+        for cell in constraint.cells:
+            containing[position[cell]].append(index)
+
+    open_constraints: List[int] = []
+    memo: Dict[OpenCounts, Weights] = {(): [1]}
+    steps: List[_Step] = []
+    weight_count = 0
+
+    for step, cell in enumerate(order):
+        slot = {index: place for place, index in enumerate(open_constraints)}
+        touched = set(containing[step])
+        next_open = [c for c in open_constraints if last[c] != step] + [
+            c for c in containing[step] if first[c] == step and last[c] != step
+        ]
+        # Where each open count after this cell comes from, and whether it grows
+        sources = [(slot.get(c, -1), c in touched) for c in next_open]
+        # Constraints of this cell: their slot, traps needed and cells left after it
+        checks = [
+            (
+                slot.get(c, -1),
+                constraints[c].required,
+                sum(position[other] > step for other in constraints[c].cells),
+            )
+            for c in containing[step]
+        ]
+
+        next_memo: Dict[OpenCounts, Weights] = {}
+        entries = []
+        for counts, ways in memo.items():
+            targets: List[Optional[OpenCounts]] = []
+            for trap in (0, 1):
+                if any(
+                    (counts[place] if place >= 0 else 0) + trap > required
+                    or (counts[place] if place >= 0 else 0) + trap + left < required
+                    for place, required, left in checks
+                ):
+                    targets.append(None)
+                    continue
+                target = tuple(
+                    (counts[place] if place >= 0 else 0) + (trap if grows else 0)
+                    for place, grows in sources
+                )
+                targets.append(target)
+                total = next_memo.get(target)
+                if total is None:
+                    weight_count += step + 2
+                    if weight_count > max_weights:
+                        raise ValueError(
+                            f"A frontier component of {len(order)} cells has too "
+                            "many open constraints for exact probabilities"
+                        )
+                    total = next_memo[target] = [0] * (step + 2)
+                for traps, count in enumerate(ways, trap):
+                    total[traps] += count
+            entries.append((counts, ways, targets[0], targets[1]))
+
+        steps.append(_Step(cell, entries))
+        memo = next_memo
+        open_constraints = next_open
+
+    weights = memo.get((), [])
+    low = next((traps for traps, ways in enumerate(weights) if ways), 0)
+    high = max((traps for traps, ways in enumerate(weights) if ways), default=-1)
+    return Component(steps, (low, weights[low : high + 1]))
+
+
+def _marginals(component: Component, gain: Weights) -> List[int]:
+    """Weighted number of assignments with a trap, for every cell of a component
+
+    gain[k] weighs the assignments of the component with k traps.
+    """
+    steps = component.steps
+    # Weight of completing each entry, by the trap count of the cells before it
+    after: Dict[OpenCounts, Weights] = {(): gain}
+    numerators = [0] * len(steps)
+
+    for step in range(len(steps) - 1, -1, -1):
+        before: Dict[OpenCounts, Weights] = {}
+        numerator = 0
+        for counts, ways, safe, trap in steps[step].entries:
+            safe_weights = after.get(safe) if safe is not None else None
+            trap_weights = after.get(trap) if trap is not None else None
+            if trap_weights is not None:
+                shifted = trap_weights[1:]
+                numerator += sum(w * g for w, g in zip(ways, shifted))
+                if safe_weights is not None:
+                    before[counts] = [s + t for s, t in zip(safe_weights, shifted)]
+                else:
+                    before[counts] = shifted
+            elif safe_weights is not None:
+                before[counts] = safe_weights[: step + 1]
+        numerators[step] = numerator
+        after = before
+
+    return numerators
+
+
+def _convolve(first: Span, second: Span) -> Span:
+    """Weights of the union of two independent sets of cells"""
+    (first_low, first_weights), (second_low, second_weights) = first, second
+    result = [0] * max(len(first_weights) + len(second_weights) - 1, 0)
+    for i, a in enumerate(first_weights):
+        for j, b in enumerate(second_weights):
+            result[i + j] += a * b
+    return first_low + second_low, result
+
+
+def _binomials(count: int, low: int, high: int) -> Dict[int, int]:
+    """Ways to place low to high traps into count cells, by trap count"""
+    low, high = max(low, 0), min(high, count)
+    binomials: Dict[int, int] = {}
+    if low <= high:
+        ways = comb(count, low)
+        for traps in range(low, high + 1):
+            binomials[traps] = ways
+            ways = ways * (count - traps) // (traps + 1)
+    return binomials
+
+
+class ProbabilityEngine:
+    """Exact trap probabilities, with solved components cached between moves"""
+
+    def __init__(self, cache_size: int = 1024, max_weights: int = MAX_WEIGHTS) -> None:
+        self.cache: "OrderedDict[Tuple[Constraint, ...], Component]" = OrderedDict()
+        self.cache_size = cache_size
+        self.max_weights = max_weights
+        self.hits = 0
+        self.misses = 0
+
+    def component(self, constraints: Tuple[Constraint, ...]) -> Component:
+        """Solved component, from the cache if it was solved before"""
+        component = self.cache.get(constraints)
+        if component is not None:
+            self.hits += 1
+            self.cache.move_to_end(constraints)
+            return component
+
+        self.misses += 1
+        component = self.cache[constraints] = solve_component(
+            constraints, self.max_weights
+        )
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return component
+
+    def probabilities(self, state: GameState) -> TrapProbabilities:
+        """Trap probability of every hidden cell of the visible board"""
+        require_flat(state.visible_board, "Trap probabilities")
+        width = state.width
+        constraints, hidden_count, known_traps = read_constraints(state.visible_board)
+        groups = split_components(constraints)
+        components = [self.component(group) for group in groups]
+
+        frontier_count = sum(len(component.steps) for component in components)
+        interior_count = hidden_count - frontier_count
+        traps = state.trap_count - known_traps
+
+        # Weights of all components but one, from prefix and suffix products
+        prefix: List[Span] = [(0, [1])]
+        for component in components:
+            prefix.append(_convolve(prefix[-1], component.weights))
+        suffix: List[Span] = [(0, [1])]
+        for component in reversed(components):
+            suffix.append(_convolve(suffix[-1], component.weights))
+        suffix.reverse()
+
+        # Ways to place the traps left over by the frontier into the interior
+        low, weights = prefix[-1]
+        binomials = _binomials(
+            interior_count, traps - low - len(weights) + 1, traps - low
+        )
+        total = sum(
+            ways * binomials.get(traps - k, 0) for k, ways in enumerate(weights, low)
+        )
+        if not total:
+            raise ValueError("No trap placement matches the visible board")
+
+        frontier: Dict[Position, float] = {}
+        for index, component in enumerate(components):
+            others_low, others = _convolve(prefix[index], suffix[index + 1])
+            component_low, component_weights = component.weights
+            # Only trap counts the component can have need a weight
+            gain = [0] * (len(component.steps) + 1)
+            for k in range(component_low, component_low + len(component_weights)):
+                gain[k] = sum(
+                    ways * binomials.get(traps - k - j, 0)
+                    for j, ways in enumerate(others, others_low)
+                )
+            numerators = _marginals(component, gain)
+            for step, numerator in zip(component.steps, numerators):
+                y, x = divmod(step.cell, width)
+                frontier[Position((x, y))] = numerator / total
+
+        interior = 0.0
+        if interior_count:
+            interior_traps = sum(
+                ways * binomials.get(traps - k, 0) * (traps - k)
+                for k, ways in enumerate(weights, low)
+            )
+            interior = interior_traps / (total * interior_count)
+        return TrapProbabilities(frontier, interior)
+
+
+def trap_probabilities(state: GameState) -> TrapProbabilities:
+    """Exact trap probability of every hidden cell of the visible board"""
+    return ProbabilityEngine().probabilities(state)
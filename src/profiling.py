@@ -0,0 +1,107 @@
+"""
+Opt-in instrumentation of the engine hot paths.
+
+Timed functions count their calls and inclusive wall time, and the engine bumps
+counters such as cells expanded, cells copied and states allocated. Everything
+is off unless the SPACE_STATION_PROFILE environment variable is set or the code
+runs inside ``with profiling():``.
+
+Timed functions are wrapped once, when they are decorated, so every reference
+to them (imported names, closures, default arguments, dicts of callables) sees
+the same function whenever profiling is switched on or off, from any thread.
+While disabled, a wrapper costs one attribute read before calling through.
+Counters cost a flag check, because call sites test ``PROFILE.enabled`` before
+calling ``count``.
+"""
+
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, TypeVar, cast
+
+PROFILE_ENV = "SPACE_STATION_PROFILE"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Profile:
+    """Timers and counters collected while profiling is enabled"""
+
+    __slots__ = ("enabled", "calls", "seconds", "counters")
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.calls: Counter[str] = Counter()
+        self.seconds: Dict[str, float] = {}
+        self.counters: Counter[str] = Counter()
+
+    def reset(self) -> None:
+        """Forget all collected timings and counts"""
+        self.calls.clear()
+        self.seconds.clear()
+        self.counters.clear()
+
+    def summary(self) -> str:
+        """Table of the timed functions by total time, followed by the counters"""
+        lines = [f"{'function':<24}{'calls':>10}{'total ms':>12}{'mean us':>12}"]
+        for name, seconds in sorted(
+            self.seconds.items(), key=lambda item: item[1], reverse=True
+        ):
+            calls = self.calls[name]
+            lines.append(
+                f"{name:<24}{calls:>10}{seconds * 1e3:>12.2f}"
+                f"{seconds / calls * 1e6:>12.1f}"
+            )
+        lines.append(f"{'counter':<24}{'value':>10}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<24}{value:>10}")
+        return "\n".join(lines) + "\n"
+
+
+# The single profile the engine reports to
+PROFILE = Profile(enabled=bool(os.environ.get(PROFILE_ENV)))
+
+
+def count(name: str, amount: int = 1) -> None:
+    """Add to a counter (callers check PROFILE.enabled first)"""
+    PROFILE.counters[name] += amount
+
+
+def timed(func: F) -> F:
+    """Decorator recording the calls and inclusive time of a function"""
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not PROFILE.enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            PROFILE.calls[name] += 1
+            PROFILE.seconds[name] = (
+                PROFILE.seconds.get(name, 0.0) + time.perf_counter() - start
+            )
+
+    return cast(F, wrapper)
+
+
+def set_profiling(enabled: bool) -> None:
+    """Enable or disable the timers and counters"""
+    PROFILE.enabled = enabled
+
+
+@contextmanager
+def profiling(reset: bool = True) -> Iterator[Profile]:
+    """Enable profiling for a block and yield the collected profile"""
+    previous = PROFILE.enabled
+    if reset:
+        PROFILE.reset()
+    set_profiling(True)
+    try:
+        yield PROFILE
+    finally:
+        set_profiling(previous)
@@ -1,52 +1,177 @@
-from typing import Set, cast
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
-from .Domain import EMPTY, HIDDEN, TRAP, GameBoard, Position
-from .GameState import GameState
+from .Board import Board
+from .chunked_board import (
+    CHUNK_MASK,
+    CHUNK_SHIFT,
+    EDGE_CELLS,
+    ChunkedBoard,
+    ChunkedHiddenBoard,
+)
+from .Domain import (
+    EMPTY_CODE,
+    HIDDEN_CODE,
+    OUTCOME_INVALID,
+    OUTCOME_REVEALED,
+    OUTCOME_SAFE,
+    OUTCOME_TRAP,
+    TRAP_CODE,
+    Position,
+    ScanOutcome,
+)
+from .GameState import GameState, count_revealed
+from .initialize_game import place_traps
+from .profiling import PROFILE, count, timed
 
+# Maps empty cell codes to 0 and every other cell code to 1
+NON_EMPTY_MASK = bytes(0 if code == EMPTY_CODE else 1 for code in range(256))
+
+# When enabled, is_win_condition cross-validates the revealed counter
+_consistency_checks = False
+
+
+def set_consistency_checks(enabled: bool) -> None:
+    """Enable or disable validating the revealed counter against a full scan"""
+    global _consistency_checks  # pylint: disable=global-statement
+    _consistency_checks = enabled
 
-def auto_expand(state: GameState, x: int, y: int) -> GameState:
-    """Auto-expand when an empty cell is revealed"""
-    # Create a working copy of the visible board
-    new_visible = [row[:] for row in state.visible_board]
 
-    # Use a set to track cells to expand to avoid duplicates
-    to_expand: Set[Position] = {Position((x, y))}
-    expanded: Set[Position] = set()
+@timed
+def flood_fill(hidden_board: Board, visible_board: Board, x: int, y: int) -> int:
+    """Reveal a cell and the empty region around it in place
 
-    while to_expand:
-        current = to_expand.pop()
-        cx, cy = current
+    Returns the number of cells that were hidden before.
+    """
+    if isinstance(visible_board, ChunkedBoard):
+        assert isinstance(hidden_board, ChunkedHiddenBoard)
+        return _flood_fill_chunked(hidden_board, visible_board, x, y)
 
-        if current in expanded:
+    width, height = hidden_board.width, hidden_board.height
+    hidden_rows = hidden_board.rows
+    revealed_count = 0
+
+    # Reveal the starting cell
+    row = visible_board.writable_row(y)
+    if row[x] == HIDDEN_CODE:
+        revealed_count += 1
+    row[x] = hidden_rows[y][x]
+
+    # Scanline fill: every seed is the flat index of a cell inside a horizontal
+    # run of empty cells. A run is expanded once, revealing it and its border in
+    # the rows above and below with slice copies, and queueing one seed for each
+    # run of empty cells that had hidden cells in those rows.
+    masks: Dict[int, bytearray] = {}
+    expanded: Set[int] = set()
+    seeds = [y * width + x] if hidden_rows[y][x] == EMPTY_CODE else []
+
+    while seeds:
+        sy, sx = divmod(seeds.pop(), width)
+        mask = masks.get(sy)
+        if mask is None:
+            mask = masks[sy] = hidden_rows[sy].translate(NON_EMPTY_MASK)
+        left = mask.rfind(1, 0, sx) + 1
+        right = mask.find(1, sx)
+        if right == -1:
+            right = width
+
+        if sy * width + left in expanded:
             continue
+        expanded.add(sy * width + left)
+
+        start, stop = max(left - 1, 0), min(right + 1, width)
+        for ny in range(max(sy - 1, 0), min(sy + 2, height)):
+            old_cells = visible_board.rows[ny][start:stop]
+            hidden_count = old_cells.count(HIDDEN_CODE)
+            if not hidden_count:
+                continue
 
-        expanded.add(current)
+            # Revealed visible cells always equal their hidden counterparts
+            visible_board.writable_row(ny)[start:stop] = hidden_rows[ny][start:stop]
+            revealed_count += hidden_count
+            if ny == sy:
+                continue
 
-        # Reveal current cell
-        new_visible[cy][cx] = state.hidden_board[cy][cx]
+            row_mask = masks.get(ny)
+            if row_mask is None:
+                row_mask = masks[ny] = hidden_rows[ny].translate(NON_EMPTY_MASK)
+            run_start = row_mask.find(0, start, stop)
+            while run_start != -1:
+                run_stop = row_mask.find(1, run_start, stop)
+                if run_stop == -1:
+                    run_stop = stop
+                if HIDDEN_CODE in old_cells[run_start - start : run_stop - start]:
+                    seeds.append(ny * width + run_start)
+                run_start = row_mask.find(0, run_stop, stop)
 
-        # If current cell is empty, add adjacent cells to expansion list
-        if state.hidden_board[cy][cx] == EMPTY:
-            for dx in [-1, 0, 1]:
-                for dy in [-1, 0, 1]:
-                    nx, ny = cx + dx, cy + dy
-                    if (
-                        0 <= nx < state.width
-                        and 0 <= ny < state.height
-                        and state.visible_board[ny][nx] == HIDDEN
-                    ):
-                        to_expand.add(Position((nx, ny)))
+    return revealed_count
+
+
+def _flood_fill_chunked(
+    hidden_board: ChunkedHiddenBoard, visible_board: ChunkedBoard, x: int, y: int
+) -> int:
+    """Flood fill chunk by chunk, continuing across chunk edges"""
+    revealed_count = 0
+    seeds = [(x, y)]
+
+    while seeds:
+        sx, sy = seeds.pop()
+        if revealed_count and visible_board.get(sx, sy) != HIDDEN_CODE:
+            continue  # Revealed by an earlier fill
+
+        cx, cy = sx >> CHUNK_SHIFT, sy >> CHUNK_SHIFT
+        chunk = visible_board.writable_chunk(cx, cy)
+        revealed_count += flood_fill(
+            hidden_board.chunk(cx, cy), chunk, sx & CHUNK_MASK, sy & CHUNK_MASK
+        )
+
+        # Empty cells on the edge reveal their neighbors in the next chunks
+        left, top = cx << CHUNK_SHIFT, cy << CHUNK_SHIFT
+        for local_x, local_y, offsets in EDGE_CELLS:
+            if chunk.rows[local_y][local_x] != EMPTY_CODE:
+                continue
+            for dx, dy in offsets:
+                nx, ny = left + local_x + dx, top + local_y + dy
+                if (
+                    0 <= nx < visible_board.width
+                    and 0 <= ny < visible_board.height
+                    and visible_board.get(nx, ny) == HIDDEN_CODE
+                ):
+                    seeds.append((nx, ny))
+
+    return revealed_count
+
+
+@timed
+def auto_expand(state: GameState, x: int, y: int) -> GameState:
+    """Auto-expand when an empty cell is revealed"""
+    # Create a working copy of the visible board
+    new_visible = state.visible_board.copy()
+    revealed_count = flood_fill(state.hidden_board, new_visible, x, y)
+    if PROFILE.enabled:
+        count("cells_expanded", revealed_count)
 
-    return state.with_updates(visible_board=cast(GameBoard, new_visible))
+    return state.with_updates(
+        visible_board=new_visible,
+        revealed_count=state.revealed_count + revealed_count,
+    )
 
 
+@timed
 def is_win_condition(state: GameState) -> bool:
     """Check if the win condition is met"""
+    if _consistency_checks and state.revealed_count != count_revealed(
+        state.visible_board
+    ):
+        raise RuntimeError(
+            f"Revealed counter {state.revealed_count} does not match the "
+            f"visible board ({count_revealed(state.visible_board)} revealed)"
+        )
+
     # Win if all non-danger cells are revealed
-    hidden_count = sum(row.count(HIDDEN) for row in state.visible_board)
-    return hidden_count == len(state.danger_positions)
+    return state.remaining_safe == 0
 
 
+@timed
 def scan_position(state: GameState, pos: Position) -> GameState:
     """Scan a position on the game board"""
     x, y = pos
@@ -56,27 +181,35 @@ def scan_position(state: GameState, pos: Position) -> GameState:
         return state  # Invalid position, return unchanged state
 
     # Check if already revealed
-    if state.visible_board[y][x] != HIDDEN:
+    if state.visible_board.get(x, y) != HIDDEN_CODE:
         return state  # Already revealed, return unchanged state
 
+    # Place the traps of a safe-first-click game around the first scan
+    if not state.traps_placed:
+        state = place_traps(state, pos)
+
     # Check if hit a trap
     if pos in state.danger_positions:
         # Create new visible board showing all dangers
-        new_visible = [row[:] for row in state.visible_board]
-        new_visible[y][x] = TRAP
+        new_visible = state.visible_board.copy()
+        new_visible.set(x, y, TRAP_CODE)
 
         return state.with_updates(
-            visible_board=cast(GameBoard, new_visible), game_over=True
+            visible_board=new_visible,
+            revealed_count=state.revealed_count + 1,
+            game_over=True,
         )
 
     # Reveal the cell
-    new_visible = [row[:] for row in state.visible_board]
-    new_visible[y][x] = state.hidden_board[y][x]
+    new_visible = state.visible_board.copy()
+    new_visible.set(x, y, state.hidden_board.get(x, y))
 
-    new_state = state.with_updates(visible_board=cast(GameBoard, new_visible))
+    new_state = state.with_updates(
+        visible_board=new_visible, revealed_count=state.revealed_count + 1
+    )
 
     # Check if auto-expand (empty cell with no adjacent dangers)
-    if state.hidden_board[y][x] == EMPTY:
+    if state.hidden_board.get(x, y) == EMPTY_CODE:
         new_state = auto_expand(new_state, x, y)
 
     # Check win condition
@@ -84,3 +217,68 @@ def scan_position(state: GameState, pos: Position) -> GameState:
         new_state = new_state.with_updates(win=True)
 
     return new_state
+
+
+@timed
+def scan_positions(
+    state: GameState, positions: Iterable[Position]
+) -> Tuple[GameState, List[ScanOutcome]]:
+    """Scan many positions in one call with a single board copy
+
+    Stops after the first trap. The final state equals folding scan_position
+    over the positions that were applied, which get one outcome each.
+    """
+    new_visible: Optional[Board] = None
+    revealed_count = state.revealed_count
+    outcomes: List[ScanOutcome] = []
+    hit_trap = False
+
+    for pos in positions:
+        x, y = pos
+
+        # Check if position is valid
+        if not (0 <= x < state.width and 0 <= y < state.height):
+            outcomes.append(OUTCOME_INVALID)
+            continue
+
+        # Check if already revealed
+        board = state.visible_board if new_visible is None else new_visible
+        if board.get(x, y) != HIDDEN_CODE:
+            outcomes.append(OUTCOME_REVEALED)
+            continue
+
+        # Copy the board once, on the first move that changes it
+        if new_visible is None:
+            new_visible = state.visible_board.copy()
+
+        # Place the traps of a safe-first-click game around the first scan
+        if not state.traps_placed:
+            state = place_traps(state, pos)
+
+        # Check if hit a trap
+        if pos in state.danger_positions:
+            new_visible.set(x, y, TRAP_CODE)
+            revealed_count += 1
+            outcomes.append(OUTCOME_TRAP)
+            hit_trap = True
+            break
+
+        # Reveal the cell and auto-expand empty cells
+        revealed = flood_fill(state.hidden_board, new_visible, x, y)
+        revealed_count += revealed
+        if PROFILE.enabled:
+            count("cells_expanded", revealed)
+        outcomes.append(OUTCOME_SAFE)
+
+    if new_visible is None:
+        return state, outcomes
+
+    new_state = state.with_updates(
+        visible_board=new_visible, revealed_count=revealed_count, game_over=hit_trap
+    )
+
+    # Check win condition
+    if not hit_trap and is_win_condition(new_state):
+        new_state = new_state.with_updates(win=True)
+
+    return new_state, outcomes
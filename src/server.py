@@ -0,0 +1,390 @@
+"""
+Asyncio game server speaking JSON lines over a local socket.
+
+Run with ``python -m src.server`` to serve, or ``python -m src.server
+--load-test`` to measure move latency with many concurrent sessions. Every
+request is one JSON object per line with an "op" field:
+
+    {"op": "new", "width": 8, "height": 8, "traps": 0.15, "seed": 1}
+    {"op": "scan", "session": "1", "x": 3, "y": 4}
+    {"op": "state", "session": "1"}
+    {"op": "quit", "session": "1"}
+
+and every response is one JSON object per line with "ok" set, plus "error" when
+the request failed. Sessions live in one table for the whole server, so a
+connection may play any number of them.
+
+Creating a large board and playing it, above all the first scan that places the
+traps, take long enough to stall every other connection, so on boards of
+OFFLOAD_CELLS cells or more they run on a worker thread. Requests on one session
+are still answered one at a time, in the order they arrive.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .Domain import Position
+from .GameState import GameState
+from .initialize_game import initialize_game
+from .scan_position import scan_positions
+
+Message = Dict[str, object]
+
+DEFAULT_PORT = 8765
+# Largest board a client may create, and the longest request or response line
+MAX_CELLS = 1_000_000
+LINE_LIMIT = 1 << 22
+# Boards from this size on are generated and played on a worker thread
+OFFLOAD_CELLS = 40_000
+
+
+class NewGame(NamedTuple):
+    """Validated parameters of a "new" request"""
+
+    width: int
+    height: int
+    traps: float
+    seed: Optional[int]
+    safe_first_click: bool
+
+
+def state_summary(state: GameState) -> Message:
+    """Counters and flags of a game state"""
+    return {
+        "width": state.width,
+        "height": state.height,
+        "trap_count": state.trap_count,
+        "revealed_count": state.revealed_count,
+        "game_over": state.game_over,
+        "win": state.win,
+    }
+
+
+def _int_field(request: Message, name: str, default: Optional[int] = None) -> int:
+    """Read an integer field of a request"""
+    value = request.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f"Field {name!r} must be an integer")
+    return value
+
+
+def decode_request(line: bytes) -> Message:
+    """Decode a request line, raising ValueError for anything but an object"""
+    try:
+        request = json.loads(line)
+    except ValueError:
+        raise ValueError("Invalid JSON") from None
+    if not isinstance(request, dict):
+        raise ValueError("Request must be an object")
+    return request
+
+
+def encode_message(message: Message) -> bytes:
+    """Encode a message as one JSON line"""
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+class GameServer:
+    """Session table of game states and the request handlers working on it"""
+
+    def __init__(self, max_sessions: int = 100_000) -> None:
+        self.sessions: Dict[str, GameState] = {}
+        self.max_sessions = max_sessions
+        self._next_session = 0
+        # Locks keeping the requests on a session in order, by session
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _session(self, request: Message) -> Tuple[str, GameState]:
+        session = request.get("session")
+        if not isinstance(session, str) or session not in self.sessions:
+            raise ValueError(f"Unknown session {session!r}")
+        return session, self.sessions[session]
+
+    def _check_capacity(self) -> None:
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError("Too many sessions")
+
+    def _new_game(self, request: Message) -> NewGame:
+        """Validate the parameters of a "new" request"""
+        self._check_capacity()
+        traps = request.get("traps", 0.15)
+        if not isinstance(traps, (int, float)) or not 0 < traps < 1:
+            raise ValueError("Field 'traps' must be a fraction between 0 and 1")
+        width = _int_field(request, "width", 8)
+        height = _int_field(request, "height", 8)
+        if width < 1 or height < 1:
+            raise ValueError("Fields 'width' and 'height' must be positive")
+        # Check the size initialize_game creates, which is at least 5x5
+        width, height = max(5, width), max(5, height)
+        if width * height > MAX_CELLS:
+            raise ValueError(f"Boards are limited to {MAX_CELLS} cells")
+        seed = request.get("seed")
+        safe_first_click = request.get("safe_first_click", True)
+        if not isinstance(safe_first_click, bool):
+            raise ValueError("Field 'safe_first_click' must be true or false")
+        return NewGame(
+            width,
+            height,
+            traps,
+            None if seed is None else _int_field(request, "seed"),
+            safe_first_click,
+        )
+
+    @staticmethod
+    def _generate(game: NewGame) -> GameState:
+        return initialize_game(
+            game.width,
+            game.height,
+            game.traps,
+            seed=game.seed,
+            safe_first_click=game.safe_first_click,
+        )
+
+    def _add_session(self, state: GameState) -> Message:
+        # Checked again: other boards may have been created meanwhile
+        self._check_capacity()
+        self._next_session += 1
+        session = str(self._next_session)
+        self.sessions[session] = state
+        return {"session": session, **state_summary(state)}
+
+    def _new(self, request: Message) -> Message:
+        return self._add_session(self._generate(self._new_game(request)))
+
+    def _scan(self, request: Message) -> Message:
+        session, state = self._session(request)
+        pos = Position((_int_field(request, "x"), _int_field(request, "y")))
+        state, outcomes = scan_positions(state, [pos])
+        self.sessions[session] = state
+        return {"outcome": outcomes[0], **state_summary(state)}
+
+    def _state(self, request: Message) -> Message:
+        _, state = self._session(request)
+        board = [state.visible_board.row_text(y) for y in range(state.height)]
+        return {"board": board, **state_summary(state)}
+
+    def _quit(self, request: Message) -> Message:
+        session, _ = self._session(request)
+        del self.sessions[session]
+        self._locks.pop(session, None)
+        return {}
+
+    def handle_request(self, request: Message) -> Message:
+        """Answer a single decoded request"""
+        handlers = {
+            "new": self._new,
+            "scan": self._scan,
+            "state": self._state,
+            "quit": self._quit,
+        }
+        try:
+            handler = handlers.get(str(request.get("op")))
+            if handler is None:
+                raise ValueError(f"Unknown op {request.get('op')!r}")
+            return {"ok": True, **handler(request)}
+        except ValueError as error:
+            return {"ok": False, "error": str(error)}
+
+    async def handle_request_async(self, request: Message) -> Message:
+        """Answer a request like handle_request, with large boards on a thread"""
+        loop = asyncio.get_running_loop()
+        if request.get("op") == "new":
+            try:
+                game = self._new_game(request)
+                if game.width * game.height < OFFLOAD_CELLS:
+                    state = self._generate(game)
+                else:
+                    state = await loop.run_in_executor(None, self._generate, game)
+                return {"ok": True, **self._add_session(state)}
+            except ValueError as error:
+                return {"ok": False, "error": str(error)}
+
+        session = request.get("session")
+        if not isinstance(session, str) or session not in self.sessions:
+            return self.handle_request(request)
+        async with self._locks.setdefault(session, asyncio.Lock()):
+            current = self.sessions.get(session)
+            if current is None or current.width * current.height < OFFLOAD_CELLS:
+                return self.handle_request(request)
+            return await loop.run_in_executor(None, self.handle_request, request)
+
+    def handle_line(self, line: bytes) -> bytes:
+        """Answer a single request line with a response line"""
+        try:
+            request = decode_request(line)
+        except ValueError as error:
+            return encode_message({"ok": False, "error": str(error)})
+        return encode_message(self.handle_request(request))
+
+    async def handle_line_async(self, line: bytes) -> bytes:
+        """Answer a request line like handle_line, with large boards on a thread"""
+        try:
+            request = decode_request(line)
+        except ValueError as error:
+            return encode_message({"ok": False, "error": str(error)})
+        return encode_message(await self.handle_request_async(request))
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve the requests of one connection until it is closed"""
+        try:
+            while line := await reader.readline():
+                writer.write(await self.handle_line_async(line))
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass  # Client went away or sent a line over the limit
+        finally:
+            writer.close()
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = DEFAULT_PORT
+    ) -> asyncio.Server:
+        """Start listening; returns the asyncio server"""
+        return await asyncio.start_server(
+            self.handle_connection, host, port, limit=LINE_LIMIT
+        )
+
+
+async def send_request(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, message: Message
+) -> Message:
+    """Send a request and wait for its response"""
+    writer.write(encode_message(message))
+    response: Message = json.loads(await reader.readline())
+    return response
+
+
+async def _load_test_connection(
+    host: str,
+    port: int,
+    sessions: int,
+    moves: int,
+    config: Message,
+    seed: int,
+    latencies: List[float],
+) -> None:
+    """Play moves round robin on the sessions of one connection"""
+    reader, writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+    rng = random.Random(seed)
+    games: Dict[str, Message] = {}
+    for index in range(sessions):
+        response = await send_request(
+            reader, writer, {"op": "new", "seed": seed + index, **config}
+        )
+        games[str(response["session"])] = response
+
+    for _ in range(moves):
+        for session, game in list(games.items()):
+            if game["game_over"] or game["win"]:
+                continue
+            scan = {
+                "op": "scan",
+                "session": session,
+                "x": rng.randrange(int(str(game["width"]))),
+                "y": rng.randrange(int(str(game["height"]))),
+            }
+            start = time.perf_counter()
+            games[session] = await send_request(reader, writer, scan)
+            latencies.append(time.perf_counter() - start)
+
+    for session in games:
+        await send_request(reader, writer, {"op": "quit", "session": session})
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load_test(
+    host: str,
+    port: int,
+    connections: int = 100,
+    sessions: int = 2000,
+    moves: int = 10,
+    config: Optional[Message] = None,
+    seed: int = 0,
+) -> Dict[str, object]:
+    """Play many sessions over concurrent connections and report move latency"""
+    config = config or {"width": 16, "height": 16, "traps": 0.15}
+    latencies: List[float] = []
+    per_connection = [
+        sessions // connections + (index < sessions % connections)
+        for index in range(connections)
+    ]
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _load_test_connection(
+                host, port, count, moves, config, seed + index * count, latencies
+            )
+            for index, count in enumerate(per_connection)
+            if count
+        )
+    )
+    elapsed = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else []
+    return {
+        "connections": connections,
+        "sessions": sessions,
+        "moves": len(latencies),
+        "moves_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentiles[49] * 1000 if percentiles else None,
+        "p99_ms": percentiles[98] * 1000 if percentiles else None,
+    }
+
+
+async def _serve(host: str, port: int) -> None:
+    server = await GameServer().start(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+async def _run_load_test(args: argparse.Namespace) -> Dict[str, object]:
+    """Run the load test against a server started in this process"""
+    server = await GameServer().start(args.host, 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        return await load_test(
+            args.host,
+            port,
+            args.connections,
+            args.sessions,
+            args.moves,
+            {"width": args.width, "height": args.height, "traps": args.traps},
+            args.seed,
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Serve games, or run the load test and print its report as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--load-test",
+        action="store_true",
+        help="measure move latency against a server in this process",
+    )
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--moves", type=int, default=10, help="scans per session")
+    parser.add_argument("--width", type=int, default=16)
+    parser.add_argument("--height", type=int, default=16)
+    parser.add_argument("--traps", type=float, default=0.15)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        print(json.dumps(asyncio.run(_run_load_test(args)), indent=2))
+    else:
+        asyncio.run(_serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Headless Monte Carlo simulation of many games under a scripted strategy.
+
+Run with ``python -m src.simulate``. Games are spread over a process pool in
+chunks; workers only send back aggregated counters, never game states.
+"""
+
+import argparse
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from .bench import parse_size
+from .Domain import HIDDEN_CODE, Position
+from .GameState import GameState
+from .initialize_game import initialize_game, load_numpy
+from .scan_position import scan_position
+from .solver import Solver
+
+
+class SimulationConfig(NamedTuple):
+    """Board configuration to simulate"""
+
+    width: int
+    height: int
+    trap_percentage: float
+    safe_first_click: bool = True
+
+
+# A strategy picks the next position to scan
+Strategy = Callable[[GameState, random.Random], Position]
+# Strategies may keep state during a game, so every game creates its own
+StrategyFactory = Callable[[SimulationConfig], Strategy]
+
+
+class GameResult(NamedTuple):
+    """Outcome of a single simulated game"""
+
+    won: bool
+    moves: int
+    cells_revealed: int
+
+
+class SimulationStats(NamedTuple):
+    """Aggregated outcome of all games of one configuration"""
+
+    config: SimulationConfig
+    games: int
+    wins: int
+    total_moves: int
+    total_cells_revealed: int
+
+    @property
+    def win_rate(self) -> float:
+        """Fraction of games won"""
+        return self.wins / self.games if self.games else 0.0
+
+    @property
+    def mean_moves(self) -> float:
+        """Average number of scans per game"""
+        return self.total_moves / self.games if self.games else 0.0
+
+    @property
+    def mean_cells_revealed(self) -> float:
+        """Average number of revealed cells at the end of a game"""
+        return self.total_cells_revealed / self.games if self.games else 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        """JSON-ready representation of the statistics"""
+        return {
+            **self.config._asdict(),
+            "games": self.games,
+            "wins": self.wins,
+            "win_rate": self.win_rate,
+            "mean_moves": self.mean_moves,
+            "mean_cells_revealed": self.mean_cells_revealed,
+        }
+
+
+def random_strategy(state: GameState, rng: random.Random) -> Position:
+    """Scan a uniformly random hidden cell"""
+    # Rejection sampling is fast while many cells are still hidden
+    for _ in range(32):
+        x, y = rng.randrange(state.width), rng.randrange(state.height)
+        if state.visible_board.get(x, y) == HIDDEN_CODE:
+            return Position((x, y))
+
+    hidden_positions = [
+        Position((x, y))
+        for y, row in enumerate(state.visible_board.rows)
+        for x, code in enumerate(row)
+        if code == HIDDEN_CODE
+    ]
+    return rng.choice(hidden_positions)
+
+
+def solver_strategy(config: SimulationConfig) -> Strategy:
+    """Strategy scanning cells the constraint solver deduced to be safe"""
+    solvers: List[Solver] = []
+
+    def strategy(state: GameState, rng: random.Random) -> Position:
+        # Sized from the game itself, which may be larger than the config
+        if not solvers:
+            solvers.append(Solver(state.width, state.height, state.trap_count))
+        return solvers[0].next_move(state, rng)
+
+    return strategy
+
+
+STRATEGIES: Dict[str, StrategyFactory] = {
+    "random": lambda config: random_strategy,
+    "solver": solver_strategy,
+}
+
+
+def play_game(config: SimulationConfig, seed: int, strategy: Strategy) -> GameResult:
+    """Play one game to the end with the given strategy"""
+    state = initialize_game(
+        config.width,
+        config.height,
+        config.trap_percentage,
+        seed=seed,
+        safe_first_click=config.safe_first_click,
+    )
+    rng = random.Random(seed)
+    moves = 0
+
+    while not state.game_over and not state.win:
+        state = scan_position(state, strategy(state, rng))
+        moves += 1
+
+    return GameResult(state.win, moves, state.revealed_count)
+
+
+def _play_chunk(
+    config: SimulationConfig, first_seed: int, games: int, strategy_name: str
+) -> SimulationStats:
+    """Worker entry point: play a chunk of games and aggregate the results"""
+    # Many games amortize importing NumPy even on small boards
+    load_numpy()
+    wins = total_moves = total_cells_revealed = 0
+
+    for seed in range(first_seed, first_seed + games):
+        result = play_game(config, seed, STRATEGIES[strategy_name](config))
+        wins += result.won
+        total_moves += result.moves
+        total_cells_revealed += result.cells_revealed
+
+    return SimulationStats(config, games, wins, total_moves, total_cells_revealed)
+
+
+def _chunks(games: int, chunk_size: int) -> Iterator[range]:
+    """Split game indices into ranges of at most chunk_size games"""
+    for start in range(0, games, chunk_size):
+        yield range(start, min(start + chunk_size, games))
+
+
+def simulate(
+    configs: Sequence[SimulationConfig],
+    games_per_config: int,
+    seed: int = 0,
+    workers: Optional[int] = None,
+    strategy_name: str = "random",
+) -> List[SimulationStats]:
+    """Play games_per_config games of every configuration across a process pool
+
+    Game i of every configuration uses seed + i, so the results do not depend on
+    the number of workers. workers=1 plays all games in this process.
+    """
+    if strategy_name not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy_name!r}")
+
+    workers = workers or os.cpu_count() or 1
+    # A few chunks per worker balance the load without much IPC
+    chunk_size = max(1, games_per_config // (workers * 4))
+    tasks = [
+        (config, seed + chunk.start, len(chunk), strategy_name)
+        for config in configs
+        for chunk in _chunks(games_per_config, chunk_size)
+    ]
+
+    if workers == 1:
+        partials = [_play_chunk(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(_play_chunk, *zip(*tasks)))
+
+    # Merge the chunk statistics per configuration, keeping the input order
+    totals = {config: SimulationStats(config, 0, 0, 0, 0) for config in configs}
+    for partial in partials:
+        total = totals[partial.config]
+        totals[partial.config] = SimulationStats(
+            partial.config,
+            total.games + partial.games,
+            total.wins + partial.wins,
+            total.total_moves + partial.total_moves,
+            total.total_cells_revealed + partial.total_cells_revealed,
+        )
+    return [totals[config] for config in configs]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run a simulation sweep and print the statistics as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda text: [parse_size(size) for size in text.split(",")],
+        default=[(8, 8)],
+        help="comma-separated board sizes, e.g. 8x8,16x16",
+    )
+    parser.add_argument(
+        "--traps",
+        type=lambda text: [float(value) for value in text.split(",")],
+        default=[0.15],
+        help="comma-separated trap percentages, e.g. 0.1,0.15",
+    )
+    parser.add_argument("--games", type=int, default=1000, help="games per config")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="defaults to the CPU count")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="random")
+    parser.add_argument(
+        "--unsafe-first-click",
+        action="store_true",
+        help="place traps before the first scan",
+    )
+    args = parser.parse_args(argv)
+
+    configs = [
+        SimulationConfig(width, height, trap_percentage, not args.unsafe_first_click)
+        for width, height in args.sizes
+        for trap_percentage in args.traps
+    ]
+    stats = simulate(configs, args.games, args.seed, args.workers, args.strategy)
+    print(json.dumps([stat.to_dict() for stat in stats], indent=2))
+
+
+if __name__ == "__main__":
+    main()
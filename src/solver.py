@@ -0,0 +1,249 @@
+"""
+Constraint solver and auto-player working on the visible board only.
+
+The solver keeps its frontier (revealed numbers that still touch unknown hidden
+cells) up to date incrementally: after each scan it only looks at the rows the
+move copied, which copy-on-write boards make cheap to find.
+"""
+
+import random
+from typing import Dict, List, Optional, Set, Tuple
+
+from .Board import require_flat
+from .Domain import EMPTY_CODE, HIDDEN_CODE, TRAP_CODE, Position
+from .GameState import GameState
+from .neighbors import neighbor_table
+
+
+class Solver:
+    """Incremental deducer of safe cells and traps from the visible board"""
+
+    def __init__(
+        self, width: int, height: int, trap_count: int, wrap: bool = False
+    ) -> None:
+        self.width = width
+        self.height = height
+        self.trap_count = trap_count
+        # Neighbors of a cell, and the cells close enough to share neighbors
+        self.neighbors = neighbor_table(width, height, wrap)
+        self.window = neighbor_table(width, height, wrap, radius=2)
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the board read so far and everything deduced from it"""
+        self.rows: Optional[List[bytearray]] = None
+        self.revealed_count = 0
+        # Hidden cells deduced to be safe or traps, as flat indices
+        self.safe: Set[int] = set()
+        self.traps: Set[int] = set()
+        # Revealed numbers with unknown hidden neighbors
+        self.frontier: Set[int] = set()
+        # Constraints changed since the single-cell and subset rules last ran
+        self.dirty: Set[int] = set()
+        self.subset_dirty: Set[int] = set()
+
+    @classmethod
+    def for_state(cls, state: GameState) -> "Solver":
+        """Create a solver that has already read the state"""
+        solver = cls(state.width, state.height, state.trap_count)
+        solver.update(state)
+        return solver
+
+    def _code(self, index: int) -> int:
+        """Visible cell code at a flat index"""
+        assert self.rows is not None
+        y, x = divmod(index, self.width)
+        return self.rows[y][x]
+
+    def _is_unknown(self, index: int) -> bool:
+        """Whether a cell is hidden and not deduced yet"""
+        return (
+            self._code(index) == HIDDEN_CODE
+            and index not in self.safe
+            and index not in self.traps
+        )
+
+    def _constraint(self, index: int) -> Tuple[Set[int], int]:
+        """Unknown neighbors of a revealed number and the traps among them"""
+        assert self.rows is not None
+        rows, width = self.rows, self.width
+        y, x = divmod(index, width)
+        unknown: Set[int] = set()
+        remaining = rows[y][x]
+        for dx, dy in self.neighbors.deltas(x, y):
+            neighbor = index + dy * width + dx
+            if neighbor in self.traps:
+                remaining -= 1
+            elif rows[y + dy][x + dx] == HIDDEN_CODE and neighbor not in self.safe:
+                unknown.add(neighbor)
+        return unknown, remaining
+
+    def _touch(self, index: int) -> None:
+        """Mark the constraints around a cell as changed"""
+        for neighbor in self.neighbors.neighbors(index):
+            if neighbor in self.frontier:
+                self.dirty.add(neighbor)
+                self.subset_dirty.add(neighbor)
+
+    def update(self, state: GameState) -> None:
+        """Read the cells revealed since the last update
+
+        Cells hidden again, by undoing moves, may have been the reason for
+        earlier deductions, so the solver then starts over from the whole board.
+        """
+        require_flat(state.visible_board, "The solver")
+        new_rows = state.visible_board.rows
+        hidden_row = bytes([HIDDEN_CODE]) * self.width
+        revealed: List[int] = []
+
+        for y, new_row in enumerate(new_rows):
+            old_row = hidden_row if self.rows is None else self.rows[y]
+            # Rows untouched by the moves are shared with the previous board
+            if old_row is new_row or old_row == new_row:
+                continue
+            for x, (old, new) in enumerate(zip(old_row, new_row)):
+                if old == new:
+                    continue
+                if new == HIDDEN_CODE:
+                    self.reset()
+                    self.update(state)
+                    return
+                revealed.append(y * self.width + x)
+
+        self.rows = new_rows
+        self.revealed_count = state.revealed_count
+        for index in revealed:
+            self.safe.discard(index)
+            code = self._code(index)
+            if code == TRAP_CODE:
+                continue
+            if code != EMPTY_CODE:
+                self.frontier.add(index)
+                self.dirty.add(index)
+                self.subset_dirty.add(index)
+            self._touch(index)
+
+    def _mark(self, index: int, is_trap: bool) -> None:
+        """Record a deduced cell and wake up the constraints around it"""
+        (self.traps if is_trap else self.safe).add(index)
+        self._touch(index)
+
+    def _apply_single_cell_rules(self) -> None:
+        """Deduce cells from constraints that are fully determined on their own"""
+        while self.dirty:
+            index = self.dirty.pop()
+            unknown, remaining = self._constraint(index)
+            if not unknown:
+                self.frontier.discard(index)
+                self.subset_dirty.discard(index)
+            elif remaining == 0:
+                for cell in unknown:
+                    self._mark(cell, is_trap=False)
+            elif remaining == len(unknown):
+                for cell in unknown:
+                    self._mark(cell, is_trap=True)
+
+    def _apply_subset_rules(self) -> bool:
+        """Deduce cells from pairs of constraints where one contains the other"""
+        changed, self.subset_dirty = self.subset_dirty, set()
+
+        for index in changed:
+            if index not in self.frontier:
+                continue
+            unknown, remaining = self._constraint(index)
+            # Constraints sharing unknown cells are at most two cells apart
+            for other in self.window.neighbors(index):
+                if other not in self.frontier:
+                    continue
+                other_unknown, other_remaining = self._constraint(other)
+                for small, small_traps, large, large_traps in (
+                    (unknown, remaining, other_unknown, other_remaining),
+                    (other_unknown, other_remaining, unknown, remaining),
+                ):
+                    if not small or not small < large:
+                        continue
+                    difference = large - small
+                    traps = large_traps - small_traps
+                    if traps == 0 or traps == len(difference):
+                        for cell in difference:
+                            self._mark(cell, is_trap=traps > 0)
+                        # Restart from the single-cell rules on the next call
+                        self.subset_dirty |= changed
+                        return True
+        return False
+
+    def deduce(self, exhaustive: bool = False) -> None:
+        """Run the rules until a safe cell is known or nothing new is deduced
+
+        With exhaustive the rules run until they deduce nothing new at all.
+        """
+        self._apply_single_cell_rules()
+        while (exhaustive or not self.safe) and self._apply_subset_rules():
+            self._apply_single_cell_rules()
+
+    def trap_probabilities(self) -> Dict[int, float]:
+        """Estimated trap probability of every unknown frontier cell
+
+        Each constraint spreads its remaining traps evenly over its unknown
+        cells; a cell gets the highest estimate of its constraints.
+        """
+        probabilities: Dict[int, float] = {}
+        for index in self.frontier:
+            unknown, remaining = self._constraint(index)
+            for cell in unknown:
+                probability = remaining / len(unknown)
+                probabilities[cell] = max(probabilities.get(cell, 0.0), probability)
+        return probabilities
+
+    def _guess(self, rng: random.Random) -> int:
+        """Pick the unknown cell least likely to be a trap"""
+        probabilities = self.trap_probabilities()
+        hidden_count = self.width * self.height - self.revealed_count
+        unknown_count = hidden_count - len(self.traps) - len(self.safe)
+        remaining_traps = self.trap_count - len(self.traps)
+
+        # Cells away from the frontier share the remaining trap density
+        interior_count = unknown_count - len(probabilities)
+        if interior_count > 0:
+            frontier_traps = sum(probabilities.values())
+            density = max(remaining_traps - frontier_traps, 0.0) / interior_count
+            if not probabilities or density < min(probabilities.values()):
+                for _ in range(64):
+                    index = rng.randrange(self.width * self.height)
+                    if self._is_unknown(index) and index not in probabilities:
+                        return index
+
+        if probabilities:
+            return min(probabilities, key=lambda cell: (probabilities[cell], cell))
+
+        # No frontier and no luck sampling the interior: take any unknown cell
+        for index in range(self.width * self.height):
+            if self._is_unknown(index):
+                return index
+        raise ValueError("No unknown cell left to scan")
+
+    def next_move(self, state: GameState, rng: random.Random) -> Position:
+        """Read the state and pick the next position to scan"""
+        self.update(state)
+        self.deduce()
+        index = self.safe.pop() if self.safe else self._guess(rng)
+        y, x = divmod(index, self.width)
+        return Position((x, y))
+
+    def __call__(self, state: GameState, rng: random.Random) -> Position:
+        return self.next_move(state, rng)
+
+    def safe_positions(self) -> Set[Position]:
+        """Hidden positions deduced to be safe"""
+        return {Position((i % self.width, i // self.width)) for i in self.safe}
+
+    def trap_positions(self) -> Set[Position]:
+        """Hidden positions deduced to be traps"""
+        return {Position((i % self.width, i // self.width)) for i in self.traps}
+
+
+def deduce(state: GameState) -> Tuple[Set[Position], Set[Position]]:
+    """Deduce the safe positions and the traps of a visible board"""
+    solver = Solver.for_state(state)
+    solver.deduce(exhaustive=True)
+    return solver.safe_positions(), solver.trap_positions()
@@ -0,0 +1,187 @@
+"""
+Event-loop front end reading single keys from a terminal in cbreak mode.
+
+The loop waits on stdin with a selector and parses whatever bytes arrived into
+keys, so arrow keys move the selection right away instead of after Enter. Key
+repeats can arrive much faster than the terminal redraws, so keys only update
+the state and a frame is written at most once per frame budget, showing every
+move made since the previous one.
+
+Only the modules needed for the first frame are imported up front: the journal
+(and with it the scanning engine) is imported by the first move.
+"""
+
+import codecs
+import os
+import selectors
+import sys
+import termios
+import time
+import tty
+from typing import TYPE_CHECKING, List, Optional, TextIO, Tuple
+
+from .Domain import KEY_QUIT, KEY_REDO, KEY_SCAN, KEY_UNDO, Key, Position
+from .GameState import GameState
+from .io_game import (
+    BOARD_TOP,
+    CLEAR_BELOW,
+    CLEAR_SCREEN,
+    KEY_STEPS,
+    KeyParser,
+    Viewport,
+    cell_screen_position,
+    move_cursor,
+    move_selection,
+    render_board,
+    render_board_update,
+    scroll_to,
+    terminal_viewport,
+)
+
+if TYPE_CHECKING:
+    from .journal import Journal
+
+# Shortest time between two frames
+FRAME_SECONDS = 1 / 60
+# How long a lone escape waits for the rest of an escape sequence
+ESCAPE_SECONDS = 0.05
+
+HELP = "arrows/hjkl/wasd move, space scans, u undo, r redo, q quits"
+
+
+class Frontend:
+    """State of the key-driven front end: game, selection and drawn frame"""
+
+    def __init__(self, state: GameState) -> None:
+        self.state = state
+        self.selection = Position((state.width // 2, state.height // 2))
+        self.viewport = terminal_viewport(state, self.selection)
+        self.parser = KeyParser()
+        self.quit = False
+        # State and viewport of the frame on screen, None before the first one
+        self.drawn: Optional[Tuple[GameState, Viewport]] = None
+        self.dirty = True
+        self._journal: Optional["Journal"] = None
+
+    @property
+    def journal(self) -> "Journal":
+        """Journal of the moves, imported and created by the first move"""
+        if self._journal is None:
+            from .journal import Journal  # pylint: disable=import-outside-toplevel
+
+            self._journal = Journal(self.state)
+        return self._journal
+
+    @property
+    def done(self) -> bool:
+        """Whether the game ended or the player quit"""
+        return self.quit or self.state.game_over or self.state.win
+
+    def handle_key(self, key: Key) -> None:
+        """Apply one key to the game or the selection"""
+        if key == KEY_QUIT:
+            self.quit = True
+        elif key == KEY_SCAN:
+            self.state = self.journal.record(self.selection)
+        elif key == KEY_UNDO:
+            self.state = self.journal.undo()
+        elif key == KEY_REDO:
+            self.state = self.journal.redo()
+        elif key in KEY_STEPS:
+            self.selection = move_selection(self.state, self.selection, key)
+            self.viewport = scroll_to(self.state, self.viewport, self.selection)
+        self.dirty = True
+
+    def handle_input(self, data: str) -> None:
+        """Apply the keys of a chunk of input until the game is done"""
+        self.handle_keys(self.parser.feed(data))
+
+    def handle_keys(self, keys: List[Key]) -> None:
+        """Apply parsed keys, ignoring the ones after the game is done"""
+        for key in keys:
+            if self.done:
+                break
+            self.handle_key(key)
+
+    def frame(self) -> str:
+        """Screen updates since the last frame, ending at the selected cell"""
+        state, viewport = self.state, self.viewport
+        if self.drawn is None or self.drawn[1] != viewport:
+            # Draw the full frame once, and again when the viewport scrolls
+            parts = [
+                CLEAR_SCREEN,
+                "=== ABANDONED SPACE STATION ===\n",
+                "Find all safe areas without triggering traps.\n",
+                f"Board size: {state.width}x{state.height}, "
+                f"Traps: {state.trap_count}\n",
+                render_board(state, viewport),
+            ]
+        else:
+            # Only redraw the cells changed by the moves since the last frame
+            parts = [render_board_update(self.drawn[0], state, BOARD_TOP, viewport)]
+
+        x, y = self.selection
+        parts.append(move_cursor(BOARD_TOP + viewport.height + 3) + CLEAR_BELOW)
+        parts.append(f"Selected ({x}, {y}): {HELP}")
+        parts.append(move_cursor(*cell_screen_position(state, viewport, self.selection)))
+        self.drawn = state, viewport
+        self.dirty = False
+        return "".join(parts)
+
+
+def run(
+    state: GameState,
+    frame_seconds: float = FRAME_SECONDS,
+    stdin: TextIO = sys.stdin,
+    stdout: TextIO = sys.stdout,
+) -> GameState:
+    """Play a game with single-key input until it ends; the final state
+
+    The terminal is switched to cbreak mode rather than full raw mode, so
+    Ctrl-C still interrupts and written newlines still return the carriage.
+    """
+    fd = stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    frontend = Frontend(state)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    selector = selectors.DefaultSelector()
+    selector.register(fd, selectors.EVENT_READ)
+    next_frame = last_input = 0.0
+    try:
+        tty.setcbreak(fd)
+        while True:
+            now = time.monotonic()
+            if frontend.dirty and now >= next_frame:
+                stdout.write(frontend.frame())
+                stdout.flush()
+                next_frame = now + frame_seconds
+            if frontend.done:
+                break
+
+            # Sleep until input arrives, the next frame is due or a lone
+            # escape has waited long enough to be the escape key
+            timeout: Optional[float] = None
+            if frontend.dirty:
+                timeout = max(next_frame - now, 0.0)
+            if frontend.parser.pending:
+                wait = max(last_input + ESCAPE_SECONDS - now, 0.0)
+                timeout = wait if timeout is None else min(timeout, wait)
+            if selector.select(timeout):
+                data = os.read(fd, 4096)
+                if not data:
+                    break
+                last_input = time.monotonic()
+                frontend.handle_input(decoder.decode(data))
+            elif (
+                frontend.parser.pending
+                and time.monotonic() >= last_input + ESCAPE_SECONDS
+            ):
+                frontend.handle_keys(frontend.parser.flush())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        selector.close()
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+        stdout.write("\n")
+        stdout.flush()
+    return frontend.state
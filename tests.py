@@ -2,31 +2,109 @@
 Unit tests for the Abandoned Space Station game.
 """
 
+import asyncio
+import itertools
+import json
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
 import unittest
-from typing import List, Set, cast
+from typing import Dict, List, Set, Tuple, cast
 
+from src.bench import run_benchmarks
+from src.board_pool import BoardPool
+from src.Board import Board, LazyBoard, TrapBitset, list_board_nbytes
 from src.Domain import (
     EMPTY,
+    EMPTY_CODE,
     HIDDEN,
+    HIDDEN_CODE,
+    OUTCOME_INVALID,
+    OUTCOME_REVEALED,
+    OUTCOME_SAFE,
+    OUTCOME_TRAP,
     TRAP,
+    TRAP_CODE,
     CellContent,
     GameBoard,
     HiddenBoard,
+    KEY_DOWN,
+    KEY_LEFT,
+    KEY_QUIT,
+    KEY_RIGHT,
+    KEY_SCAN,
+    KEY_UNDO,
+    KEY_UP,
     Position,
 )
 from src.GameState import GameState
+from src.chunked_board import (
+    CHUNK_SIZE,
+    ChunkedBoard,
+    ChunkedHiddenBoard,
+    ChunkedTraps,
+    ChunkStore,
+    initialize_chunked_game,
+)
 from src.initialize_game import (
+    LazyHiddenBoard,
+    compute_adjacent_counts,
     count_adjacent_dangers,
     create_empty_board,
     initialize_game,
+    load_numpy,
+    sample_trap_indices,
+)
+from src.io_game import (
+    KeyParser,
+    Viewport,
+    cell_screen_position,
+    move_cursor,
+    move_selection,
+    move_viewport,
+    render_board,
+    render_board_update,
+    scroll_to,
+    viewport_around,
+)
+from src.scan_position import (
+    auto_expand,
+    is_win_condition,
+    scan_position,
+    scan_positions,
+    set_consistency_checks,
 )
-from src.io_game import render_board
-from src.scan_position import is_win_condition, scan_position
+from src.journal import Journal, replay
+from src.neighbors import neighbor_table
+from src.no_guess import (
+    FLAGGED,
+    Deducer,
+    is_no_guess,
+    no_guess_trap_indices,
+    protected_cells,
+)
+from src.probability import ProbabilityEngine, trap_probabilities
+from src.profiling import PROFILE, profiling, set_profiling
+from src.save_game import HEADER, encode_game, load_game, save_game
+from src.server import GameServer, load_test
+from src.simulate import SimulationConfig, play_game, random_strategy, simulate
+from src.solver import Solver, deduce
+from src.terminal import Frontend
 
 
 class TestGameFunctions(unittest.TestCase):
     """Test cases for game functions"""
 
+    def setUp(self) -> None:
+        set_consistency_checks(True)
+
+    def tearDown(self) -> None:
+        set_consistency_checks(False)
+
     def test_create_empty_board(self) -> None:
         """Test creating an empty board"""
         width, height = 5, 5
@@ -68,6 +146,51 @@ class TestGameFunctions(unittest.TestCase):
 
         self.assertEqual(danger_count, state.trap_count)
 
+    def test_initialize_game_seed(self) -> None:
+        """Test that seeded games are reproducible"""
+        first = initialize_game(20, 15, 0.2, seed=42)
+        second = initialize_game(20, 15, 0.2, seed=42)
+        other = initialize_game(20, 15, 0.2, seed=43)
+        from_rng = initialize_game(20, 15, 0.2, rng=random.Random(42))
+
+        self.assertEqual(first.seed, 42)
+        self.assertEqual(first.danger_positions, second.danger_positions)
+        self.assertEqual(first.hidden_board, second.hidden_board)
+        self.assertNotEqual(first.danger_positions, other.danger_positions)
+        self.assertEqual(len(from_rng.danger_positions), first.trap_count)
+        self.assertIsNone(from_rng.seed)
+        with self.assertRaises(ValueError):
+            initialize_game(20, 15, 0.2, seed=42, rng=random.Random(42))
+
+    def test_sample_trap_indices(self) -> None:
+        """Test sampling sparse and dense trap layouts"""
+        rng = random.Random(1)
+        for cell_count, trap_count in [(100, 3), (100, 50), (100, 99), (25, 24)]:
+            indices = sample_trap_indices(cell_count, trap_count, rng, exclude=7)
+            self.assertEqual(len(set(indices)), trap_count)
+            self.assertNotIn(7, indices)
+            self.assertTrue(all(0 <= index < cell_count for index in indices))
+
+    def test_safe_first_click(self) -> None:
+        """Test that the first scan never hits a trap"""
+        for seed in range(30):
+            state = initialize_game(5, 5, 0.9, seed=seed, safe_first_click=True)
+            self.assertFalse(state.traps_placed)
+            self.assertEqual(state.danger_positions, set())
+
+            first_click = Position((seed % 5, seed // 6))
+            new_state = scan_position(state, first_click)
+
+            self.assertTrue(new_state.traps_placed)
+            self.assertFalse(new_state.game_over)
+            self.assertNotIn(first_click, new_state.danger_positions)
+            self.assertEqual(len(new_state.danger_positions), state.trap_count)
+            # The layout follows from the seed and the first click
+            self.assertEqual(
+                scan_position(state, first_click).danger_positions,
+                new_state.danger_positions,
+            )
+
     def test_count_adjacent_dangers(self) -> None:
         """Test counting adjacent dangers"""
         # Create a test board with known danger positions
@@ -99,6 +222,76 @@ class TestGameFunctions(unittest.TestCase):
                     f"Position {pos} should have {expected} adjacent dangers",
                 )
 
+    def _reference_hidden_board(self, traps: Board) -> Board:
+        """Compute a hidden board cell by cell with count_adjacent_dangers"""
+        hidden = traps.copy()
+        for y in range(traps.height):
+            for x in range(traps.width):
+                if traps.get(x, y) != TRAP_CODE:
+                    hidden.set(
+                        x,
+                        y,
+                        count_adjacent_dangers(traps, traps.width, traps.height, x, y),
+                    )
+        return hidden
+
+    def _random_traps(self, width: int, height: int, seed: int) -> Board:
+        """Create a board holding randomly placed traps only"""
+        rng = random.Random(seed)
+        traps = Board.filled(width, height, EMPTY)
+        for index in rng.sample(range(width * height), width * height // 4):
+            traps.set(index % width, index // width, TRAP_CODE)
+        return traps
+
+    def test_compute_adjacent_counts_python(self) -> None:
+        """Test that the batched pure-Python path matches per-cell counting"""
+        for seed, (width, height) in enumerate([(5, 5), (7, 11), (23, 6)]):
+            traps = self._random_traps(width, height, seed)
+            self.assertEqual(
+                compute_adjacent_counts(traps, use_numpy=False),
+                self._reference_hidden_board(traps),
+            )
+
+    @unittest.skipIf(not load_numpy(), "NumPy is not installed")
+    def test_compute_adjacent_counts_numpy(self) -> None:
+        """Test that the NumPy path matches per-cell counting"""
+        for seed, (width, height) in enumerate([(5, 5), (7, 11), (23, 6)]):
+            traps = self._random_traps(width, height, seed)
+            self.assertEqual(
+                compute_adjacent_counts(traps, use_numpy=True),
+                self._reference_hidden_board(traps),
+            )
+
+    def test_lazy_hidden_board(self) -> None:
+        """Test that lazy games match eager games with the same seed"""
+        for seed in range(6):
+            safe_first_click = seed % 2 == 0
+            eager = initialize_game(
+                17, 11, 0.13, seed=seed, safe_first_click=safe_first_click
+            )
+            lazy = initialize_game(
+                17, 11, 0.13, seed=seed, safe_first_click=safe_first_click, lazy=True
+            )
+            rng = random.Random(seed)
+            while not eager.game_over and not eager.win:
+                pos = random_strategy(eager, rng)
+                eager, lazy = scan_position(eager, pos), scan_position(lazy, pos)
+                self.assertEqual(lazy.visible_board, eager.visible_board)
+                self.assertEqual(lazy.revealed_count, eager.revealed_count)
+                self.assertEqual(lazy.game_over, eager.game_over)
+            self.assertEqual(lazy.danger_positions, eager.danger_positions)
+            self.assertEqual(lazy.hidden_board, eager.hidden_board)
+
+    def test_lazy_hidden_board_computes_read_rows(self) -> None:
+        """Test that a lazy board only computes the rows scans read"""
+        state = initialize_game(200, 300, 0.3, seed=1, lazy=True)
+        hidden_board = state.hidden_board
+        assert isinstance(hidden_board, LazyHiddenBoard)
+        self.assertEqual(hidden_board.computed_rows, 0)
+
+        scan_position(state, Position((100, 150)))
+        self.assertLess(hidden_board.computed_rows, 10)
+
     def test_scan_position_safe(self) -> None:
         """Test scanning a safe position"""
         # Create a controlled game state
@@ -212,6 +405,109 @@ class TestGameFunctions(unittest.TestCase):
         )
         self.assertGreater(revealed_count, 1)
 
+    def test_auto_expand_matches_reference(self) -> None:
+        """Test the scanline fill against a cell-by-cell flood fill"""
+        for seed, (width, height) in enumerate([(9, 9), (31, 17), (40, 40)]):
+            traps = self._random_traps(width, height, seed)
+            for index in range(0, width * height, 3):
+                traps.set(index % width, index // width, EMPTY_CODE)
+            hidden_board = compute_adjacent_counts(traps)
+            state = GameState(
+                width=width,
+                height=height,
+                trap_count=traps.count(TRAP_CODE),
+                hidden_board=hidden_board,
+                visible_board=Board.filled(width, height, HIDDEN),
+                danger_positions=set(),
+            )
+
+            for y in range(height):
+                for x in range(width):
+                    if hidden_board.get(x, y) != EMPTY_CODE:
+                        continue
+                    expected = state.visible_board.copy()
+                    to_visit = [(x, y)]
+                    while to_visit:
+                        cx, cy = to_visit.pop()
+                        if expected.get(cx, cy) != HIDDEN_CODE:
+                            continue
+                        expected.set(cx, cy, hidden_board.get(cx, cy))
+                        if hidden_board.get(cx, cy) == EMPTY_CODE:
+                            to_visit.extend(
+                                (nx, ny)
+                                for nx in range(max(cx - 1, 0), min(cx + 2, width))
+                                for ny in range(max(cy - 1, 0), min(cy + 2, height))
+                            )
+
+                    expanded = auto_expand(state, x, y)
+                    self.assertEqual(expanded.visible_board, expected)
+                    self.assertEqual(
+                        expanded.revealed_count,
+                        state.revealed_count
+                        + state.visible_board.count(HIDDEN_CODE)
+                        - expected.count(HIDDEN_CODE),
+                    )
+                    state = expanded
+
+    def test_scan_positions_matches_fold(self) -> None:
+        """Test that batch scans equal folding scan_position over the moves"""
+        for seed in range(20):
+            random.seed(seed)
+            state = initialize_game(10, 8, 0.1)
+            rng = random.Random(seed)
+            moves = [
+                Position((rng.randint(-1, 10), rng.randint(-1, 8)))
+                for _ in range(rng.randint(1, 60))
+            ]
+
+            batch_state, outcomes = scan_positions(state, moves)
+
+            folded = state
+            for move in moves[: len(outcomes)]:
+                folded = scan_position(folded, move)
+
+            self.assertEqual(batch_state.visible_board, folded.visible_board)
+            self.assertEqual(batch_state.revealed_count, folded.revealed_count)
+            self.assertEqual(batch_state.game_over, folded.game_over)
+            self.assertEqual(batch_state.win, folded.win)
+            if batch_state.game_over:
+                self.assertEqual(outcomes[-1], OUTCOME_TRAP)
+            else:
+                self.assertEqual(len(outcomes), len(moves))
+
+    def test_scan_positions_outcomes(self) -> None:
+        """Test the per-move outcomes of a batch scan"""
+        width, height = 5, 5
+        hidden_board = Board.filled(width, height, CellContent("1"))
+        hidden_board.set(4, 4, TRAP_CODE)
+        state = GameState(
+            width=width,
+            height=height,
+            trap_count=1,
+            hidden_board=hidden_board,
+            visible_board=Board.filled(width, height, HIDDEN),
+            danger_positions={Position((4, 4))},
+        )
+
+        new_state, outcomes = scan_positions(
+            state,
+            [
+                Position((0, 0)),
+                Position((0, 0)),
+                Position((9, 9)),
+                Position((4, 4)),
+                Position((1, 1)),
+            ],
+        )
+
+        self.assertEqual(
+            outcomes,
+            [OUTCOME_SAFE, OUTCOME_REVEALED, OUTCOME_INVALID, OUTCOME_TRAP],
+        )
+        self.assertTrue(new_state.game_over)
+        self.assertEqual(new_state.visible_board.get(1, 1), HIDDEN_CODE)
+        self.assertEqual(state.visible_board.get(0, 0), HIDDEN_CODE)
+
     def test_is_win_condition(self) -> None:
         """Test win condition detection"""
         width, height = 3, 3
@@ -248,6 +544,43 @@ class TestGameFunctions(unittest.TestCase):
         # Now should be winning
         self.assertTrue(is_win_condition(new_state))
 
+    def test_revealed_counter(self) -> None:
+        """Test that scans keep the revealed counter in sync with the board"""
+        random.seed(7)
+        state = initialize_game(12, 9, 0.1)
+        self.assertEqual(state.revealed_count, 0)
+        self.assertEqual(state.remaining_safe, 12 * 9 - state.trap_count)
+
+        for y in range(state.height):
+            for x in range(state.width):
+                if Position((x, y)) in state.danger_positions:
+                    continue
+                state = scan_position(state, Position((x, y)))
+                # is_win_condition raises if the counter drifted
+                self.assertEqual(state.win, is_win_condition(state))
+
+        self.assertTrue(state.win)
+        self.assertEqual(state.remaining_safe, 0)
+
+    def test_remaining_safe_after_trap(self) -> None:
+        """Test that the trap ending the game is not counted as a safe cell"""
+        state = initialize_game(6, 6, 0.2, seed=2)
+        self.assertEqual(state.trap_count, 7)
+        trap = min(state.danger_positions)
+        state = scan_position(state, trap)
+
+        self.assertTrue(state.game_over)
+        self.assertEqual(state.revealed_count, 1)
+        self.assertEqual(state.remaining_safe, 29)
+
+    def test_revealed_counter_mismatch(self) -> None:
+        """Test that the consistency check detects a wrong counter"""
+        state = initialize_game(5, 5)
+        broken_state = state.with_updates(revealed_count=3)
+
+        with self.assertRaises(RuntimeError):
+            is_win_condition(broken_state)
+
     def test_render_board(self) -> None:
         """Test board rendering"""
         width, height = 3, 3
@@ -280,6 +613,1350 @@ class TestGameFunctions(unittest.TestCase):
         rendered = render_board(win_state)
         self.assertIn("CONGRATULATIONS", rendered)
 
+    def test_render_board_update(self) -> None:
+        """Test that incremental rendering only writes changed cells"""
+        width, height = 12, 12
+        hidden_board = Board.filled(width, height, CellContent("2"))
+        hidden_board.set(11, 11, TRAP_CODE)
+        state = GameState(
+            width=width,
+            height=height,
+            trap_count=1,
+            hidden_board=hidden_board,
+            visible_board=Board.filled(width, height, HIDDEN),
+            danger_positions={Position((11, 11))},
+        )
+
+        self.assertEqual(render_board_update(state, state, top=4), "")
+
+        new_state, _ = scan_positions(
+            state, [Position((3, 1)), Position((4, 1)), Position((0, 10))]
+        )
+        update = render_board_update(state, new_state, top=4)
+
+        # Adjacent changes share one cursor move; row labels are padded
+        self.assertEqual(
+            update, move_cursor(7, 12) + "2 2" + move_cursor(16, 6) + "2"
+        )
+
+    def test_render_board_viewport(self) -> None:
+        """Test rendering only a window of a large board"""
+        width, height = 40, 30
+        hidden_board = Board.filled(width, height, CellContent("3"))
+        hidden_board.set(0, 0, TRAP_CODE)
+        state = GameState(
+            width=width,
+            height=height,
+            trap_count=1,
+            hidden_board=hidden_board,
+            visible_board=Board.filled(width, height, HIDDEN),
+            danger_positions={Position((0, 0))},
+        )
+        state = scan_position(state, Position((21, 12)))
+
+        viewport = viewport_around(state, Position((21, 12)), 4, 3)
+        self.assertEqual(viewport, Viewport(19, 11, 4, 3))
+
+        rendered = render_board(state, viewport)
+        self.assertEqual(
+            rendered.splitlines(),
+            [
+                "       20  22",
+                "    -------",
+                "11 | # # # # |",
+                "12 | # # 3 # |",
+                "13 | # # # # |",
+                "    -------",
+            ],
+        )
+
+        # Changes outside the viewport are not drawn
+        new_state = scan_position(state, Position((0, 29)))
+        self.assertEqual(render_board_update(state, new_state, 1, viewport), "")
+        new_state = scan_position(state, Position((20, 13)))
+        self.assertEqual(
+            render_board_update(state, new_state, 1, viewport),
+            move_cursor(5, 8) + "3",
+        )
+
+    def test_render_board_alignment(self) -> None:
+        """Test that labels line up with the cells on a scrolled viewport"""
+        state = initialize_game(200, 200)
+        viewport = Viewport(97, 95, 8, 6)
+        lines = render_board(state, viewport).splitlines()
+
+        self.assertEqual(lines[0], "        98  100 102 104")
+        self.assertEqual(lines[2][:6], " 95 | ")
+        self.assertEqual(lines[7][:6], "100 | ")
+        self.assertEqual({len(line) for line in lines[2:8]}, {6 + 2 * 8 + 1})
+
+        # Each label starts above the cell of its column
+        for column in (98, 100, 102, 104):
+            _, screen_column = cell_screen_position(
+                state, viewport, Position((column, 100))
+            )
+            start = screen_column - 1
+            self.assertEqual(lines[0][start : start + 3].strip(), str(column))
+            self.assertEqual(lines[7][start], "#")
+
+    def test_viewport_clamping(self) -> None:
+        """Test that viewports stay on the board"""
+        state = initialize_game(10, 8)
+
+        self.assertEqual(
+            viewport_around(state, Position((0, 0)), 4, 4), Viewport(0, 0, 4, 4)
+        )
+        self.assertEqual(
+            viewport_around(state, Position((9, 7)), 4, 4), Viewport(6, 4, 4, 4)
+        )
+        self.assertEqual(
+            viewport_around(state, Position((5, 5)), 50, 50), Viewport(0, 0, 10, 8)
+        )
+        self.assertEqual(
+            move_viewport(state, Viewport(6, 4, 4, 4), 3, -2), Viewport(6, 2, 4, 4)
+        )
+
+
+class TestInput(unittest.TestCase):
+    """Test the key parsing and the selection of the single-key front end"""
+
+    def test_key_parser(self) -> None:
+        """Test parsing a scripted input stream fed in arbitrary chunks"""
+        script = "k\033[Bx\033OC \033[1;5Dq\033[H\rU"
+        expected = [KEY_UP, KEY_DOWN, KEY_RIGHT, KEY_SCAN, KEY_QUIT, KEY_SCAN, KEY_UNDO]
+
+        for size in (1, 2, 3, len(script)):
+            parser = KeyParser()
+            keys = []
+            for start in range(0, len(script), size):
+                keys.extend(parser.feed(script[start : start + size]))
+            self.assertEqual(keys, expected, size)
+            self.assertEqual(parser.pending, "")
+
+    def test_key_parser_escape(self) -> None:
+        """Test that a lone escape waits for more input before it quits"""
+        parser = KeyParser()
+        self.assertEqual(parser.feed("a\033"), [KEY_LEFT])
+        self.assertEqual(parser.pending, "\033")
+        self.assertEqual(parser.flush(), [KEY_QUIT])
+        self.assertEqual(parser.flush(), [])
+        self.assertEqual(parser.feed("\033["), [])
+        self.assertEqual(parser.feed("A"), [KEY_UP])
+
+    def test_move_selection(self) -> None:
+        """Test that the selection stops at the edges and the viewport follows"""
+        state = initialize_game(10, 8)
+        self.assertEqual(move_selection(state, Position((0, 0)), KEY_LEFT), (0, 0))
+        self.assertEqual(move_selection(state, Position((9, 7)), KEY_DOWN), (9, 7))
+        self.assertEqual(move_selection(state, Position((4, 4)), KEY_RIGHT), (5, 4))
+
+        viewport = Viewport(2, 2, 4, 4)
+        self.assertEqual(scroll_to(state, viewport, Position((3, 3))), viewport)
+        self.assertEqual(
+            scroll_to(state, viewport, Position((7, 1))), Viewport(4, 1, 4, 4)
+        )
+        self.assertEqual(
+            cell_screen_position(state, viewport, Position((3, 3))), (7, 7)
+        )
+
+    def test_frontend(self) -> None:
+        """Test playing a game by feeding keys to the front end"""
+        state = initialize_game(10, 8, seed=3)
+        frontend = Frontend(state)
+        self.assertIn("=== ABANDONED SPACE STATION ===", frontend.frame())
+        self.assertFalse(frontend.dirty)
+
+        # Move to a corner, scan it and undo the scan
+        frontend.handle_input("\033[D" * 9 + "\033[A" * 9)
+        self.assertEqual(frontend.selection, (0, 0))
+        frontend.handle_input(" ")
+        expected = scan_position(state, Position((0, 0)))
+        self.assertEqual(frontend.state.visible_board, expected.visible_board)
+        self.assertTrue(frontend.dirty)
+        update = frontend.frame()
+        self.assertNotIn("ABANDONED", update)
+        self.assertTrue(update.endswith(move_cursor(6, 5)))
+        frontend.handle_input("u")
+        undone = frontend.state
+        self.assertEqual(undone.visible_board, state.visible_board)
+        self.assertEqual(undone.revealed_count, 0)
+
+        # Keys after quitting are ignored
+        frontend.handle_input("q ")
+        self.assertTrue(frontend.done)
+        self.assertIs(frontend.state, undone)
+
+
+class TestBoard(unittest.TestCase):
+    """Test cases for the compact board representation"""
+
+    def test_round_trip_lists(self) -> None:
+        """Test packing and unpacking a list-of-lists board"""
+        board = [
+            [EMPTY, CellContent("1"), TRAP],
+            [HIDDEN, CellContent("8"), EMPTY],
+        ]
+        packed = Board.from_lists(board)
+
+        self.assertEqual(packed.width, 3)
+        self.assertEqual(packed.height, 2)
+        self.assertEqual(packed.get(2, 0), TRAP_CODE)
+        self.assertEqual(packed.get(0, 1), HIDDEN_CODE)
+        self.assertEqual(packed.to_lists(), board)
+        self.assertEqual(packed, board)
+
+    def test_list_view(self) -> None:
+        """Test the list-of-lists view of a compact board"""
+        board = Board.filled(4, 3, HIDDEN)
+        board.set(1, 2, TRAP_CODE)
+
+        self.assertEqual(len(board), 3)
+        self.assertEqual(len(board[0]), 4)
+        self.assertEqual(board[2][1], TRAP)
+        self.assertEqual(board[2][:], [HIDDEN, TRAP, HIDDEN, HIDDEN])
+        self.assertEqual(board[2].count(HIDDEN), 3)
+        self.assertEqual(board.row_text(2), "#X##")
+
+    def test_copy_is_independent(self) -> None:
+        """Test that copies do not share cell storage"""
+        board = Board.filled(5, 5, HIDDEN)
+        copy = board.copy()
+        copy.set(0, 0, TRAP_CODE)
+
+        self.assertEqual(board.get(0, 0), HIDDEN_CODE)
+        self.assertEqual(copy.get(0, 0), TRAP_CODE)
+
+    def test_copy_on_write_rows(self) -> None:
+        """Test that copies share rows until a row is written"""
+        board = Board.filled(5, 5, HIDDEN)
+        copy = board.copy()
+        copy.set(2, 3, TRAP_CODE)
+
+        for y in range(5):
+            if y == 3:
+                self.assertIsNot(copy.rows[y], board.rows[y])
+            else:
+                self.assertIs(copy.rows[y], board.rows[y])
+
+        # Writing the original must not leak into the copy either
+        board.set(0, 0, TRAP_CODE)
+        self.assertEqual(copy.get(0, 0), HIDDEN_CODE)
+
+    def test_scan_shares_untouched_rows(self) -> None:
+        """Test that a move only copies the rows it changes"""
+        width, height = 20, 20
+        hidden_board = Board.filled(width, height, CellContent("1"))
+        hidden_board.set(0, 0, TRAP_CODE)
+        state = GameState(
+            width=width,
+            height=height,
+            trap_count=1,
+            hidden_board=hidden_board,
+            visible_board=Board.filled(width, height, HIDDEN),
+            danger_positions={Position((0, 0))},
+        )
+
+        new_state = scan_position(state, Position((5, 7)))
+
+        self.assertEqual(state.visible_board.get(5, 7), HIDDEN_CODE)
+        self.assertEqual(new_state.visible_board[7][5], CellContent("1"))
+        shared = sum(
+            new_row is old_row
+            for new_row, old_row in zip(
+                new_state.visible_board.rows, state.visible_board.rows
+            )
+        )
+        self.assertEqual(shared, height - 1)
+
+    def test_memory_savings(self) -> None:
+        """Test that the compact board is smaller than nested lists"""
+        width, height = 100, 100
+        lists = create_empty_board(width, height, HIDDEN)
+        board = Board.filled(width, height, HIDDEN)
+
+        self.assertLess(board.nbytes * 5, list_board_nbytes(lists))
+
+    def test_game_state_accepts_lists(self) -> None:
+        """Test that game states pack list-of-lists boards"""
+        width, height = 3, 3
+        state = GameState(
+            width=width,
+            height=height,
+            trap_count=0,
+            hidden_board=cast(HiddenBoard, create_empty_board(width, height, EMPTY)),
+            visible_board=cast(GameBoard, create_empty_board(width, height, HIDDEN)),
+            danger_positions=set(),
+        )
+
+        self.assertIsInstance(state.hidden_board, Board)
+        self.assertIsInstance(state.visible_board, Board)
+        self.assertEqual(state.visible_board[1][1], HIDDEN)
+
+
+class TestGameState(unittest.TestCase):
+    """Test cases for the immutable game state record"""
+
+    def test_immutable(self) -> None:
+        """Test that states have no instance dict and reject assignments"""
+        state = initialize_game(5, 5, seed=1)
+
+        self.assertFalse(hasattr(state, "__dict__"))
+        with self.assertRaises(AttributeError):
+            state.win = True  # type: ignore[misc]
+
+    def test_identity_semantics(self) -> None:
+        """Test that states compare and hash by identity, not as tuples"""
+        state = initialize_game(5, 5, seed=1)
+        same = state.with_updates()
+
+        self.assertNotEqual(state, same)
+        self.assertEqual(len({state, same, state}), 2)
+        self.assertTrue(state)
+        with self.assertRaises(TypeError):
+            len(state)
+        with self.assertRaises(TypeError):
+            _ = state[0]
+        with self.assertRaises(TypeError):
+            _, *_ = state
+        with self.assertRaises(TypeError):
+            _ = state < same
+        restored = pickle.loads(pickle.dumps(state))
+        self.assertEqual(restored.visible_board, state.visible_board)
+        self.assertEqual(state._asdict()["seed"], 1)
+
+    def test_with_updates_keeps_fields(self) -> None:
+        """Test that updates keep every field that is not given"""
+        state = initialize_game(5, 5, seed=1).with_updates(game_over=True)
+        new_state = state.with_updates(revealed_count=3)
+
+        self.assertTrue(new_state.game_over)
+        self.assertFalse(new_state.win)
+        self.assertEqual(new_state.seed, 1)
+        self.assertIs(new_state.visible_board, state.visible_board)
+        self.assertEqual(new_state.revealed_count, 3)
+        self.assertEqual(state.revealed_count, 0)
+
+    def test_with_updates_rejects_unknown_fields(self) -> None:
+        """Test that misspelled field names are not silently ignored"""
+        state = initialize_game(5, 5, seed=1)
+        with self.assertRaises(TypeError):
+            state.with_updates(game_ovre=True)
+        with self.assertRaises(TypeError):
+            state.with_updates(visible_board=None)
+
+    def test_replace_packs_and_recounts(self) -> None:
+        """Test that _replace goes through with_updates"""
+        state = initialize_game(5, 5, seed=1)
+        visible_board = [[EMPTY] * 5 for _ in range(5)]
+        new_state = state._replace(visible_board=visible_board)
+
+        self.assertIsInstance(new_state.visible_board, Board)
+        self.assertEqual(new_state.revealed_count, 25)
+        with self.assertRaises(TypeError):
+            state._replace(game_ovre=True)
+
+    def test_allocation_per_update(self) -> None:
+        """Benchmark the memory allocated for each derived state"""
+        state = initialize_game(8, 8, seed=1)
+        states: List[GameState] = [state] * 1000
+
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            for index in range(len(states)):
+                states[index] = state.with_updates(game_over=False)
+            after, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # A derived state allocates its fields tuple and nothing else
+        self.assertLessEqual((after - before) / len(states), sys.getsizeof(state) + 16)
+
+
+class TestBench(unittest.TestCase):
+    """Test cases for the benchmark harness"""
+
+    def test_run_benchmarks(self) -> None:
+        """Test that a small sweep reports every operation as JSON"""
+        report = run_benchmarks(
+            sizes=[(6, 5)], trap_percentages=[0.1, 0.3], seed=3, min_seconds=0.0
+        )
+        results = json.loads(json.dumps(report))["results"]
+
+        self.assertEqual(len(results), 14)
+        self.assertEqual(
+            {result["operation"] for result in results},
+            {
+                "initialize_game",
+                "initialize_game_lazy",
+                "count_adjacent_dangers",
+                "scan_position",
+                "auto_expand",
+                "is_win_condition",
+                "render_board",
+            },
+        )
+        for result in results:
+            if "skipped" in result:
+                # The dense board has no empty cell to expand from
+                self.assertEqual(result["operation"], "auto_expand")
+                self.assertEqual(result["trap_percentage"], 0.3)
+                self.assertIsNone(result["ops_per_sec"])
+                continue
+            self.assertGreater(result["ops_per_sec"], 0)
+            self.assertGreaterEqual(result["peak_memory_bytes"], 0)
+
+
+class TestSimulate(unittest.TestCase):
+    """Test cases for the multi-game simulation runner"""
+
+    def test_play_game(self) -> None:
+        """Test that a simulated game runs to the end"""
+        config = SimulationConfig(8, 8, 0.15)
+        result = play_game(config, seed=5, strategy=random_strategy)
+
+        self.assertGreater(result.moves, 0)
+        self.assertGreater(result.cells_revealed, 0)
+        self.assertEqual(result, play_game(config, seed=5, strategy=random_strategy))
+
+    def test_simulate_independent_of_workers(self) -> None:
+        """Test that pooled results match a single-process run"""
+        configs = [SimulationConfig(6, 6, 0.1), SimulationConfig(8, 5, 0.2, False)]
+
+        serial = simulate(configs, games_per_config=30, seed=11, workers=1)
+        pooled = simulate(configs, games_per_config=30, seed=11, workers=2)
+
+        self.assertEqual(serial, pooled)
+        self.assertEqual([stats.config for stats in pooled], configs)
+        for stats in pooled:
+            self.assertEqual(stats.games, 30)
+            self.assertTrue(0.0 <= stats.win_rate <= 1.0)
+            self.assertGreaterEqual(stats.mean_moves, 1.0)
+
+
+class TestSolver(unittest.TestCase):
+    """Test cases for the constraint solver"""
+
+    def _state_from_rows(self, visible: List[str], trap_count: int) -> GameState:
+        """Create a state whose visible board is given as text rows"""
+        board = [[CellContent(cell) for cell in row] for row in visible]
+        return GameState(
+            width=len(board[0]),
+            height=len(board),
+            trap_count=trap_count,
+            hidden_board=cast(HiddenBoard, board),
+            visible_board=cast(GameBoard, board),
+            danger_positions=set(),
+        )
+
+    def test_single_cell_rules(self) -> None:
+        """Test deductions from single constraints"""
+        state = self._state_from_rows(["#1#", "11#"], trap_count=1)
+
+        safe, traps = deduce(state)
+
+        # (0, 1) only touches (0, 0), which satisfies the 1 at (1, 0)
+        self.assertEqual(traps, {Position((0, 0))})
+        self.assertEqual(safe, {Position((2, 0)), Position((2, 1))})
+
+    def test_subset_rule(self) -> None:
+        """Test a 1-1-2-1 pattern that single constraints cannot solve"""
+        state = self._state_from_rows(["####", "1121"], trap_count=2)
+
+        safe, traps = deduce(state)
+
+        self.assertEqual(traps, {Position((1, 0)), Position((3, 0))})
+        self.assertEqual(safe, {Position((0, 0)), Position((2, 0))})
+
+    def test_deductions_are_correct(self) -> None:
+        """Test that deductions never contradict the hidden board"""
+        for seed in range(15):
+            state = initialize_game(16, 16, 0.15, seed=seed, safe_first_click=True)
+            solver = Solver(state.width, state.height, state.trap_count)
+            rng = random.Random(seed)
+
+            while not state.game_over and not state.win:
+                state = scan_position(state, solver.next_move(state, rng))
+                solver.update(state)
+                solver.deduce()
+                for position in solver.trap_positions():
+                    self.assertIn(position, state.danger_positions)
+                for position in solver.safe_positions():
+                    self.assertNotIn(position, state.danger_positions)
+
+    def test_incremental_matches_fresh_solver(self) -> None:
+        """Test that the incremental frontier equals one built from scratch"""
+        state = initialize_game(20, 12, 0.12, seed=4, safe_first_click=True)
+        solver = Solver(state.width, state.height, state.trap_count)
+        rng = random.Random(4)
+
+        for _ in range(10):
+            if state.game_over or state.win:
+                break
+            state = scan_position(state, solver.next_move(state, rng))
+            solver.update(state)
+            solver.deduce(exhaustive=True)
+            fresh = Solver.for_state(state)
+            fresh.deduce(exhaustive=True)
+            self.assertEqual(solver.frontier, fresh.frontier)
+            self.assertLessEqual(fresh.traps, solver.traps)
+
+    def test_update_after_undo(self) -> None:
+        """Test that cells hidden again by an undo reset the deductions"""
+        state = initialize_game(16, 16, 0.15, seed=5, safe_first_click=True)
+        journal = Journal(state)
+        solver = Solver(state.width, state.height, state.trap_count)
+        rng = random.Random(5)
+        for _ in range(6):
+            if state.game_over or state.win:
+                break
+            state = journal.record(solver.next_move(state, rng))
+
+        for _ in range(3):
+            state = journal.undo()
+            solver.update(state)
+            solver.deduce(exhaustive=True)
+            fresh = Solver.for_state(state)
+            fresh.deduce(exhaustive=True)
+            self.assertEqual(solver.frontier, fresh.frontier)
+            self.assertEqual(solver.traps, fresh.traps)
+            self.assertEqual(solver.revealed_count, state.revealed_count)
+            for index in solver.frontier:
+                y, x = divmod(index, state.width)
+                self.assertNotEqual(state.visible_board.get(x, y), HIDDEN_CODE)
+
+    def test_solver_strategy_beats_random(self) -> None:
+        """Test that the solver wins more simulated games than random scans"""
+        configs = [SimulationConfig(8, 8, 0.12)]
+
+        solver_stats = simulate(configs, 40, seed=2, workers=1, strategy_name="solver")
+        random_stats = simulate(configs, 40, seed=2, workers=1, strategy_name="random")
+
+        self.assertGreater(solver_stats[0].win_rate, random_stats[0].win_rate)
+
+    def test_solver_strategy_small_config(self) -> None:
+        """Test the solver on configs that initialize_game enlarges to 5x5"""
+        configs = [SimulationConfig(4, 4, 0.15)]
+        stats = simulate(configs, 5, workers=1, strategy_name="solver")
+        self.assertEqual(stats[0].games, 5)
+
+
+class TestNoGuess(unittest.TestCase):
+    """Test the generator of boards that can be cleared without guessing"""
+
+    def test_boards_need_no_guess(self) -> None:
+        """Test that a fresh deducer clears every generated board"""
+        click = Position((15, 8))
+        for seed in range(200):
+            state = initialize_game(30, 16, 0.2, seed=seed, no_guess=True)
+            traps = [y * 30 + x for x, y in state.danger_positions]
+            self.assertTrue(is_no_guess(30, 16, traps, click), f"Seed {seed}")
+
+    def test_repaired_boards_need_no_guess(self) -> None:
+        """Test that the exact probabilities always show a safe cell"""
+        # Repairs on these seeds used to invalidate earlier deductions
+        for seed in (13, 45, 113, 164, 171):
+            state = initialize_game(30, 16, 0.2, seed=seed, no_guess=True)
+            state = scan_position(state, Position((15, 8)))
+            self.assertEqual(state.hidden_board.get(15, 8), EMPTY_CODE)
+            while not state.win:
+                probabilities = trap_probabilities(state)
+                safe = [pos for pos, p in probabilities.frontier.items() if p == 0]
+                if probabilities.interior == 0:
+                    safe.extend(
+                        Position((x, y))
+                        for y in range(state.height)
+                        for x in range(state.width)
+                        if state.visible_board.get(x, y) == HIDDEN_CODE
+                        and Position((x, y)) not in probabilities.frontier
+                    )
+                self.assertTrue(safe, f"Seed {seed} needs a guess")
+                state, _ = scan_positions(state, safe)
+                self.assertFalse(state.game_over)
+
+    def test_seed_and_first_click(self) -> None:
+        """Test that no-guess games are reproducible and open at the click"""
+        click = Position((3, 4))
+        first = initialize_game(30, 16, 0.2, seed=5, no_guess=True, first_click=click)
+        second = initialize_game(30, 16, 0.2, seed=5, no_guess=True, first_click=click)
+        self.assertEqual(first.danger_positions, second.danger_positions)
+        self.assertEqual(len(first.danger_positions), 96)
+        self.assertEqual(first.hidden_board.get(3, 4), EMPTY_CODE)
+        traps = [y * 30 + x for x, y in first.danger_positions]
+        self.assertTrue(is_no_guess(30, 16, traps, click))
+        with self.assertRaises(ValueError):
+            initialize_game(no_guess=True, safe_first_click=True)
+
+    def test_first_click_outside_board(self) -> None:
+        """Test that first clicks outside the board are rejected"""
+        for click in ((20, 5), (-1, 2), (4, 30)):
+            with self.assertRaises(ValueError):
+                initialize_game(
+                    10, 8, seed=1, no_guess=True, first_click=Position(click)
+                )
+            with self.assertRaises(ValueError):
+                initialize_game(10, 8, seed=1, first_click=Position(click))
+            with self.assertRaises(ValueError):
+                protected_cells(10, 8, Position(click))
+
+        # Checked against the board after it is grown to the minimum size
+        state = initialize_game(
+            3, 3, seed=1, no_guess=True, first_click=Position((4, 4))
+        )
+        self.assertEqual(state.hidden_board.get(4, 4), EMPTY_CODE)
+
+    def test_deducer_stops_at_guess(self) -> None:
+        """Test that a board with a 50/50 is not solved and can be repaired"""
+        # The traps at (0, 0) and (0, 3) cannot be told apart from the cells
+        # below them: each pair is a 50/50
+        self.assertFalse(is_no_guess(5, 5, [0, 15], Position((2, 2))))
+
+        deducer = Deducer(5, 5, [0, 15])
+        deducer.reveal(12)
+        self.assertFalse(deducer.solve())
+        rng = random.Random(0)
+        for _ in range(10):
+            self.assertTrue(deducer.repair(rng))
+            if deducer.solve():
+                break
+        self.assertTrue(deducer.solved)
+        # The counters match a deducer created for the repaired traps
+        fresh = Deducer(5, 5, deducer.trap_indices())
+        self.assertEqual(deducer.codes, fresh.codes)
+        for index in range(25):
+            if deducer.codes[index] != TRAP_CODE:
+                flagged = sum(
+                    deducer.status[n] == FLAGGED
+                    for n in neighbor_table(5, 5).neighbors(index)
+                )
+                self.assertEqual(
+                    deducer.remaining[index], deducer.codes[index] - flagged
+                )
+
+    def test_dense_boards(self) -> None:
+        """Test generating a dense board and rejecting impossible counts"""
+        rng = random.Random(1)
+        traps = no_guess_trap_indices(16, 16, 64, rng, Position((0, 0)))
+        self.assertEqual(len(set(traps)), 64)
+        self.assertTrue(is_no_guess(16, 16, traps, Position((0, 0))))
+        with self.assertRaises(ValueError):
+            no_guess_trap_indices(5, 5, 25, rng, Position((0, 0)))
+
+
+class TestSaveGame(unittest.TestCase):
+    """Test cases for the binary save format"""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "game.sav")
+
+    def _round_trip(self, state: GameState) -> GameState:
+        save_game(state, self.path)
+        return load_game(self.path)
+
+    def test_round_trip(self) -> None:
+        """Test that a saved game loads back into an equal state"""
+        state = initialize_game(23, 17, 0.1, seed=5)
+        for pos in [(0, 0), (11, 8), (22, 16)]:
+            state = scan_position(state, Position(pos))
+        loaded = self._round_trip(state)
+
+        for name in ("width", "height", "trap_count", "revealed_count", "seed"):
+            self.assertEqual(getattr(loaded, name), getattr(state, name), name)
+        self.assertEqual(loaded.danger_positions, state.danger_positions)
+        self.assertEqual(loaded.hidden_board, state.hidden_board)
+        self.assertEqual(loaded.visible_board, state.visible_board)
+        self.assertEqual(
+            (loaded.traps_placed, loaded.game_over, loaded.win),
+            (state.traps_placed, state.game_over, state.win),
+        )
+
+        # Playing on from the loaded state matches playing on from the original
+        pos = next(
+            Position((x, y))
+            for y in range(state.height)
+            for x in range(state.width)
+            if state.visible_board.get(x, y) == HIDDEN_CODE
+        )
+        self.assertEqual(
+            scan_position(loaded, pos).visible_board,
+            scan_position(state, pos).visible_board,
+        )
+
+    def test_round_trip_flags(self) -> None:
+        """Test that unplaced traps and finished games survive a round trip"""
+        state = initialize_game(6, 6, 0.2, seed=9, safe_first_click=True)
+        loaded = self._round_trip(state)
+        self.assertFalse(loaded.traps_placed)
+        self.assertEqual(len(loaded.danger_positions), 0)
+
+        # The seed places the same traps after loading
+        pos = Position((2, 3))
+        self.assertEqual(
+            scan_position(loaded, pos).danger_positions,
+            scan_position(state, pos).danger_positions,
+        )
+
+        trap = next(iter(scan_position(state, pos).danger_positions))
+        lost = scan_position(scan_position(state, pos), trap)
+        loaded = self._round_trip(lost)
+        self.assertTrue(loaded.game_over)
+        self.assertFalse(loaded.win)
+        self.assertEqual(loaded.visible_board.get(*trap), TRAP_CODE)
+
+    def test_compact_and_lazy(self) -> None:
+        """Test the file size and that loading does not build the boards"""
+        width, height = 300, 200
+        state = initialize_game(width, height, 0.15, seed=1)
+        save_game(state, self.path)
+
+        self.assertEqual(
+            os.path.getsize(self.path), HEADER.size + 2 * ((width * height + 7) // 8)
+        )
+        loaded = load_game(self.path)
+        self.assertIsInstance(loaded.danger_positions, TrapBitset)
+        assert isinstance(loaded.hidden_board, LazyHiddenBoard)
+        assert isinstance(loaded.visible_board, LazyBoard)
+        self.assertEqual(loaded.hidden_board.computed_rows, 0)
+        self.assertFalse(loaded.visible_board.loaded)
+        self.assertEqual(len(loaded.danger_positions), state.trap_count)
+        self.assertEqual(loaded.visible_board.get(0, 0), HIDDEN_CODE)
+
+    def test_trap_bitset(self) -> None:
+        """Test the set interface of packed trap positions"""
+        positions = {Position((0, 0)), Position((6, 1)), Position((4, 2))}
+        bitset = TrapBitset.from_positions(7, 3, positions)
+
+        self.assertEqual(bitset, positions)
+        self.assertEqual(len(bitset), 3)
+        self.assertIn(Position((6, 1)), bitset)
+        self.assertNotIn(Position((5, 1)), bitset)
+        self.assertNotIn(Position((7, 0)), bitset)
+        self.assertEqual(sorted(bitset), sorted(positions))
+
+    def test_rejects_invalid_files(self) -> None:
+        """Test that truncated or foreign files are rejected"""
+        save_game(initialize_game(5, 5, seed=1), self.path)
+        with open(self.path, "rb") as file:
+            data = file.read()
+
+        for corrupt in (b"NOPE" + data[4:], data[:-1]):
+            with open(self.path, "wb") as file:
+                file.write(corrupt)
+            with self.assertRaises(ValueError):
+                load_game(self.path)
+
+
+class TestJournal(unittest.TestCase):
+    """Test cases for the move journal"""
+
+    def _play(self, journal: Journal, seed: int) -> List[GameState]:
+        """Play a random game through the journal and return every state"""
+        rng = random.Random(seed)
+        states = [journal.state]
+        while not journal.state.game_over and not journal.state.win:
+            states.append(journal.record(random_strategy(journal.state, rng)))
+        return states
+
+    def _assert_same_state(self, state: GameState, expected: GameState) -> None:
+        """Assert that two states show the same game"""
+        self.assertEqual(state.visible_board, expected.visible_board)
+        self.assertEqual(state.revealed_count, expected.revealed_count)
+        self.assertEqual(state.danger_positions, expected.danger_positions)
+        self.assertEqual(
+            (state.traps_placed, state.game_over, state.win),
+            (expected.traps_placed, expected.game_over, expected.win),
+        )
+
+    def test_undo_redo(self) -> None:
+        """Test that undo and redo step through the recorded states"""
+        journal = Journal(initialize_game(12, 9, 0.12, seed=3, safe_first_click=True))
+        states = self._play(journal, 3)
+
+        for expected in reversed(states[:-1]):
+            self._assert_same_state(journal.undo(), expected)
+        self.assertFalse(journal.can_undo())
+        for expected in states[1:]:
+            self._assert_same_state(journal.redo(), expected)
+        self.assertFalse(journal.can_redo())
+
+    def test_diffs_hold_changed_cells_only(self) -> None:
+        """Test that the journal stores one revealed cell per changed cell"""
+        journal = Journal(initialize_game(30, 30, 0.1, seed=5))
+        states = self._play(journal, 5)
+
+        self.assertEqual(
+            sum(len(diff.cells) for diff in journal.diffs), states[-1].revealed_count
+        )
+
+    def test_seek_from_checkpoints(self) -> None:
+        """Test jumping to arbitrary moves with few checkpoints"""
+        journal = Journal(
+            initialize_game(12, 9, 0.12, seed=8),
+            checkpoint_interval=2,
+            max_checkpoints=3,
+        )
+        states = self._play(journal, 8)
+        self.assertLessEqual(len(journal.checkpoints), 3)
+
+        rng = random.Random(8)
+        for _ in range(20):
+            cursor = rng.randrange(len(states))
+            self._assert_same_state(journal.seek(cursor), states[cursor])
+
+    def test_record_discards_redo(self) -> None:
+        """Test that a new move after undo replaces the undone moves"""
+        journal = Journal(initialize_game(10, 10, 0.1, seed=2, safe_first_click=True))
+        journal.record(Position((0, 0)))
+        journal.record(Position((9, 9)))
+        journal.undo()
+        journal.record(Position((9, 0)))
+
+        self.assertFalse(journal.can_redo())
+        self.assertEqual(journal.moves, [(0, 0), (9, 0)])
+
+    def test_replay(self) -> None:
+        """Test that replaying the moves of a seeded game reproduces it"""
+        journal = Journal(initialize_game(12, 9, 0.12, seed=6, safe_first_click=True))
+        self._play(journal, 6)
+
+        replayed = replay(6, journal.moves, 12, 9, 0.12, safe_first_click=True)
+        self._assert_same_state(replayed.state, journal.state)
+
+
+class TestChunkedBoard(unittest.TestCase):
+    """Test cases for unbounded chunked maps"""
+
+    def setUp(self) -> None:
+        set_consistency_checks(True)
+
+    def tearDown(self) -> None:
+        set_consistency_checks(False)
+
+    def _games(
+        self, size: int, seed: int, store: ChunkStore
+    ) -> Tuple[GameState, GameState]:
+        """A chunked game and the same game on dense boards"""
+        hidden_board = ChunkedHiddenBoard(seed, 0.15, size=size)
+        chunked = GameState(
+            width=size,
+            height=size,
+            trap_count=hidden_board.traps_per_chunk * (size // 64) ** 2,
+            hidden_board=hidden_board,
+            visible_board=ChunkedBoard(store, size=size),
+            danger_positions=ChunkedTraps(hidden_board),
+            revealed_count=0,
+        )
+        dense_hidden = Board(
+            size, size, [bytearray(hidden_board.row_codes(y)) for y in range(size)]
+        )
+        dense = GameState(
+            width=size,
+            height=size,
+            trap_count=chunked.trap_count,
+            hidden_board=dense_hidden,
+            visible_board=Board.filled(size, size, HIDDEN),
+            danger_positions=set(chunked.danger_positions),
+        )
+        return chunked, dense
+
+    def test_hidden_chunks_match_dense_counts(self) -> None:
+        """Test that adjacency counts are correct across chunk edges"""
+        chunked, dense = self._games(192, 1, ChunkStore())
+        cells = dense.hidden_board.cells
+        traps = Board.from_cells(
+            192, 192, bytes(TRAP_CODE if code == TRAP_CODE else 0 for code in cells)
+        )
+        self.assertEqual(compute_adjacent_counts(traps), dense.hidden_board)
+        self.assertEqual(len(dense.danger_positions), chunked.trap_count)
+
+    def test_scans_match_dense_board(self) -> None:
+        """Test that scans and expansions reveal the same cells on both backends"""
+        chunked, dense = self._games(192, 2, ChunkStore())
+        rng = random.Random(2)
+        for _ in range(30):
+            pos = Position((rng.randrange(192), rng.randrange(192)))
+            if pos in dense.danger_positions:
+                continue
+            chunked, dense = scan_position(chunked, pos), scan_position(dense, pos)
+            self.assertEqual(chunked.revealed_count, dense.revealed_count)
+        for y in range(192):
+            self.assertEqual(
+                chunked.visible_board.row_codes(y), dense.visible_board.row_codes(y)
+            )
+
+    def test_eviction_to_disk(self) -> None:
+        """Test that evicted chunks are read back unchanged"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        evicting, dense = self._games(512, 3, ChunkStore(directory.name, 4))
+        in_memory, _ = self._games(512, 3, ChunkStore())
+
+        rng = random.Random(3)
+        for _ in range(60):
+            pos = Position((rng.randrange(512), rng.randrange(512)))
+            if pos in dense.danger_positions:
+                continue
+            evicting = scan_position(evicting, pos)
+            in_memory = scan_position(in_memory, pos)
+
+        visible_board = evicting.visible_board
+        assert isinstance(visible_board, ChunkedBoard)
+        self.assertLessEqual(visible_board.resident_chunks, 4)
+        self.assertTrue(os.listdir(directory.name))
+        self.assertEqual(visible_board, in_memory.visible_board)
+
+    def test_chunk_files_reused_and_deleted(self) -> None:
+        """Test that unchanged chunks keep their file and dropped ones go away"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        board = ChunkedBoard(ChunkStore(directory.name), size=512)
+        for cx in range(6):
+            board.set(cx * CHUNK_SIZE, 0, EMPTY_CODE)
+        board.evict(0)
+        token = board.chunks[0, 0]
+        files = sorted(os.listdir(directory.name))
+        self.assertEqual(len(files), 6)
+
+        # Reading a chunk back and evicting it again writes no new file
+        other = board.copy()
+        self.assertEqual(other.get(0, 0), EMPTY_CODE)
+        other.evict(0)
+        self.assertEqual(other.chunks[0, 0], token)
+        self.assertEqual(sorted(os.listdir(directory.name)), files)
+
+        # The file of a written chunk is deleted once no board refers to it
+        other.set(1, 0, EMPTY_CODE)
+        self.assertEqual(len(os.listdir(directory.name)), 6)
+        del board
+        self.assertEqual(len(os.listdir(directory.name)), 5)
+        del other
+        self.assertEqual(os.listdir(directory.name), [])
+
+    def test_unbounded_game(self) -> None:
+        """Test playing and rendering far away from the origin"""
+        state = initialize_chunked_game(0.15, seed=4)
+        center_x, center_y = state.width // 2, state.height // 2
+        viewport = viewport_around(state, Position((center_x, center_y)), 30, 10)
+        rendered = render_board(state, viewport)
+
+        visible_board = state.visible_board
+        assert isinstance(visible_board, ChunkedBoard)
+        self.assertEqual(rendered.count("#"), 300)
+        self.assertEqual(visible_board.chunks, {})
+
+        safe = next(
+            Position((center_x + dx, center_y))
+            for dx in range(64)
+            if (center_x + dx, center_y) not in state.danger_positions
+        )
+        new_state = scan_position(state, safe)
+        self.assertFalse(new_state.game_over)
+        self.assertGreater(new_state.revealed_count, 0)
+        self.assertTrue(render_board_update(state, new_state, 1, viewport))
+
+    def test_rejects_flat_consumers(self) -> None:
+        """Test that features reading whole rows reject chunked maps"""
+        state = initialize_chunked_game(0.15, seed=5)
+        with self.assertRaisesRegex(ValueError, "chunked map"):
+            Journal(state)
+        with self.assertRaisesRegex(ValueError, "chunked map"):
+            Solver.for_state(state)
+        with self.assertRaisesRegex(ValueError, "chunked map"):
+            trap_probabilities(state)
+        with self.assertRaisesRegex(ValueError, "chunked map"):
+            encode_game(state)
+        with self.assertRaisesRegex(ValueError, "chunked map"):
+            _ = state.visible_board.rows
+        with self.assertRaisesRegex(ValueError, "chunked map"):
+            _ = state.hidden_board.cells
+        with self.assertRaisesRegex(ValueError, "chunked map"):
+            state.visible_board.writable_row(0)
+
+    def test_rejects_percolating_density(self) -> None:
+        """Test that densities with infinite empty regions are rejected"""
+        with self.assertRaises(ValueError):
+            initialize_chunked_game(0.05, seed=1)
+
+
+class TestNeighbors(unittest.TestCase):
+    """Test the precomputed neighbor tables"""
+
+    def test_matches_brute_force(self) -> None:
+        """Test bounded and torus tables against explicit neighbor sets"""
+        for width, height, wrap, radius in (
+            (7, 5, False, 1),
+            (7, 5, True, 1),
+            (6, 9, False, 2),
+            (6, 9, True, 2),
+            (2, 3, True, 1),
+        ):
+            table = neighbor_table(width, height, wrap, radius)
+            for y in range(height):
+                for x in range(width):
+                    expected = set()
+                    for dy in range(-radius, radius + 1):
+                        for dx in range(-radius, radius + 1):
+                            nx, ny = x + dx, y + dy
+                            if wrap:
+                                nx, ny = nx % width, ny % height
+                            elif not (0 <= nx < width and 0 <= ny < height):
+                                continue
+                            if (nx, ny) != (x, y):
+                                expected.add(ny * width + nx)
+                    index = y * width + x
+                    neighbors = table.neighbors(index)
+                    self.assertEqual(len(neighbors), len(expected))
+                    self.assertEqual(set(neighbors), expected)
+                    self.assertEqual(
+                        {index + dy * width + dx for dx, dy in table.deltas(x, y)},
+                        expected,
+                    )
+
+    def test_tables_are_shared_and_small(self) -> None:
+        """Test that tables are cached per shape and work for unbounded maps"""
+        self.assertIs(neighbor_table(30, 16), neighbor_table(30, 16))
+        self.assertIsNot(neighbor_table(30, 16), neighbor_table(30, 16, True))
+        table = neighbor_table(1 << 32, 1 << 32)
+        self.assertEqual(len(table.deltas(1 << 20, 0)), 5)
+        self.assertEqual(len(table.deltas(1 << 20, 1 << 20)), 8)
+
+    def test_count_adjacent_dangers_wrap(self) -> None:
+        """Test that traps on the opposite edge count on a torus"""
+        board = create_empty_board(5, 5, EMPTY)
+        board[4][4] = TRAP
+        board[0][2] = TRAP
+        hidden_board = cast(HiddenBoard, board)
+        self.assertEqual(count_adjacent_dangers(hidden_board, 5, 5, 0, 0), 0)
+        self.assertEqual(count_adjacent_dangers(hidden_board, 5, 5, 0, 0, True), 1)
+        self.assertEqual(count_adjacent_dangers(hidden_board, 5, 5, 2, 4, True), 1)
+        packed = Board.from_lists(board)
+        self.assertEqual(count_adjacent_dangers(packed, 5, 5, 3, 4, True), 2)
+
+
+class TestProbability(unittest.TestCase):
+    """Test the exact trap probabilities against brute force enumeration"""
+
+    def brute_force(self, state: GameState) -> Dict[Position, float]:
+        """Trap probabilities by enumerating every trap placement"""
+        board = state.visible_board
+        hidden = [
+            Position((x, y))
+            for y in range(state.height)
+            for x in range(state.width)
+            if board.get(x, y) == HIDDEN_CODE
+        ]
+        numbers = [
+            (x, y, board.get(x, y))
+            for y in range(state.height)
+            for x in range(state.width)
+            if board.get(x, y) not in (HIDDEN_CODE, TRAP_CODE)
+        ]
+        steps = list(itertools.product((-1, 0, 1), repeat=2))
+        counts = dict.fromkeys(hidden, 0)
+        total = 0
+        for traps in itertools.combinations(hidden, state.trap_count):
+            trap_set = set(traps)
+            if all(
+                sum((x + dx, y + dy) in trap_set for dx, dy in steps) == code
+                for x, y, code in numbers
+            ):
+                total += 1
+                for pos in traps:
+                    counts[pos] += 1
+        return {pos: count / total for pos, count in counts.items()}
+
+    def test_matches_brute_force(self) -> None:
+        """Test exact probabilities against enumerating all trap placements"""
+        rng = random.Random(2)
+        for seed in range(12):
+            state = initialize_game(5, 5, 0.2, seed=seed)
+            for _ in range(1 + seed % 3):
+                safe = [
+                    Position((x, y))
+                    for y in range(5)
+                    for x in range(5)
+                    if (x, y) not in state.danger_positions
+                    and state.visible_board.get(x, y) == HIDDEN_CODE
+                ]
+                state = scan_position(state, rng.choice(safe))
+            if state.win:
+                continue
+
+            probabilities = trap_probabilities(state)
+            for pos, expected in self.brute_force(state).items():
+                self.assertAlmostEqual(probabilities.probability(pos), expected)
+
+    def test_unrevealed_board(self) -> None:
+        """Test that every cell of an unplayed board has the trap density"""
+        state = initialize_game(8, 8, 0.15, seed=1)
+        probabilities = trap_probabilities(state)
+        self.assertEqual(probabilities.frontier, {})
+        self.assertAlmostEqual(probabilities.interior, state.trap_count / 64)
+
+    def test_caches_unchanged_components(self) -> None:
+        """Test that a move only solves the components it changed"""
+        state = initialize_game(40, 40, 0.2, seed=3)
+        rng = random.Random(4)
+        safe = [
+            Position((x, y))
+            for y in range(40)
+            for x in range(40)
+            if (x, y) not in state.danger_positions
+        ]
+        state, _ = scan_positions(state, rng.sample(safe, 60))
+        engine = ProbabilityEngine()
+        first = engine.probabilities(state)
+        misses = engine.misses
+        self.assertGreater(misses, 5)
+
+        move = next(
+            pos
+            for pos in safe
+            if state.visible_board.get(*pos) == HIDDEN_CODE and pos in first.frontier
+        )
+        engine.probabilities(scan_position(state, move))
+        self.assertGreater(engine.hits, misses // 2)
+        self.assertLess(engine.misses - misses, 3)
+
+    def test_contradiction(self) -> None:
+        """Test that boards no trap placement matches are rejected"""
+        state = initialize_game(5, 5, 0.2, seed=1)
+        board = Board.filled(5, 5, HIDDEN)
+        board.set(1, 1, EMPTY_CODE)
+        board.set(0, 0, 1)
+        with self.assertRaises(ValueError):
+            trap_probabilities(state.with_updates(visible_board=board))
+
+        board = Board.filled(5, 5, HIDDEN)
+        board.set(0, 0, 3)
+        board.set(1, 0, 1)
+        with self.assertRaises(ValueError):
+            trap_probabilities(state.with_updates(visible_board=board))
+
+    def test_memo_limit(self) -> None:
+        """Test that components with too many open constraints are rejected"""
+        state = initialize_game(60, 60, 0.15, seed=1)
+        board = state.visible_board.copy()
+        rng = random.Random(1)
+        revealed = 0
+        # Scattered single reveals make one long component with a wide frontier
+        while revealed < 700:
+            x, y = rng.randrange(60), rng.randrange(60)
+            if Position((x, y)) in state.danger_positions:
+                continue
+            if board.get(x, y) == HIDDEN_CODE:
+                board.set(x, y, state.hidden_board.get(x, y))
+                revealed += 1
+
+        engine = ProbabilityEngine(max_weights=100_000)
+        with self.assertRaisesRegex(ValueError, "too many open constraints"):
+            engine.probabilities(state.with_updates(visible_board=board))
+
+
+class TestBoardPool(unittest.TestCase):
+    """Test pre-generating games on the background thread"""
+
+    def test_hits_after_prefetch(self) -> None:
+        """Test that prefetched configurations are served from the queue"""
+        with BoardPool(queue_size=2, seed=1) as pool:
+            pool.prefetch(12, 10, 0.2)
+            self.assertTrue(pool.wait_filled(10))
+            first = pool.get(12, 10, 0.2)
+            second = pool.get(12, 10, 0.2)
+            self.assertEqual(pool.stats.hits, 2)
+            self.assertEqual(pool.stats.misses, 0)
+            self.assertNotEqual(first.danger_positions, second.danger_positions)
+            self.assertEqual(
+                (first.width, first.height, first.trap_count), (12, 10, 24)
+            )
+
+            # Pool games replay from their seed
+            assert first.seed is not None
+            self.assertEqual(
+                initialize_game(12, 10, 0.2, seed=first.seed).danger_positions,
+                first.danger_positions,
+            )
+
+    def test_seeded_configuration(self) -> None:
+        """Test that a seeded game is generated once and reused"""
+        with BoardPool() as pool:
+            state = pool.get(10, 10, 0.15, seed=7)
+            self.assertEqual(pool.stats.misses, 1)
+            self.assertIs(pool.get(10, 10, 0.15, seed=7), state)
+            self.assertEqual(
+                state.danger_positions,
+                initialize_game(10, 10, 0.15, seed=7).danger_positions,
+            )
+            self.assertEqual(pool.stats.hits, 1)
+
+    def test_eviction(self) -> None:
+        """Test that unused configurations are dropped"""
+        with BoardPool(max_configs=2, idle_seconds=0.05) as pool:
+            pool.prefetch(8, 8)
+            pool.prefetch(9, 9)
+            pool.prefetch(10, 10)
+            self.assertEqual(len(pool.queues), 2)
+            self.assertEqual(pool.stats.evicted, 1)
+
+            # The worker evicts the idle queues once it finds nothing to fill
+            deadline = time.monotonic() + 10
+            while pool.queues and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(pool.queues, {})
+            stats = pool.stats
+            self.assertEqual((stats.hits, stats.misses, stats.evicted), (0, 0, 3))
+            self.assertLessEqual(stats.generated, 3 * pool.queue_size)
+
+
+class TestProfiling(unittest.TestCase):
+    """Test the opt-in timers and counters"""
+
+    def test_timers_and_counters(self) -> None:
+        """Test that a profiled move records timers and engine counters"""
+        state = initialize_game(10, 10, 0.1, seed=6)
+        empty = next(
+            Position((x, y))
+            for y in range(10)
+            for x in range(10)
+            if state.hidden_board.get(x, y) == EMPTY_CODE
+        )
+        with profiling() as profile:
+            new_state = scan_position(state, empty)
+
+        self.assertEqual(profile.calls["scan_position"], 1)
+        self.assertEqual(profile.calls["flood_fill"], 1)
+        self.assertGreater(profile.seconds["scan_position"], 0)
+        # The scanned cell itself is revealed before the expansion
+        self.assertEqual(
+            profile.counters["cells_expanded"] + 1,
+            new_state.revealed_count - state.revealed_count,
+        )
+        self.assertGreaterEqual(profile.counters["cells_copied"], 10)
+        self.assertGreaterEqual(profile.counters["states_allocated"], 2)
+        self.assertIn("scan_position", profile.summary())
+
+    def test_references_held_before_enabling(self) -> None:
+        """Test that references taken while disabled are timed once enabled"""
+        self.addCleanup(set_profiling, PROFILE.enabled)
+        set_profiling(False)
+        state = initialize_game(8, 8, seed=1)
+        operations = {"scan": lambda scan=scan_position: scan(state, Position((1, 1)))}
+
+        with profiling() as profile:
+            operations["scan"]()
+        self.assertEqual(profile.calls["scan_position"], 1)
+
+    def test_disabled_outside_block(self) -> None:
+        """Test that nothing is recorded outside the block"""
+        self.addCleanup(set_profiling, PROFILE.enabled)
+        set_profiling(False)
+        with profiling():
+            pass
+        self.assertFalse(PROFILE.enabled)
+
+        PROFILE.reset()
+        scan_position(initialize_game(8, 8, seed=1), Position((1, 1)))
+        self.assertEqual(PROFILE.calls, {})
+        self.assertEqual(PROFILE.counters, {})
+
+
+class TestServer(unittest.TestCase):
+    """Test the JSON-lines game server"""
+
+    def test_session_round_trip(self) -> None:
+        """Test creating, scanning, showing and quitting a session"""
+        server = GameServer()
+        created = server.handle_request(
+            {"op": "new", "width": 8, "height": 8, "traps": 0.15, "seed": 3}
+        )
+        self.assertTrue(created["ok"])
+        session = created["session"]
+
+        scanned = server.handle_request(
+            {"op": "scan", "session": session, "x": 2, "y": 2}
+        )
+        self.assertTrue(scanned["ok"])
+        self.assertEqual(scanned["outcome"], OUTCOME_SAFE)
+        self.assertGreater(cast(int, scanned["revealed_count"]), 0)
+
+        shown = server.handle_request({"op": "state", "session": session})
+        board = cast(List[str], shown["board"])
+        self.assertEqual(len(board), 8)
+        self.assertNotEqual(board[2][2], "#")
+
+        self.assertTrue(server.handle_request({"op": "quit", "session": session})["ok"])
+        self.assertEqual(server.sessions, {})
+
+    def test_errors(self) -> None:
+        """Test that bad requests get an error response"""
+        server = GameServer(max_sessions=1)
+        for line in (
+            b"not json\n",
+            b"[1, 2]\n",
+            b'{"op": "fly"}\n',
+            b'{"op": "scan", "session": "7", "x": 1, "y": 1}\n',
+            b'{"op": "new", "width": "wide"}\n',
+            b'{"op": "new", "width": 100000, "height": 100000}\n',
+            b'{"op": "new", "width": -1, "height": 3000000}\n',
+            b'{"op": "new", "width": 0, "height": 8}\n',
+            b'{"op": "new", "width": 1, "height": 300000}\n',
+            b'{"op": "new", "safe_first_click": "false"}\n',
+            b'{"op": "new", "safe_first_click": 0}\n',
+        ):
+            response = json.loads(server.handle_line(line))
+            self.assertFalse(response["ok"])
+            self.assertIn("error", response)
+
+        self.assertTrue(server.handle_request({"op": "new"})["ok"])
+        self.assertFalse(server.handle_request({"op": "new"})["ok"])
+
+    def test_large_boards_off_loop(self) -> None:
+        """Test that a first scan on a large board does not stall other sessions"""
+        server = GameServer()
+
+        async def run() -> List[str]:
+            finished: List[str] = []
+            created = await server.handle_request_async(
+                {"op": "new", "width": 1000, "height": 1000, "seed": 1}
+            )
+            self.assertTrue(created["ok"])
+
+            async def scan_large() -> None:
+                scan = {"op": "scan", "session": created["session"], "x": 5, "y": 5}
+                self.assertTrue((await server.handle_request_async(scan))["ok"])
+                finished.append("large")
+
+            async def play_small() -> None:
+                small = await server.handle_request_async({"op": "new", "seed": 2})
+                scan = {"op": "scan", "session": small["session"], "x": 1, "y": 1}
+                self.assertTrue((await server.handle_request_async(scan))["ok"])
+                finished.append("small")
+
+            await asyncio.gather(scan_large(), play_small())
+            return finished
+
+        self.assertEqual(asyncio.run(run()), ["small", "large"])
+        self.assertEqual(len(server.sessions), 2)
+
+    def test_load_test(self) -> None:
+        """Test concurrent sessions over a real socket"""
+
+        async def run() -> Dict[str, object]:
+            server = GameServer()
+            listener = await server.start("127.0.0.1", 0)
+            port = listener.sockets[0].getsockname()[1]
+            async with listener:
+                report = await load_test("127.0.0.1", port, 4, 20, 3)
+            self.assertEqual(server.sessions, {})
+            return report
+
+        report = asyncio.run(run())
+        self.assertEqual(report["sessions"], 20)
+        self.assertGreater(cast(int, report["moves"]), 20)
+        self.assertLessEqual(cast(float, report["p50_ms"]), cast(float, report["p99_ms"]))
+
 
 if __name__ == "__main__":
     unittest.main()